@@ -0,0 +1,125 @@
+'''
+Reading out the sensors in threads and saving their data to .csv files while in flight.
+Used by fly.py, kept free of GPIO and config globals so the tools can import it as well.
+'''
+
+#####################################
+# imports
+
+import time
+import csv
+import logging
+import threading
+
+#####################################
+# sensor-related definitions
+
+class Sensor:
+    '''Provides functions related to reading out, storing and saving data of the sensors.
+    on_sample is called with every new sample ([serial, time, value]) from the reading thread.
+    If data_ready is given (a function returning whether the sensor has a new conversion, see the data_ready
+    methods of the altimu10v5 drivers) only fresh samples are recorded: the thread wakes up shortly before the
+    next conversion is due and polls data_ready every poll_interval (a tenth of interval by default) until it is.
+    After max_errors bus errors in a row the sensor counts as failed and is only retried every retry_interval.
+    lock is shared by the sensors on one I2C bus so that one transfers at a time (a lock of its own by default),
+    on_sample is called after it is released'''
+    def __init__(self, name, interval, function, on_sample=None, data_ready=None, poll_interval=None,
+                 max_errors=10, retry_interval=1, lock=None):
+        self.name = name
+        self.interval = interval
+        self.function = function
+        self.on_sample = on_sample
+        self.data_ready = data_ready
+        self.default_poll_interval = poll_interval is None
+        self.poll_interval = interval/10 if poll_interval is None else poll_interval
+        self.max_errors = max_errors
+        self.retry_interval = retry_interval
+        self.lock = lock or threading.Lock()
+        self.n_polls = 0  # data_ready checks that found no new conversion
+        self.n_errors = 0
+        self.errors_in_a_row = 0
+        self.failed = False
+        self.serial = 0
+        self.next_call = time.time()
+        self.data = []
+        self.save_start = 0
+        self.save_end = 0
+
+    def set_interval(self, interval):
+        '''Changes the sampling interval, also while the sensor is being read. A default poll_interval follows it'''
+        if self.default_poll_interval:
+            self.poll_interval = interval/10
+        self.interval = interval
+
+    def sample(self):
+        '''Reads the sensor once (if it has a new conversion when data ready gated), stores the sample
+        and returns the time the next read is due'''
+        try:
+            with self.lock:
+                if self.data_ready is not None and not self.data_ready():
+                    self.n_polls += 1
+                    return time.time() + self.poll_interval
+                sample = [self.serial+1, time.time(), self.function()]
+        except OSError as error:  # the device did not respond on the bus
+            self.n_errors += 1
+            self.errors_in_a_row += 1
+            if self.errors_in_a_row == self.max_errors:
+                self.failed = True
+                logging.error('{} failed: {}'.format(self.name, error))
+            # the schedule starts over from now, so the reads do not pile up to catch up once it responds again
+            self.next_call = time.time() + (self.retry_interval if self.failed else self.interval)
+            return self.next_call
+        if self.failed:
+            logging.warning('{} is back'.format(self.name))
+        if self.errors_in_a_row:
+            self.next_call = sample[1]
+        self.failed = False
+        self.errors_in_a_row = 0
+        self.serial += 1
+        self.data.append(sample)
+        if self.on_sample is not None:
+            self.on_sample(sample)
+        if self.data_ready is None:
+            self.next_call += self.interval
+        else:
+            self.next_call = sample[1] + self.interval - self.poll_interval  # follow the clock of the sensor
+        return self.next_call
+
+    def read(self, stop):
+        '''Function meant to be run as thread until stop is set, reading data from sensor and storing it in attribute'''
+        self.next_call = time.time()
+        while not stop.is_set():
+            time.sleep(max(0, self.sample() - time.time())) # sleep only interval - time consumed in current call
+
+
+def write_block(path, rows, header, started):
+    '''Appends a block of rows to a .csv file between a header and a footer with the time it took since started.
+    Returns that time'''
+    with open(path, 'a') as f: # opening and closing file every time
+        csv.writer(f).writerow([header])
+        csv.writer(f).writerows(rows)
+        delta = time.time() - started
+        csv.writer(f).writerow(['# autosave took {:.6f}'.format(delta)])
+    return delta
+
+
+def autosave(sensor, interval, stop, datafilename):
+    '''Every interval seconds until stop is set this function autosaves the new samples of a sensor to its logfile'''
+    num = 0
+    time.sleep(interval)
+    next_call = time.time()
+    while not stop.is_set():
+        sensor.save_start = sensor.save_end
+        num += 1
+        sensor.save_end = len(sensor.data)  # not the expected number of samples, a data ready gated sensor has its own clock
+        delta = write_block(datafilename+sensor.name+'.csv', sensor.data[sensor.save_start:sensor.save_end],
+                            '#### {} autosave nr {}'.format('{:.6f}'.format(next_call)[6:],num), next_call)
+        next_call += interval
+        time.sleep(max(0, interval - delta))
+
+
+def final_save(sensor, datafilename):
+    '''Appends all data that has not been autosaved yet to the logfile of a sensor'''
+    with open(datafilename+sensor.name+'.csv', 'a') as f:
+        csv.writer(f).writerow(['# final save at {}'.format(time.time())])
+        csv.writer(f).writerows(sensor.data[sensor.save_end:])
@@ -7,20 +7,30 @@ Licensed under MIT.
 from .lsm6ds33 import LSM6DS33
 from .lis3mdl import LIS3MDL
 from .lps25h import LPS25H
+from .fakebus import FakeSMBus
+from .constants import LSM6DS33_ADDR, LIS3MDL_ADDR, LPS25H_ADDR, \
+    LSM6DS33_ADDR_SA0_LOW, LIS3MDL_ADDR_SA0_LOW, LPS25H_ADDR_SA0_LOW
 
 
 class IMU(object):
     """ Set up and control Pololu's AltIMU-10v5.
     """
 
-    def __init__(self):
+    def __init__(self, bus_id=1, bus=None, sa0=True):
+        """ sa0 is the level of the SA0 pin of the board, pulled low
+            it uses the alternate addresses so two boards can share a bus.
+        """
         super(IMU, self).__init__()
-        self.lsm6ds33 = LSM6DS33()
+        self.bus_id = bus_id
+        self.addresses = [LSM6DS33_ADDR, LIS3MDL_ADDR, LPS25H_ADDR] if sa0 else \
+                         [LSM6DS33_ADDR_SA0_LOW, LIS3MDL_ADDR_SA0_LOW, LPS25H_ADDR_SA0_LOW]
+        self.lsm6ds33 = LSM6DS33(bus_id, bus, self.addresses[0])
         self.gyroAccelEnabled = False
-        self.lis3mdl = LIS3MDL()
+        self.lis3mdl = LIS3MDL(bus_id, bus, self.addresses[1])
         self.barometerEnabled = False
-        self.lps25h = LPS25H()
+        self.lps25h = LPS25H(bus_id, bus, self.addresses[2])
         self.magnetometerEnabled = False
+        self.complementary_angles = [0, 0]
 
     def __del__(self):
         del(self.lsm6ds33)
@@ -40,14 +50,23 @@ class IMU(object):
             self.lis3mdl.enable()
             self.magnetometerEnabled = True
 
+    def get_output_data_rates(self):
+        """ Return the output data rates in Hz of the sensors as enable
+            sets them up, by sensor name (baro, acc, gyro and mag).
+        """
+        return {'baro': self.lps25h.get_barometer_output_data_rate(),
+                'acc': self.lsm6ds33.get_accelerometer_output_data_rate(),
+                'gyro': self.lsm6ds33.get_gyro_output_data_rate(),
+                'mag': self.lis3mdl.get_magnetometer_output_data_rate()}
+
     def get_complementary_angles(self, delta_t=0.05):
         """ Calculate combined angles of accelerometer and gyroscope
-            using a complementary filter.
+            using a complementary filter. The angles are integrated from
+            one call to the next, so call it every delta_t seconds.
         """
         if not self.gyroAccelEnabled:
             raise(Exception('Gyroscope and accelerometer are not enabled!'))
 
-        self.complementary_angles = [0, 0]
         complementary_filter_constant = 0.98
 
         accel_angles = self.lsm6ds33.get_accelerometer_angles()
@@ -8,10 +8,28 @@ LIS3MDL_ADDR = 0x1e      # Magnetometer
 LPS25H_ADDR = 0x5d      # Barometric pressure sensor
 LSM6DS33_ADDR = 0x6b      # Gyrometer / accelerometer
 
+# Alternate I2C device addresses, with the SA0 pin of the board pulled low
+# (for a second board on the same bus)
+LIS3MDL_ADDR_SA0_LOW = 0x1c
+LPS25H_ADDR_SA0_LOW = 0x5c
+LSM6DS33_ADDR_SA0_LOW = 0x6a
+
 # LSM6DS33 gyroscope and accelerometer control registers
 LSM6DS33_CTRL1_XL = 0x10  # Acceleration sensor control
 LSM6DS33_CTRL2_G = 0x11  # Angular rate sensor (gyroscope) control
 
+# LSM6DS33 control register values written by enable
+LSM6DS33_CTRL1_XL_ENABLE = 0x58  # 208 Hz (high performance) / +/- 4g
+LSM6DS33_CTRL2_G_ENABLE = 0x58   # 208 Hz (high performance) / 1000 dps
+
+# LSM6DS33 output data rates in Hz by the ODR bits (7-4) of CTRL1_XL and CTRL2_G
+LSM6DS33_ODR = [0, 12.5, 26, 52, 104, 208, 416, 833, 1660, 3330, 6660]
+
+# LSM6DS33 status register and its data ready flags (cleared when the output registers are read)
+LSM6DS33_STATUS_REG = 0x1E
+LSM6DS33_STATUS_XLDA = 0x01  # New accelerometer data available
+LSM6DS33_STATUS_GDA = 0x02   # New gyroscope data available
+
 # LSM6DS33 Gyroscope and accelerometer output registers
 LSM6DS33_OUTX_L_G = 0x22  # Gyroscope pitch axis (X) output, low byte
 LSM6DS33_OUTX_H_G = 0x23  # Gyroscope pitch axis (X) output, high byte
@@ -33,6 +51,17 @@ LIS3MDL_CTRL_REG2 = 0x21   # Set gauss scale
 LIS3MDL_CTRL_REG3 = 0x22   # Set operating/power modes
 LIS3MDL_CTRL_REG4 = 0x23   # Set operating mode and rate for Z-axis
 
+# Magnetometer CTRL_REG1 value written by enable: ultra-high-performance X and Y, 10 Hz
+LIS3MDL_CTRL_REG1_ENABLE = 0x70
+
+# Magnetometer output data rates in Hz by the DO bits (4-2) of CTRL_REG1
+LIS3MDL_ODR = [0.625, 1.25, 2.5, 5, 10, 20, 40, 80]
+
+# Status register for magnetometer and its flags
+LIS3MDL_STATUS_REG = 0x27
+LIS3MDL_STATUS_ZYXDA = 0x08  # New data available on all axes
+LIS3MDL_STATUS_ZYXOR = 0x80  # Data of all axes overwritten before it was read
+
 # Output registers for magnetometer
 LIS3MDL_OUT_X_L = 0x28   # X output, low byte
 LIS3MDL_OUT_X_H = 0x29   # X output, high byte
@@ -44,6 +73,17 @@ LIS3MDL_OUT_Z_H = 0x2D   # Z output, high byte
 # Control registers for the digital barometer
 LPS25H_CTRL_REG1 = 0x20  # Set device power mode / ODR / BDU
 
+# Barometer CTRL_REG1 value written by enable: active, 12.5 Hz
+LPS25H_CTRL_REG1_ENABLE = 0xb0
+
+# Barometer output data rates in Hz by the ODR bits (6-4) of CTRL_REG1, 0 is one-shot
+LPS25H_ODR = [0, 1, 7, 12.5, 25]
+
+# Status register for the digital barometer and its flags
+LPS25H_STATUS_REG = 0x27
+LPS25H_STATUS_P_DA = 0x02  # New pressure data available
+LPS25H_STATUS_P_OR = 0x20  # Pressure data overwritten before it was read
+
 # Output registers for the digital barometer
 LPS25H_PRESS_OUT_XL = 0x28  # Pressure output, loweste byte
 LPS25H_PRESS_OUT_L = 0x29   # Pressure output, low byte
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+
+"""Stand-in for smbus.SMBus to run the sensor classes without the hardware,
+e.g. for benchmarks and dry runs on a laptop:
+
+    imu = IMU(bus=FakeSMBus(latency=0.0002))
+"""
+
+import time
+import threading
+from .constants import *
+
+
+class FakeSMBus(object):
+    """ Register map of the devices on one I2C bus, held in memory.
+        The data ready flags in the status registers are simulated: a flag
+        is set once a conversion at the output data rate of its sensor
+        happened since the output registers were last read.
+        Transfers on one bus are serialized, but like the kernel driver,
+        waiting for one releases the interpreter, so several buses transfer
+        in parallel.
+    """
+
+    # Per sensor: addresses (SA0 high and low), status register, data ready
+    # flag and the first output register, reading which clears the flag
+    conversions = {
+        'acc': ((LSM6DS33_ADDR, LSM6DS33_ADDR_SA0_LOW), LSM6DS33_STATUS_REG, LSM6DS33_STATUS_XLDA, LSM6DS33_OUTX_L_XL),
+        'gyro': ((LSM6DS33_ADDR, LSM6DS33_ADDR_SA0_LOW), LSM6DS33_STATUS_REG, LSM6DS33_STATUS_GDA, LSM6DS33_OUTX_L_G),
+        'mag': ((LIS3MDL_ADDR, LIS3MDL_ADDR_SA0_LOW), LIS3MDL_STATUS_REG, LIS3MDL_STATUS_ZYXDA, LIS3MDL_OUT_X_L),
+        'baro': ((LPS25H_ADDR, LPS25H_ADDR_SA0_LOW), LPS25H_STATUS_REG, LPS25H_STATUS_P_DA, LPS25H_PRESS_OUT_XL),
+    }
+
+    # Output data rates in Hz as set up by the enable methods of the drivers
+    output_data_rates = {'acc': LSM6DS33_ODR[LSM6DS33_CTRL1_XL_ENABLE >> 4],
+                         'gyro': LSM6DS33_ODR[LSM6DS33_CTRL2_G_ENABLE >> 4],
+                         'mag': LIS3MDL_ODR[(LIS3MDL_CTRL_REG1_ENABLE >> 2) & 0x07],
+                         'baro': LPS25H_ODR[(LPS25H_CTRL_REG1_ENABLE >> 4) & 0x07]}
+
+    def __init__(self, bus_id=1, latency=0, registers=None, output_data_rates=None, absent=()):
+        """ latency is the time in seconds every transfer takes (one at a
+            time, as on the real bus), registers an optional dict of
+            {(address, register): value} to start from. Registers that were
+            never written read back as a fixed pattern derived from the
+            address and register. output_data_rates overrides the rates of
+            the simulated conversions per sensor name. Transfers to the
+            addresses in absent fail as if the device did not acknowledge.
+        """
+        self.bus_id = bus_id
+        self.latency = latency
+        self.registers = dict(registers or {})
+        self.output_data_rates = dict(self.output_data_rates, **(output_data_rates or {}))
+        self.absent = set(absent)
+        self.last_read = {}
+        # lookups of the status and first output registers for every address a sensor can have
+        self.flags = {}
+        self.output_registers = {}
+        for name, (addresses, status_register, flag, output_register) in self.conversions.items():
+            for address in addresses:
+                self.flags.setdefault((address, status_register), []).append((name, flag))
+                self.output_registers[(address, output_register)] = name
+        self.lock = threading.Lock()
+        self.start = time.time()
+        self.n_reads = 0
+        self.n_writes = 0
+        self.bus_time = 0  # simulated time spent transferring, a clock for reproducible timing off-board
+
+    def _wait(self, address):
+        if self.latency:
+            time.sleep(self.latency)
+            self.bus_time += self.latency
+        if address in self.absent:
+            raise OSError(121, 'Remote I/O error')
+
+    def _status(self, address, register):
+        """ Return the simulated data ready flags of a status register. """
+        now = time.time()
+        status = 0
+        for name, flag in self.flags[(address, register)]:
+            rate = self.output_data_rates[name]
+            if int(now * rate) > int(self.last_read.get((address, name), self.start) * rate):
+                status |= flag
+        return status
+
+    def read_byte_data(self, address, register):
+        """ Read a single register. """
+        with self.lock:
+            self._wait(address)
+            self.n_reads += 1
+            if (address, register) in self.flags:
+                return self._status(address, register)
+            if (address, register) in self.output_registers:
+                self.last_read[(address, self.output_registers[(address, register)])] = time.time()
+            return self.registers.get((address, register), (address * 31 + register * 7) & 0xff)
+
+    def write_byte_data(self, address, register, value):
+        """ Write a single register. """
+        with self.lock:
+            self._wait(address)
+            self.n_writes += 1
+            self.registers[(address, register)] = value & 0xff
@@ -4,16 +4,25 @@
 This class has helper methods for I2C SMBus access on a Raspberry PI.
 """
 
-from smbus import SMBus
+try:
+    from smbus import SMBus
+except ImportError:  # not on a Raspberry PI, a bus has to be passed in (see fakebus.py)
+    SMBus = None
 
 
 class I2C(object):
     """ Class to set up and access I2C devices.
     """
 
-    def __init__(self, bus_id=1):
-        """ Initialize the I2C bus. """
-        self._i2c = SMBus(bus_id)
+    def __init__(self, bus_id=1, bus=None):
+        """ Initialize the I2C bus, or use the given bus object
+            (anything with the read_byte_data/write_byte_data methods of SMBus).
+        """
+        if bus is None:
+            if SMBus is None:
+                raise(ImportError('smbus is not installed, pass a bus object instead'))
+            bus = SMBus(bus_id)
+        self._i2c = bus
 
     def __del__(self):
         """ Clean up. """
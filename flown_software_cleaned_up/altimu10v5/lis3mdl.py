@@ -27,18 +27,19 @@ class LIS3MDL(I2C):
         LIS3MDL_OUT_Z_H,  # high byte of Z value
     ]
 
-    def __init__(self, bus_id=1):
+    def __init__(self, bus_id=1, bus=None, address=LIS3MDL_ADDR):
         """ Set up I2C connection and initialize some flags and values.
         """
 
-        super(LIS3MDL, self).__init__(bus_id)
+        super(LIS3MDL, self).__init__(bus_id, bus)
+        self.address = address
         self.is_magnetometer_enabled = False
 
     def __del__(self):
         """ Clean up. """
         try:
             # Power down magnetometer
-            self.write_register(LIS3MDL_ADDR, LIS3MDL_CTRL_REG3, 0x03)
+            self.write_register(self.address, LIS3MDL_CTRL_REG3, 0x03)
             super(LIS3MDL, self).__del__()
         except:
             pass
@@ -49,11 +50,11 @@ class LIS3MDL(I2C):
         """
 
         # Disable magnetometer and temperature sensor first
-        self.write_register(LIS3MDL_ADDR, LIS3MDL_CTRL_REG1, 0x00)
-        self.write_register(LIS3MDL_ADDR, LIS3MDL_CTRL_REG3, 0x03)
+        self.write_register(self.address, LIS3MDL_CTRL_REG1, 0x00)
+        self.write_register(self.address, LIS3MDL_CTRL_REG3, 0x03)
 
         # Enable device in continuous conversion mode
-        self.write_register(LIS3MDL_ADDR, LIS3MDL_CTRL_REG3, 0x00)
+        self.write_register(self.address, LIS3MDL_CTRL_REG3, 0x00)
 
         # Initial value for CTRL_REG1
         ctrl_reg1 = 0x00
@@ -61,19 +62,34 @@ class LIS3MDL(I2C):
         # Ultra-high-performance mode for X and Y
         # Output data rate 10Hz
         # binary value -> 01110000b, hex value -> 0x70
-        ctrl_reg1 += 0x70
+        ctrl_reg1 += LIS3MDL_CTRL_REG1_ENABLE
 
         # +/- 4 gauss full scale
-        self.write_register(LIS3MDL_ADDR, LIS3MDL_CTRL_REG2, 0x00)
+        self.write_register(self.address, LIS3MDL_CTRL_REG2, 0x00)
 
         # Ultra-high-performance mode for Z
         # binary value -> 00001100b, hex value -> 0x0c
-        self.write_register(LIS3MDL_ADDR, LIS3MDL_CTRL_REG4, 0x0c)
+        self.write_register(self.address, LIS3MDL_CTRL_REG4, 0x0c)
 
         self.is_magnetometer_enabled = True
 
         # Write calculated value to the CTRL_REG1 register
-        self.write_register(LIS3MDL_ADDR, LIS3MDL_CTRL_REG1, ctrl_reg1)
+        self.write_register(self.address, LIS3MDL_CTRL_REG1, ctrl_reg1)
+
+    def get_magnetometer_output_data_rate(self):
+        """ Return the output data rate in Hz that enable sets up. """
+        return LIS3MDL_ODR[(LIS3MDL_CTRL_REG1_ENABLE >> 2) & 0x07]
+
+    def get_status(self):
+        """ Return the status register with the data ready and overrun flags.
+        """
+        return self.read_register(self.address, LIS3MDL_STATUS_REG)
+
+    def magnetometer_data_ready(self):
+        """ Return whether the magnetometer has a sample of all axes
+            that was not read yet.
+        """
+        return bool(self.get_status() & LIS3MDL_STATUS_ZYXDA)
 
     def get_magnetometer_raw(self):
         """ Return 3D vector of raw magnetometer data.
@@ -82,4 +98,4 @@ class LIS3MDL(I2C):
         if not self.is_magnetometer_enabled:
             raise(Exception('Magnetometer is not enabled'))
 
-        return self.read_3d_sensor(LIS3MDL_ADDR, self.magnetometer_registers)
+        return self.read_3d_sensor(self.address, self.magnetometer_registers)
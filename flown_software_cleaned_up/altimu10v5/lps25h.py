@@ -24,18 +24,19 @@ class LPS25H(I2C):
         LPS25H_PRESS_OUT_H,   # high byte of pressure value
     ]
 
-    def __init__(self, bus_id=1):
+    def __init__(self, bus_id=1, bus=None, address=LPS25H_ADDR):
         """ Set up and access LPS25H digital barometer.
         """
 
-        super(LPS25H, self).__init__(bus_id)
+        super(LPS25H, self).__init__(bus_id, bus)
+        self.address = address
         self.is_barometer_enabled = False
 
     def __del__(self):
         """ Clean up. """
         try:
             # Power down barometer
-            self.write_register(LPS25H_ADDR, LPS25H_CTRL_REG1, 0x00)
+            self.write_register(self.address, LPS25H_CTRL_REG1, 0x00)
             super(LPS25H, self).__del__()
         except:
             pass
@@ -43,18 +44,30 @@ class LPS25H(I2C):
     def enable(self):
         """ Enable and set up the LPS25H barometer. """
         # Power down device first
-        self.write_register(LPS25H_ADDR, LPS25H_CTRL_REG1, 0x00)
+        self.write_register(self.address, LPS25H_CTRL_REG1, 0x00)
 
         # Output data rate 12.5Hz
         # binary value -> 10110000, hex value -> 0xb0
-        self.write_register(LPS25H_ADDR, LPS25H_CTRL_REG1, 0xb0)
+        self.write_register(self.address, LPS25H_CTRL_REG1, LPS25H_CTRL_REG1_ENABLE)
 
         self.is_barometer_enabled = True
 
+    def get_barometer_output_data_rate(self):
+        """ Return the output data rate in Hz that enable sets up. """
+        return LPS25H_ODR[(LPS25H_CTRL_REG1_ENABLE >> 4) & 0x07]
+
+    def get_status(self):
+        """ Return the status register with the data ready and overrun flags. """
+        return self.read_register(self.address, LPS25H_STATUS_REG)
+
+    def barometer_data_ready(self):
+        """ Return whether the barometer has a pressure sample that was not read yet. """
+        return bool(self.get_status() & LPS25H_STATUS_P_DA)
+
     def get_barometer_raw(self):
         """ Return the raw barometer sensor data. """
         # Check if barometer has been enabled
         if not self.is_barometer_enabled:
             raise(Exception('Barometer is not enabled'))
 
-        return self.read_1d_sensor(LPS25H_ADDR, self.barometer_registers)
+        return self.read_1d_sensor(self.address, self.barometer_registers)
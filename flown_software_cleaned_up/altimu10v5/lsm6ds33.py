@@ -40,11 +40,12 @@ class LSM6DS33(I2C):
         LSM6DS33_OUTZ_H_XL,  # high byte of Z value
     ]
 
-    def __init__(self, bus_id=1):
+    def __init__(self, bus_id=1, bus=None, address=LSM6DS33_ADDR):
         """ Set up I2C connection and initialize some flags and values.
         """
 
-        super(LSM6DS33, self).__init__(bus_id)
+        super(LSM6DS33, self).__init__(bus_id, bus)
+        self.address = address
         self.is_accel_enabled = False
         self.is_gyro_enabled = False
 
@@ -58,8 +59,8 @@ class LSM6DS33(I2C):
         """ Clean up."""
         try:
             # Power down accelerometer and gyro
-            self.writeRegister(LSM6DS33_ADDR, LSM6DS33_CTRL1_XL, 0x00)
-            self.writeRegister(LSM6DS33_ADDR, LSM6DS33_CTRL2_G, 0x00)
+            self.writeRegister(self.address, LSM6DS33_CTRL1_XL, 0x00)
+            self.writeRegister(self.address, LSM6DS33_CTRL2_G, 0x00)
             super(LSM6DS33, self).__del__()
             print('Destroying')
         except:
@@ -68,20 +69,28 @@ class LSM6DS33(I2C):
     def enable(self, accelerometer=True, gyroscope=True, calibration=True):
         """ Enable and set up the given sensors in the IMU."""
         if accelerometer:
-            # 1.66 kHz (high performance) / +/- 4g
+            # 208 Hz (high performance) / +/- 4g
             # binary value -> 0b01011000, hex value -> 0x58
-            self.write_register(LSM6DS33_ADDR, LSM6DS33_CTRL1_XL, 0x58)
+            self.write_register(self.address, LSM6DS33_CTRL1_XL, LSM6DS33_CTRL1_XL_ENABLE)
             self.is_accel_enabled = True
         if gyroscope:
             # 208 Hz (high performance) / 1000 dps
             # binary value -> 0b01011000, hex value -> 0x58
-            self.write_register(LSM6DS33_ADDR, LSM6DS33_CTRL2_G, 0x58)
+            self.write_register(self.address, LSM6DS33_CTRL2_G, LSM6DS33_CTRL2_G_ENABLE)
             self.is_gyro_enabled = True
         if calibration:
             self.calibrate()
             self.is_gyro_calibrated = True
             self.is_accel_calibrated = True
 
+    def get_accelerometer_output_data_rate(self):
+        """ Return the output data rate in Hz that enable sets up. """
+        return LSM6DS33_ODR[LSM6DS33_CTRL1_XL_ENABLE >> 4]
+
+    def get_gyro_output_data_rate(self):
+        """ Return the output data rate in Hz that enable sets up. """
+        return LSM6DS33_ODR[LSM6DS33_CTRL2_G_ENABLE >> 4]
+
     def calibrate(self, iterations=2000):
         """ Calibrate the gyro's raw values."""
 #        print('Calibrating Gyro and Accelerometer...')
@@ -115,7 +124,7 @@ class LSM6DS33(I2C):
         if not self.is_gyro_enabled:
             raise(Exception('Gyroscope is not enabled!'))
 
-        sensor_data = self.read_3d_sensor(LSM6DS33_ADDR, self.gyro_registers)
+        sensor_data = self.read_3d_sensor(self.address, self.gyro_registers)
 
         # Return the vector
         if self.is_gyro_calibrated:
@@ -147,6 +156,21 @@ class LSM6DS33(I2C):
 
         return gyro_data
 
+    def get_status(self):
+        """ Return the status register with the data ready flags.
+        """
+        return self.read_register(self.address, LSM6DS33_STATUS_REG)
+
+    def accelerometer_data_ready(self):
+        """ Return whether the accelerometer has a sample that was not read yet.
+        """
+        return bool(self.get_status() & LSM6DS33_STATUS_XLDA)
+
+    def gyro_data_ready(self):
+        """ Return whether the gyroscope has a sample that was not read yet.
+        """
+        return bool(self.get_status() & LSM6DS33_STATUS_GDA)
+
     def get_accelerometer_raw(self):
         """ Return a 3D vector of raw accelerometer data.
         """
@@ -155,7 +179,7 @@ class LSM6DS33(I2C):
         if not self.is_accel_enabled:
             raise(Exception('Accelerometer is not enabled!'))
 
-        return self.read_3d_sensor(LSM6DS33_ADDR, self.accel_registers)
+        return self.read_3d_sensor(self.address, self.accel_registers)
 
     def get_accelerometer_g_forces(self):
         """ Return a 3D vector of the g forces measured by the accelerometer"""
@@ -0,0 +1,210 @@
+'''
+Estimators running on board during the flight, fed with one raw sensor reading at a time.
+Plain Python without numpy, so they can be used from the sensor threads of fly.py and replayed in the tools.
+'''
+
+#####################################
+# imports
+
+import math
+import threading
+
+#####################################
+# estimator definitions
+
+class AltitudeEstimator:
+    '''Smoothed pressure, altitude and vertical velocity from the raw barometer readings, for deploy voting.
+    p, alt and vv hold the last two values, the latest at index 1'''
+    def __init__(self, p0, interval, T0, a, R, g0, exp_factor_p, exp_factor_vv):
+        self.p0 = p0
+        self.interval = interval
+        self.T0 = T0
+        self.a = a
+        self.exponent = -(R*a)/g0
+        self.exp_factor_p = exp_factor_p
+        self.exp_factor_vv = exp_factor_vv
+        self.p = [p0, p0]
+        self.alt = [0, 0]
+        self.vv = [0, 0]
+        self.raw_alt = 0  # altitude of the last reading without smoothing, for the apogee prediction
+
+    def update(self, raw):
+        '''Updates the estimates with a raw barometer reading and returns the new pressure, altitude and vertical velocity.
+        As flown, the exponential smoothing of p and vv blends in the value from two updates ago'''
+        p = [self.p[1], self.exp_factor_p*(raw/40.96) + (1-self.exp_factor_p)*self.p[0]]  # conversion from raw readings to Pa and smoothing
+        alt = [self.alt[1], self.T0/self.a*((p[1]/self.p0)**self.exponent-1)]  # conversion from p to h, no smoothing
+        vv = [self.vv[1], self.exp_factor_vv*((alt[1]-alt[0])/self.interval) + (1-self.exp_factor_vv)*self.vv[0]]  # conversion from h to vv
+        self.raw_alt = self.T0/self.a*(((raw/40.96)/self.p0)**self.exponent-1)
+        self.p, self.alt, self.vv = p, alt, vv  # swapped in at once, as the state machine reads them from another thread
+        return p[1], alt[1], vv[1]
+
+
+class AttitudeEstimator:
+    '''Attitude of the rocket from the gyro and accelerometer samples as they come in, in constant time per sample.
+    The gyro rates are integrated into a quaternion (body to earth) with a correction towards the measured gravity
+    (Mahony's complementary filter) while the accelerometer measures about 1 g, so not under thrust or drag.
+    In flight the accelerometer also measures drag and spin, so fly.py switches the correction off (correct) at launch
+    and the attitude is propagated with the gyro alone from the one it had on the pad.
+    The sensor z axis is the longitudinal axis of the rocket, pointing up on the pad'''
+    def __init__(self, kp=1.0, acc_gate=0.15, acc_scale=0.122/1000, max_dt=0.5):
+        self.kp = kp  # gain of the correction towards gravity in rad/s
+        self.acc_gate = acc_gate  # in g
+        self.acc_scale = acc_scale  # g per LSB of the raw accelerometer readings
+        self.max_dt = max_dt  # longer gaps between gyro samples are not integrated
+        self.correct = True  # whether the accelerometer corrects the attitude
+        self.q = [1.0, 0.0, 0.0, 0.0]
+        self.aligned = False  # set from the first accelerometer sample at 1 g
+        self.gravity = None  # direction of the last accelerometer sample at 1 g, None if it was not
+        self.gyro_time = None
+        self.rates = [0.0, 0.0, 0.0]  # dps
+        self.vertical_acc = 0.0  # vertical acceleration in g of the last accelerometer sample, without gravity
+        self.n_gyro = 0
+        self.n_acc = 0
+
+    def add_acc(self, sample):
+        '''Takes an accelerometer sample [serial, time, [x, y, z]] of raw readings'''
+        self.n_acc += 1
+        x, y, z = (value*self.acc_scale for value in sample[2])
+        norm = math.sqrt(x*x + y*y + z*z)
+        if abs(norm-1) < self.acc_gate:
+            self.gravity = (x/norm, y/norm, z/norm)
+            if not self.aligned:
+                self.align(self.gravity)
+        else:
+            self.gravity = None
+        q0, q1, q2, q3 = self.q  # after the alignment, so the first sample at 1 g has no vertical acceleration either
+        self.vertical_acc = 2*(q1*q3 - q0*q2)*x + 2*(q0*q1 + q2*q3)*y + (q0*q0 - q1*q1 - q2*q2 + q3*q3)*z - 1
+
+    def align(self, gravity):
+        '''Sets the attitude that rotates the measured direction of gravity (in the body frame) upwards, without yaw'''
+        gx, gy, gz = gravity
+        if gz < -0.999999:  # upside down, any axis in the horizontal plane will do
+            self.q = [0.0, 1.0, 0.0, 0.0]
+        else:
+            norm = math.sqrt((1+gz)**2 + gy*gy + gx*gx)
+            self.q = [(1+gz)/norm, gy/norm, -gx/norm, 0.0]  # [1 + g.up, g x up] normalised
+        self.aligned = True
+
+    def add_gyro(self, sample):
+        '''Takes a gyro sample [serial, time, [x, y, z]] in dps and integrates it'''
+        self.n_gyro += 1
+        t = sample[1]
+        self.rates = sample[2]
+        dt = t - self.gyro_time if self.gyro_time is not None else 0
+        self.gyro_time = t
+        if not 0 < dt < self.max_dt:
+            return
+        wx, wy, wz = (math.radians(rate) for rate in self.rates)
+        q0, q1, q2, q3 = self.q
+        if self.correct and self.gravity is not None:
+            # error between the measured and the estimated direction of up in the body frame
+            vx = 2*(q1*q3 - q0*q2)
+            vy = 2*(q0*q1 + q2*q3)
+            vz = q0*q0 - q1*q1 - q2*q2 + q3*q3
+            ax, ay, az = self.gravity
+            wx += self.kp*(ay*vz - az*vy)
+            wy += self.kp*(az*vx - ax*vz)
+            wz += self.kp*(ax*vy - ay*vx)
+        # q += q x (0, w)/2 dt
+        half_dt = 0.5*dt
+        q0, q1, q2, q3 = (q0 + (-q1*wx - q2*wy - q3*wz)*half_dt,
+                          q1 + (q0*wx + q2*wz - q3*wy)*half_dt,
+                          q2 + (q0*wy - q1*wz + q3*wx)*half_dt,
+                          q3 + (q0*wz + q1*wy - q2*wx)*half_dt)
+        norm = math.sqrt(q0*q0 + q1*q1 + q2*q2 + q3*q3)
+        self.q = [q0/norm, q1/norm, q2/norm, q3/norm]
+
+    def add_batch(self, gyro_samples, acc_samples):
+        '''Takes batches of gyro and accelerometer samples (e.g. read from a FIFO at once), each in time order'''
+        i = 0
+        for sample in gyro_samples:
+            while i < len(acc_samples) and acc_samples[i][1] <= sample[1]:
+                self.add_acc(acc_samples[i])
+                i += 1
+            self.add_gyro(sample)
+        for sample in acc_samples[i:]:
+            self.add_acc(sample)
+
+    @property
+    def tilt(self):
+        '''Angle between the longitudinal axis of the rocket and the vertical in degrees'''
+        q0, q1, q2, q3 = self.q
+        return math.degrees(math.acos(max(-1.0, min(1.0, 1 - 2*(q1*q1 + q2*q2)))))
+
+    @property
+    def roll_rate(self):
+        '''Rate of roll about the longitudinal axis in dps'''
+        return self.rates[2]
+
+
+class ApogeePredictor:
+    '''Predicts the time and altitude of apogee during the coast, from the altitude (without smoothing, so without its lag)
+    and the vertical acceleration (from the accelerometer and the attitude), in constant time per sample.
+    A recursive least squares fit with forgetting of h + v*t + a*t^2/2 to the recent samples gives the current altitude,
+    vertical velocity and acceleration; the deceleration beyond gravity is drag, k*v^2, and the flight to apogee is
+    predicted with that drag and gravity. Samples before burnout (the first acceleration below -g0) are ignored.
+    The baro and acc threads both feed it, so every step holds a lock'''
+    def __init__(self, g0, memory=1.0, altitude_variance=1.0, acceleration_variance=0.5, min_samples=10):
+        self.g0 = g0
+        self.memory = memory  # time constant in s of the forgetting, so it does not depend on the sampling rates
+        self.variances = (altitude_variance, acceleration_variance)  # in m^2 and (m/s^2)^2
+        self.min_samples = min_samples  # before the fit is trusted
+        self.coasting = False
+        self.start = None  # time of the first sample of the coast, t=0 of the fit
+        self.theta = [0.0, 0.0, 0.0]  # altitude, vertical velocity and vertical acceleration at the start
+        self.P = [[1e6, 0.0, 0.0], [0.0, 1e6, 0.0], [0.0, 0.0, 1e6]]  # their covariance (unscaled)
+        self.n_samples = 0
+        self.time = None  # of the last sample
+        self.apogee = None  # (time, altitude) predicted after the last sample
+        self.lock = threading.RLock()
+
+    def add_altitude(self, t, altitude):
+        with self.lock:
+            if self.coasting:
+                dt = t-self.start
+                self.update(t, (1.0, dt, 0.5*dt*dt), altitude, self.variances[0])
+
+    def add_acceleration(self, t, acceleration):
+        '''Takes the vertical acceleration in m/s^2 (gravity included, so -g0 in free fall)'''
+        with self.lock:
+            if not self.coasting:
+                if acceleration >= -self.g0:
+                    return
+                self.coasting = True
+                self.start = t
+            self.update(t, (0.0, 0.0, 1.0), acceleration, self.variances[1])
+
+    def update(self, t, x, y, variance):
+        '''One recursive least squares step with the regressors x of a sample y'''
+        with self.lock:
+            self._update(t, x, y, variance)
+
+    def _update(self, t, x, y, variance):
+        P, theta = self.P, self.theta
+        forgetting = math.exp(-(t-self.time)/self.memory) if self.time is not None and t > self.time else 1.0
+        Px = [P[i][0]*x[0] + P[i][1]*x[1] + P[i][2]*x[2] for i in range(3)]
+        K = [value/(forgetting*variance + x[0]*Px[0] + x[1]*Px[1] + x[2]*Px[2]) for value in Px]
+        error = y - (x[0]*theta[0] + x[1]*theta[1] + x[2]*theta[2])
+        self.theta = [theta[i] + K[i]*error for i in range(3)]
+        self.P = [[(P[i][j] - K[i]*Px[j])/forgetting for j in range(3)] for i in range(3)]  # P is symmetric, so x'P = Px'
+        self.n_samples += 1
+        self.time = t
+        if self.n_samples >= self.min_samples:
+            self.apogee = self.predict(t)
+
+    def state(self, t):
+        '''Returns the fitted altitude, vertical velocity and vertical acceleration at time t'''
+        with self.lock:
+            h, v, a = self.theta
+            dt = t-self.start
+        return h + v*dt + 0.5*a*dt*dt, v + a*dt, a
+
+    def predict(self, t):
+        '''Returns the time and altitude of apogee, flying on from the fitted state at t with gravity and quadratic drag'''
+        h, v, a = self.state(t)
+        if v <= 0:  # past apogee
+            return t, h
+        k = max(-a-self.g0, 0)/(v*v)  # drag deceleration per (m/s)^2
+        if k*v*v < 1e-6*self.g0:  # no measurable drag
+            return t + v/self.g0, h + v*v/(2*self.g0)
+        return t + math.atan(v*math.sqrt(k/self.g0))/math.sqrt(self.g0*k), h + math.log(1 + k*v*v/self.g0)/(2*k)
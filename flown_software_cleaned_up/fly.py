@@ -14,24 +14,40 @@ import time
 import subprocess
 import random
 import threading
-import csv
 import sys
 import shutil
 import json
+import functools
 import RPi.GPIO as GPIO
 import altimu10v5
+from acquisition import Sensor, autosave, final_save
+from estimators import AltitudeEstimator, AttitudeEstimator, ApogeePredictor
+import recover
+import telemetry
+import selftest
 
 #####################################
 # variable definitions
 
 state = 'SYSTEMS_CHECK'  # initial state
 flight_start = 0  # variable to hold start of flight. Prevents premature transit from LAUNCHED into LANDED due to similar sensor measurements
+loop_time = 0  # duration of the last state machine update
+loop_overruns = 0  # state machine updates that took longer than the interval of their state
 
 # altitude (smoothed) and vertical velocity calculations
 p0 = []
+altitudes = {}  # AltitudeEstimator per IMU, set up after calibrating the barometers
+active_barometer = None  # the IMU whose barometer is used for deploy voting
+estimate_time = None  # time of the baro sample behind p, alt and vv
+logged_barometer = None  # active_barometer and estimate_time as last logged by the state machine
+logged_estimate = None
 p = [0, 0]  # last two pressure values
 alt = [0, 0]  # last two altitude values
 vv = [0,0]  # last two vertical velocity values
+attitudes = {}  # AttitudeEstimator per IMU, fed by its gyro and acc threads
+predictors = {}  # ApogeePredictor per IMU, fed by its baro and acc threads once launched
+rate_plan = {}  # sampling rates per flight phase and sensor from the self-test, applied when the phase starts
+bus_locks = {}  # per I2C bus, so the sensor threads on a bus take turns
 
 # get config variables from config.json file into global namespace
 with open('config.json') as config_file:
@@ -51,15 +67,19 @@ def battery_full():
     return not ret
 
 def sensors_present():
-    '''Checks if all sensors are adressable'''
+    '''Checks if all sensors of the IMUs are adressable. Enough if the sensors of one IMU are,
+    so with redundant IMUs the flight can go on without a failed one'''
     if dry_run:
         return int(input('sensors present (1/0)'))
-    i2cdetect = subprocess.Popen(['/usr/sbin/i2cdetect', '-y', '1'],stdout=subprocess.PIPE,)
-    i2cout = str(i2cdetect.stdout.read())
-    addresses = [hex(altimu10v5.constants.LIS3MDL_ADDR)[2:],
-                hex(altimu10v5.constants.LPS25H_ADDR)[2:],
-                hex(altimu10v5.constants.LSM6DS33_ADDR)[2:]]
-    ret = all(map(lambda x: x in i2cout, addresses))
+    complete = []
+    for number, imu in enumerate(imus):
+        i2cdetect = subprocess.Popen(['/usr/sbin/i2cdetect', '-y', str(imu.bus_id)],stdout=subprocess.PIPE,)
+        i2cout = str(i2cdetect.stdout.read())
+        addresses = [hex(address)[2:] for address in imu.addresses]
+        complete.append(all(map(lambda x: x in i2cout, addresses)))
+        if not complete[-1]:
+            logging.warning('sensors of imu{} not present'.format(number))
+    ret = any(complete)
     if not ret:
         logging.warning('sensors not present')
     return ret
@@ -98,9 +118,7 @@ def on_landing():
         for thread in threads:
             thread.join()
         for sensor in sensors:
-            with open(datafilename+sensor.name+'.csv', 'a') as f:
-                csv.writer(f).writerow(['# final save at {}'.format(time.time())])
-                csv.writer(f).writerows(sensor.data[sensor.save_end:])
+            final_save(sensor, datafilename)
             print('logged data from {0}'.format(sensor.name))
     logging.debug('saved all data')
 
@@ -111,8 +129,10 @@ def cleanup():
 
 def update_statemachine():
     '''Updates the state variable according to the current state and any inputs'''
-    global state
+    global state, recording
     logging.info(state)
+    if recording:
+        log_estimates()
     if state == 'ERROR':
         # output audio/visual signal of ERROR state
         status_LED.red.blink(blink_half_period)
@@ -123,6 +143,8 @@ def update_statemachine():
 
     elif state == 'SYSTEMS_CHECK':
         if battery_full() and sensors_present():
+            if negotiate_rates and not dry_run:
+                self_test()
             # output audio/visual signal of transition into IDLE state
             state = 'IDLE'
         else:
@@ -136,30 +158,60 @@ def update_statemachine():
             status_LED.green.off()
             status_LED.green.blink(blink_half_period*5)
             state = 'ARMED'
+            apply_rates(state)
 
     elif state == 'ARMED':
-        if not imu.gyroAccelEnabled:
+        if not recording:
             if not dry_run:
                 logging.debug('Calibrating Gyro and Accelerometer')
-                imu.enable()
+                for number, imu in enumerate(imus):
+                    try:
+                        imu.enable()
+                    except OSError as error:  # go on with the other IMUs
+                        logging.error('imu{} could not be enabled: {}'.format(number, error))
+                enabled = [number for number, imu in enumerate(imus)
+                           if imu.gyroAccelEnabled and imu.barometerEnabled and imu.magnetometerEnabled]
                 logging.debug('Calibrating Barometer')
                 time.sleep(0.5)
                 # zero alt
-                global p0, p
+                global p0, p, sensors, threads
+                readings = {number: [] for number in enabled}
                 for i in range(50):  # for more precise calibration increase number of readings (for reference: AltIMU takes 4000 to calibrate)
-                    p0.append(imu.lps25h.get_barometer_raw()/40.96)  # converting from raw sensor reading to Pa by dividing by 40.96
-                    time.sleep(baro.interval)  # change interval if you want to spread out readings more for instance
-                p0 = sum(p0)/len(p0)
-                logging.debug('Calibrated barometer to p0={0}'.format(p0))
-                p = [p0]*2
-                logging.debug('Calibration done, starting threads')
-                status_LED.green.off()
-                status_LED.green.blink(blink_half_period)
-                # start threads to record the data
-                print('starting at {}'.format(time.time()))
-                for thread in threads:
-                    thread.start()
-        if not arm_switch_on():
+                    for number in enabled:
+                        try:
+                            readings[number].append(imus[number].lps25h.get_barometer_raw()/40.96)  # converting from raw sensor reading to Pa by dividing by 40.96
+                        except OSError:
+                            pass
+                    time.sleep(intervals['baro'])  # change interval if you want to spread out readings more for instance
+                enabled = [number for number in enabled if readings[number]]
+                for number in enabled:
+                    p0_imu = sum(readings[number])/len(readings[number])
+                    altitudes[number] = AltitudeEstimator(p0_imu, intervals['baro'], T0, a, R, g0, exp_factor_p, exp_factor_vv)
+                    if number == enabled[0]:
+                        p0 = p0_imu
+                        logging.debug('Calibrated barometer to p0={0}'.format(p0))
+                        p = [p0]*2
+                    else:
+                        logging.debug('Calibrated barometer of imu{} to p0={}'.format(number, p0_imu))
+                if enabled:
+                    logging.debug('Calibration done, starting threads')
+                    status_LED.green.off()
+                    status_LED.green.blink(blink_half_period)
+                    # start threads to record the data, one reading and one saving per sensor
+                    sensors = [sensor for number in enabled for sensor in imu_sensors[number]]
+                    threads = [threading.Thread(target=s.read, args=(stop,)) for s in sensors] \
+                            + [threading.Thread(target=autosave, args=(s,1,stop,datafilename,)) for s in sensors]
+                    print('starting at {}'.format(time.time()))
+                    for thread in threads:
+                        thread.start()
+                    recording = True
+                else:  # nothing would be recorded and there is no altitude to vote on, so no launch either
+                    logging.error('no IMU could be enabled and calibrated')
+                    status_LED.green.off()
+                    state = 'ERROR'
+        if state == 'ERROR':
+            pass  # retried once battery and sensors check out again
+        elif not arm_switch_on():
             # output audio/visual signal of transition into IDLE state
             status_LED.green.off()
             state = 'IDLE'
@@ -168,17 +220,43 @@ def update_statemachine():
             status_LED.green.off()
             global flight_start
             flight_start = time.time()
+            # from here on the accelerometer measures thrust and drag, not gravity: the gyros propagate the attitude alone
+            for number, attitude in attitudes.items():
+                attitude.correct = False
+                logging.info('tilt of imu{} at launch: {:.1f} degrees'.format(number, attitude.tilt))
             state = 'LAUNCHED'
+            apply_rates(state)
             # start the thread to watch the vertical velocity etc
 
     elif state == 'LAUNCHED':
         status_LED.alternate()
         tm = time.time()
+        attitude = select_attitude()
+        if attitude is not None:
+            logging.debug('current tilt and roll rate: {:.1f} {:.1f}'.format(attitude.tilt, attitude.roll_rate))
+        apogee = predictors[active_barometer].apogee if active_barometer is not None else None
+        if apogee is not None:
+            logging.debug('predicted apogee: {:.1f} m at {:.2f} s'.format(apogee[1], apogee[0]-flight_start))
         if (tm > flight_start+min_deploy_time) and (vv[1] < vv_deploy_threshold):
             vote_deploy()
             # output audio/visual signal of transition into DEPLOYED state
             status_LED.off()
             state = 'DEPLOYED'
+            apply_rates(state)
+        elif predict_apogee and (tm > flight_start+min_deploy_time) and apogee is not None and tm >= apogee[0]:
+            # the vertical velocity lags behind because of its smoothing, the prediction does not
+            logging.info('predicted apogee of {:.1f} m reached'.format(apogee[1]))
+            vote_deploy()
+            status_LED.off()
+            state = 'DEPLOYED'
+            apply_rates(state)
+        elif deploy_tilt and (tm > flight_start+min_deploy_time) and attitude is not None and attitude.tilt > deploy_tilt:
+            # the rocket arced over (or tumbles) before the barometer saw it descend
+            logging.warning('tilt of {:.1f} degrees exceeds deploy_tilt'.format(attitude.tilt))
+            vote_deploy()
+            status_LED.off()
+            state = 'DEPLOYED'
+            apply_rates(state)
         elif ((tm > flight_start+min_flight_duration) and (abs(alt[1]) < landing_altitude_range) and (abs(vv[1]) < landing_vertical_velocity_range)) or not arm_switch_on():
             on_landing()
             # output audio/visual signal of transition into LANDED state
@@ -274,50 +352,136 @@ class StatusLED:
         self.alternating = False
 
 
-class Sensor:
-    '''Provides functions related to reading out, storing and saving data of the sensors'''
-    def __init__(self, name, interval, function):
-        self.name = name
-        self.interval = interval
-        self.function = function
-        self.data = []
-        self.save_start = 0
-        self.save_end = 0
-
-    def read(self):
-        '''Function meant to be run as thread, reading data from sensor and storing it in attribute'''
-        serial = 0
-        next_call = time.time()
-        while not stop.is_set():
-            serial += 1
-            self.data.append([serial, time.time(), self.function()])
-            # pressure to altitude conversion for deploy voting
-            if self.name == 'baro':
-                global p, alt, vv
-                p = [p[1], exp_factor_p*(self.data[-1][2]/40.96) + (1-exp_factor_p)*p[0]]  # conversion from raw readings to Pa and smoothing
-                alt = [alt[1], T0/a*((p[1]/p0)**(-(R*a)/g0)-1)]  # conversion from p to h, no smoothing
-                vv = [vv[1], exp_factor_vv*((alt[1]-alt[0])/baro.interval) + (1-exp_factor_vv)*vv[0]]  # conversion from h to vv
-                logging.debug('current pressure, altitude and vertical velocity: '+str(p[1])+' '+str(alt[1])+' '+str(vv[1]))
-            next_call += self.interval
-            time.sleep(max(0, next_call - time.time())) # sleep only interval - time consumed in current call
-
-
-def autosave(sensor,interval):
-    '''Every interval seconds this function autosaves all sensors to their logfiles'''
-    num = 0
-    time.sleep(interval)
-    next_call = time.time()
-    while not stop.is_set():
-        sensor.save_start = round(num*interval/sensor.interval)
-        num += 1
-        sensor.save_end = round(num*interval/sensor.interval)
-        with open(datafilename+sensor.name+'.csv', 'a') as f: # opening and closing file every time
-            csv.writer(f).writerow(['#### {} autosave nr {}'.format('{:.6f}'.format(next_call)[6:],num)])
-            csv.writer(f).writerows(sensor.data[sensor.save_start:sensor.save_end])
-            delta = time.time() - next_call
-            csv.writer(f).writerow(['# autosave took {:.6f}'.format(delta)])
-        next_call += interval
-        time.sleep(max(0, interval - delta))
+def imu_sensors_of(number, imu):
+    '''Returns the baro, acc, gyro and mag Sensors of an IMU. The data files of the first IMU are named as always,
+    those of the others get its number appended (baro1, acc1, ...)'''
+    suffix = str(number) if number else ''
+    if sampling == 'data_ready':  # only record fresh samples, gated by the status registers of the sensors
+        data_ready = {'baro': imu.lps25h.barometer_data_ready,
+                      'acc': imu.lsm6ds33.accelerometer_data_ready,
+                      'gyro': imu.lsm6ds33.gyro_data_ready,
+                      'mag': imu.lis3mdl.magnetometer_data_ready}
+    else:  # 'timer': read the output registers every interval, whether there is a new conversion or not
+        data_ready = {}
+    lock = bus_locks.setdefault(imu.bus_id, threading.Lock())
+    attitudes[number] = AttitudeEstimator()  # fed with the samples as they are read, no extra bus traffic
+    predictors[number] = ApogeePredictor(g0)
+    baro = Sensor('baro'+suffix, intervals['baro'], imu.lps25h.get_barometer_raw, functools.partial(update_altitude, number), data_ready.get('baro'), lock=lock)
+    acc = Sensor('acc'+suffix, intervals['acc'], imu.lsm6ds33.get_accelerometer_raw, functools.partial(update_acceleration, number), data_ready.get('acc'), lock=lock)
+    gyro = Sensor('gyro'+suffix, intervals['gyro'], imu.lsm6ds33.get_gyro_angular_velocity, attitudes[number].add_gyro, data_ready.get('gyro'), lock=lock)
+    mag = Sensor('mag'+suffix, intervals['mag'], imu.lis3mdl.get_magnetometer_raw, None, data_ready.get('mag'), lock=lock)
+    return [baro, acc, gyro, mag]
+
+
+def select_barometer():
+    '''Returns the first IMU with a calibrated barometer that did not fail and still delivers samples'''
+    now = time.time()
+    for number in sorted(altitudes):
+        baro = imu_sensors[number][0]
+        if not baro.failed and baro.data and now - baro.data[-1][1] < 5*baro.interval:
+            return number
+    return None
+
+
+def update_altitude(number, sample):
+    '''Pressure to altitude conversion for deploy voting, called by the baro thread of IMU number with every sample.
+    Every IMU has its own estimate, the one of the selected barometer is used (logged by log_estimates)'''
+    global p, alt, vv, estimate_time, active_barometer
+    altitude = altitudes[number]
+    altitude.update(sample[2])
+    if state == 'LAUNCHED':
+        predictors[number].add_altitude(sample[1], altitude.raw_alt)
+    if number != active_barometer:
+        active_barometer = select_barometer()
+    if number == active_barometer:
+        p, alt, vv = altitude.p, altitude.alt, altitude.vv
+        estimate_time = sample[1]
+
+
+def log_estimates():
+    '''Logs the latest estimate of the selected barometer and a change of barometer. Called by the state machine,
+    so that writing the log never delays the sensor threads'''
+    global logged_barometer, logged_estimate
+    if active_barometer != logged_barometer:
+        logging.warning('deploy voting uses the barometer of imu{} now'.format(active_barometer))
+        logged_barometer = active_barometer
+    if estimate_time != logged_estimate:
+        logging.debug('current pressure, altitude and vertical velocity: '+str(p[1])+' '+str(alt[1])+' '+str(vv[1]))
+        logged_estimate = estimate_time
+
+
+def update_acceleration(number, sample):
+    '''Called by the acc thread of IMU number with every sample, for its attitude and, once launched, apogee prediction'''
+    attitude = attitudes[number]
+    attitude.add_acc(sample)
+    if state == 'LAUNCHED':
+        predictors[number].add_acceleration(sample[1], attitude.vertical_acc*g0)
+
+
+def select_attitude():
+    '''Returns the AttitudeEstimator of the first recording IMU whose gyro did not fail, None if there is none'''
+    for number in sorted(attitudes):
+        gyro = imu_sensors[number][2]
+        if recording and gyro in sensors and not gyro.failed and gyro.data:
+            return attitudes[number]
+    return None
+
+
+def self_test():
+    '''Measures the time one sample of every sensor takes per I2C bus and negotiates the sampling rates
+    of the flight phases from it (see selftest.py), filling rate_plan'''
+    buses = {}
+    for number, imu in enumerate(imus):
+        buses.setdefault(imu.bus_id, []).append(number)
+    for bus_id, numbers in buses.items():
+        costs, kinds, odrs, fixed_rates = {}, {}, {}, {}
+        for number in numbers:
+            sensors = {sensor.name.rstrip('0123456789'): sensor for sensor in imu_sensors[number]}
+            for kind, result in selftest.measure(imus[number], data_ready=sampling == 'data_ready').items():
+                sensor = sensors[kind]
+                if result is None:
+                    logging.warning('self-test: {} did not respond'.format(sensor.name))
+                    continue
+                logging.info('self-test: {} takes {:.3f} ms per sample (90th percentile {:.3f} ms), {:.0f} register reads/s'.format(
+                    sensor.name, result['median']*1000, result['p90']*1000, result['reads_per_second']))
+                costs[sensor.name] = result['cost']
+                kinds[sensor.name] = kind
+                odrs[sensor.name] = result['odr']
+                if kind == 'baro':  # the smoothing for the deploy vote is tuned to its interval
+                    fixed_rates[sensor.name] = 1/sensor.interval
+        if not costs:
+            continue
+        for phase, rates in selftest.negotiate(costs, kinds, odrs, fixed_rates, bus_utilization).items():
+            logging.info('self-test: rates on bus {} when {}: {} (bus {:.0%}), FIFO watermarks {}'.format(
+                bus_id, phase, ', '.join('{} {:.1f} Hz'.format(name, rate) for name, rate in sorted(rates.items())),
+                selftest.utilization_of(rates, costs), selftest.watermarks(rates, kinds, odrs)))
+            rate_plan.setdefault(phase, {}).update(rates)
+
+
+def apply_rates(phase):
+    '''Sets the sampling intervals negotiated by the self-test for a flight phase, the sensor threads follow at once'''
+    if phase not in rate_plan:
+        return
+    for sensor in (sensor for group in imu_sensors for sensor in group):
+        if sensor.name in rate_plan[phase]:
+            rate = rate_plan[phase][sensor.name]
+            if rate < 1/intervals[sensor.name.rstrip('0123456789')]:
+                logging.warning('{} is sampled at {:.1f} Hz only, the bus can not keep up with its interval'.format(sensor.name, rate))
+            sensor.set_interval(1/rate)
+    logging.info('sampling rates for {} applied'.format(phase))
+
+
+def telemetry_snapshot():
+    '''Current state, estimates, sample counts and loop health for the telemetry packets'''
+    attitude = select_attitude()
+    apogee = predictors[active_barometer].apogee if active_barometer is not None else None
+    return {'time': time.time(), 'state': state, 'recording': recording,
+            'threads_alive': sum(thread.is_alive() for thread in threads),
+            'pressure': p[1], 'altitude': alt[1], 'vertical_velocity': vv[1],
+            'tilt': attitude.tilt if attitude else float('nan'), 'roll_rate': attitude.roll_rate if attitude else float('nan'),
+            'time_to_apogee': apogee[0]-time.time() if apogee else float('nan'), 'apogee': apogee[1] if apogee else float('nan'),
+            'loop_time': loop_time, 'loop_overruns': loop_overruns,
+            'sensors': [(sensor.name, len(sensor.data), sensor.n_errors) for sensor in sensors]}
 
 
 #####################################
@@ -333,20 +497,25 @@ console = logging.StreamHandler(sys.stdout)
 #console.setLevel(logging.DEBUG)  # set to INFO if you want to speed up the loop
 logging.getLogger('').addHandler(console)
 
+# recover the files of earlier flights that did not end cleanly (e.g. power loss at impact) before recording again
+try:
+    recover.recover_all('data/', exclude=[os.path.basename(datafilename[:-1])])
+except Exception:
+    logging.exception('recovering earlier flights failed')
+
 # saving configuration from config file:
 shutil.copyfile('config.json', datafilename+'config.json')
 
-imu = altimu10v5.IMU()
+# one IMU per entry of devices in config.json, on its own I2C bus or on the alternate addresses (sa0 false)
+imus = [altimu10v5.IMU(device['bus_id'], sa0=device['sa0']) for device in devices]
 if dry_run:
     baro = Sensor('baro', 0.1, dummy)
     acc = Sensor('acc', 0.01, dummy)
     gyro = Sensor('gyro', 0.01, dummy)
     mag = Sensor('mag', 0.1, dummy)
+    imu_sensors = [[baro, acc, gyro, mag]]
 else:
-    baro = Sensor('baro', intervals['baro'], imu.lps25h.get_barometer_raw)
-    acc = Sensor('acc', intervals['acc'], imu.lsm6ds33.get_accelerometer_raw)
-    gyro = Sensor('gyro', intervals['gyro'], imu.lsm6ds33.get_gyro_angular_velocity)
-    mag = Sensor('mag', intervals['mag'], imu.lis3mdl.get_magnetometer_raw)
+    imu_sensors = [imu_sensors_of(number, imu) for number, imu in enumerate(imus)]
 
 # initialise GPIO ins and outs
 GPIO.setmode(GPIO.BOARD)
@@ -358,11 +527,15 @@ green_LED = LED(green_LED_pin, blink_half_period)
 red_LED = LED(red_LED_pin, blink_half_period)
 status_LED = StatusLED(green_LED, red_LED, blink_half_period)
 
-sensors = [baro, acc, gyro, mag]
-threads = [threading.Thread(target=s.read) for s in sensors] \
-        + [threading.Thread(target=autosave, args=(s,1,)) for s in sensors]
-
+sensors = [sensor for group in imu_sensors for sensor in group]  # those that record, once the threads started
 stop = threading.Event()
+threads = []
+recording = False
+
+# live telemetry for pad tests only (off unless telemetry_address is set), receive with telemetry.py
+if telemetry_rate and telemetry_address:
+    telemetry_address = tuple(telemetry_address) if isinstance(telemetry_address, list) else telemetry_address  # [host, port] or a Unix socket path
+    telemetry.Publisher(telemetry_address, 1/telemetry_rate, telemetry_snapshot).start()
 
 
 #####################################
@@ -372,6 +545,9 @@ if __name__ == '__main__':
         while True:
             start = time.time()
             update_statemachine()
-            time.sleep(max(0,(state_intervals[state]-(time.time()-start))))  # slows down the loop to max x Hz
+            loop_time = time.time()-start
+            if loop_time > state_intervals[state]:
+                loop_overruns += 1
+            time.sleep(max(0,(state_intervals[state]-loop_time)))  # slows down the loop to max x Hz
     finally:
         cleanup()
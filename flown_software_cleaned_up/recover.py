@@ -0,0 +1,242 @@
+'''
+Recovery of the data and log files of flights that did not end cleanly (e.g. power loss at impact), which can end in
+null bytes, torn lines or autosave blocks that were never closed. Every file is streamed in chunks, so the memory used
+does not depend on its size. Only the damaged files are copied to recovered_dir, keeping their valid lines (with the
+config of the flight next to them), the JSON report per flight lists all files with what was kept and what was lost.
+fly.py runs this at boot for every earlier flight that has not been recovered yet, before it starts recording.
+
+usage: python recover.py [data_dir] [flightname ...]  (all flights that were not recovered yet by default)
+'''
+
+#####################################
+# imports
+
+import os
+import sys
+import re
+import json
+import shutil
+import logging
+
+#####################################
+# scanner definitions
+
+def lines(f, chunk_size=1<<20, max_line=1<<16):
+    '''Yields every line of a binary file without its line ending and whether it was terminated, reading in chunks:
+    True, or None for the unterminated last line of the file. A line longer than max_line (only in damaged files)
+    is yielded as pieces that were not terminated (False), so memory stays bounded'''
+    partial = b''
+    broken = False
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            break
+        parts = (partial+chunk).split(b'\n')
+        partial = parts.pop()
+        for line in parts:
+            yield line, not broken  # the rest of a line that was too long is not a valid line either
+            broken = False
+        while len(partial) > max_line:
+            yield partial[:max_line], False
+            partial = partial[max_line:]
+            broken = True
+    if partial:
+        yield partial, None if not broken else False
+
+
+def scan(path, out=None, valid_line=None, chunk_size=1<<20):
+    '''Streams through a file, writes every valid line to the binary file out (if given) and returns a dict with
+    the number of bytes and lines kept and lost, and the offset of the first damage.
+    valid_line(line) classifies a line. The unterminated last line is kept (with a line ending) if it is valid,
+    as the file may just have been cut off after it, otherwise it counts as a torn tail'''
+    report = {'bytes': 0, 'kept_bytes': 0, 'lines': 0, 'invalid_lines': 0, 'null_bytes': 0, 'torn_tail': 0,
+              'first_damage': None}
+    with open(path, 'rb') as f:
+        for line, terminated in lines(f, chunk_size):
+            size = len(line)+bool(terminated)
+            if terminated is not False and valid_line(line.rstrip(b'\r')):
+                report['lines'] += 1
+                report['kept_bytes'] += size
+                if out is not None:
+                    out.write(line+b'\n')
+            else:
+                if report['first_damage'] is None:
+                    report['first_damage'] = report['bytes']
+                report['null_bytes'] += line.count(b'\0')
+                if terminated:
+                    report['invalid_lines'] += 1
+                else:
+                    report['torn_tail'] += size
+            report['bytes'] += size
+    report['lost_bytes'] = report['bytes']-report['kept_bytes']
+    return report
+
+
+class DataFile:
+    '''Classifies the lines of a sensor .csv written by fly.py and keeps track of its samples and autosave blocks'''
+    def __init__(self):
+        self.rows = 0
+        self.first_time = None
+        self.last_time = None
+        self.last_serial = 0
+        self.missing_serials = 0
+        self.blocks = 0
+        self.last_block = None
+        self.last_block_end_time = None
+        self.rows_after_last_block = 0
+        self.open_block = None
+        self.final_save = False
+
+    def __call__(self, line):
+        row = data_row.fullmatch(line)
+        if row:
+            serial, t = int(row.group(1)), float(row.group(2))
+            if serial > self.last_serial+1:
+                self.missing_serials += serial-self.last_serial-1  # samples that were never saved
+            self.last_serial = max(serial, self.last_serial)
+            self.first_time = t if self.first_time is None else self.first_time
+            self.last_time = t
+            self.rows += 1
+            self.rows_after_last_block += 1
+            return True
+        header = autosave_header.fullmatch(line)
+        if header:
+            self.open_block = int(header.group(1))
+            return True
+        if autosave_footer.fullmatch(line):
+            if self.open_block is not None:
+                self.blocks += 1
+                self.last_block = self.open_block
+                self.last_block_end_time = self.last_time
+                self.rows_after_last_block = 0
+                self.open_block = None
+            return True
+        if final_save.fullmatch(line):
+            self.final_save = True
+            return True
+        return False
+
+    def summary(self):
+        return {'rows': self.rows, 'first_time': self.first_time, 'last_time': self.last_time,
+                'last_serial': self.last_serial, 'missing_serials': self.missing_serials,
+                'complete_blocks': self.blocks, 'last_complete_block': self.last_block,
+                'last_complete_block_end_time': self.last_block_end_time,
+                'rows_after_last_complete_block': self.rows_after_last_block, 'final_save': self.final_save}
+
+
+def valid_log_line(line):
+    '''Log records and the continuation lines of multi-line records (tracebacks), as long as they are plain text'''
+    if log_record.match(line):
+        return True
+    try:
+        text = line.decode('utf-8')
+    except UnicodeDecodeError:
+        return False
+    return text.replace('\t', ' ').isprintable()
+
+#####################################
+# recovery definitions
+
+def recover_file(path, out_path, new_valid_line):
+    '''Scans path and only if it is damaged writes its valid lines to out_path (atomically), in a second pass.
+    new_valid_line returns a fresh line classifier for every pass. Returns the scan report, with the path of the copy
+    (None for a clean file), and the classifier of the last pass'''
+    valid_line = new_valid_line()
+    report = scan(path, None, valid_line)
+    report['copy'] = None
+    if report['lost_bytes']:
+        valid_line = new_valid_line()
+        with open(out_path+'.tmp', 'wb') as out:
+            report = scan(path, out, valid_line)
+        os.replace(out_path+'.tmp', out_path)
+        report['copy'] = out_path
+    return report, valid_line
+
+
+def recover_flight(data_dir, flightname, recovered_dir):
+    '''Recovers all files of a flight to recovered_dir, writes the report there and returns it'''
+    os.makedirs(recovered_dir, exist_ok=True)
+    report = {'flight': flightname, 'files': {}, 'unsaved': {}}
+    configs = []
+    for filename in sorted(os.listdir(data_dir)):
+        if not filename.startswith(flightname):
+            continue
+        path = os.path.join(data_dir, filename)
+        out_path = os.path.join(recovered_dir, filename)
+        if filename.endswith('.csv'):
+            report['files'][filename], data_file = recover_file(path, out_path, DataFile)
+            report['files'][filename].update(data_file.summary())
+        elif filename.endswith('.log'):
+            report['files'][filename] = recover_file(path, out_path, lambda: valid_log_line)[0]
+        elif filename.endswith('.json'):
+            configs.append(filename)
+    if any(r['copy'] for r in report['files'].values()):  # the copies can be loaded like a flight
+        for filename in configs:
+            shutil.copyfile(os.path.join(data_dir, filename), os.path.join(recovered_dir, filename))
+    # the samples recorded after the last save of a sensor, until the last sign of life of any sensor, were lost
+    sensors = {f: r for f, r in report['files'].items() if f.endswith('.csv') and r['last_time'] is not None}
+    report['end_time'] = max((r['last_time'] for r in sensors.values()), default=None)
+    for filename, r in sensors.items():
+        if r['final_save']:
+            continue
+        unsaved = report['end_time']-r['last_time']
+        rate = (r['rows']-1)/(r['last_time']-r['first_time']) if r['last_time'] > r['first_time'] else 0
+        report['unsaved'][filename[len(flightname)+1:-4]] = {'seconds': unsaved, 'samples_estimate': round(unsaved*rate)}
+    report['clean'] = all(r['lost_bytes'] == 0 for r in report['files'].values()) \
+                      and all(r['final_save'] for r in sensors.values())
+    with open(os.path.join(recovered_dir, flightname+'_recovery.json'), 'w') as f:
+        json.dump(report, f, indent=1)
+    return report
+
+
+def list_flights(data_dir):
+    return sorted(set(m.group(1) for m in map(flight_name.match, os.listdir(data_dir)) if m))
+
+
+def recover_all(data_dir, recovered_dir=None, exclude=()):
+    '''Recovers every flight in data_dir that was not recovered yet (except those in exclude), returns the reports'''
+    recovered_dir = recovered_dir or os.path.join(data_dir, 'recovered')
+    reports = []
+    for flightname in list_flights(data_dir):
+        if flightname in exclude or os.path.exists(os.path.join(recovered_dir, flightname+'_recovery.json')):
+            continue
+        report = recover_flight(data_dir, flightname, recovered_dir)
+        logging.info('recovered {}: {}'.format(flightname, summarize(report)))
+        reports.append(report)
+    return reports
+
+
+def summarize(report):
+    '''One line per flight with what was lost'''
+    if report['clean']:
+        return 'clean'
+    lost = ['{} lost {} bytes ({} null, {} torn, {} invalid lines)'.format(
+                f, r['lost_bytes'], r['null_bytes'], r['torn_tail'], r['invalid_lines'])
+            for f, r in report['files'].items() if r['lost_bytes']]
+    lost += ['{} unsaved for {:.2f} s (~{} samples)'.format(s, u['seconds'], u['samples_estimate'])
+             for s, u in report['unsaved'].items()]
+    return '; '.join(lost)
+
+#####################################
+# setup
+
+number = rb'-?\d+(?:\.\d+)?(?:e[+-]?\d+)?'
+data_row = re.compile(rb'(\d+),(\d+(?:\.\d+)?),(' + number + rb'|"\[' + number + rb', ' + number + rb', ' + number + rb'\]")')
+autosave_header = re.compile(rb'#### \d+\.\d+ autosave nr (\d+)')
+autosave_footer = re.compile(rb'# autosave took \d+\.\d+')
+final_save = re.compile(rb'# final save at \d+(?:\.\d+)?')
+log_record = re.compile(rb'\d{4}-\d\d-\d\d \d\d:\d\d:\d\d,\d{3} ')
+flight_name = re.compile(r'(\d\d-\d\d-\d\d_\d\d-\d\d-\d\d)[_.]')
+
+#####################################
+# main
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    data_dir = sys.argv[1] if len(sys.argv) > 1 else 'data/'
+    recovered_dir = os.path.join(data_dir, 'recovered')
+    if len(sys.argv) > 2:
+        for flightname in sys.argv[2:]:
+            print(flightname, summarize(recover_flight(data_dir, flightname, recovered_dir)))
+    else:
+        recover_all(data_dir, recovered_dir)
@@ -0,0 +1,152 @@
+'''
+Pre-flight self-test of the I2C buses: measures how long one sample of every sensor takes on the actual hardware
+(the bus transfers and the Python overhead of the sensor threads), and derives from that the highest sampling rates
+the sensors of a bus can share in every flight phase while leaving headroom (keeping the bus busy only a fraction of
+the time), never above the output data rates the drivers set up. The barometer keeps its configured rate, as the
+smoothing for the deploy vote is tuned to it.
+With negotiate_rates set in config.json (off until the negotiated rates have been flown), fly.py runs it during
+SYSTEMS_CHECK and applies the rates of a phase when its state is entered. The drivers read the output registers and
+do not use the FIFOs, so the FIFO watermarks are only logged, for when they do.
+Against a FakeSMBus the samples are timed by the simulated bus time, so the result is reproducible off-board:
+
+usage: python selftest.py [latency] [number of IMUs on the bus]  (0.0002 s and 1 by default)
+'''
+
+#####################################
+# imports
+
+import sys
+import math
+import time
+import statistics
+import altimu10v5
+from acquisition import Sensor
+
+#####################################
+# self-test definitions
+
+def read_functions(imu):
+    '''Register level reads of the sensors of an IMU: the same transfers as in flight, without enabling the sensors'''
+    return {'baro': lambda: imu.lps25h.read_1d_sensor(imu.lps25h.address, imu.lps25h.barometer_registers),
+            'acc': lambda: imu.lsm6ds33.read_3d_sensor(imu.lsm6ds33.address, imu.lsm6ds33.accel_registers),
+            'gyro': lambda: imu.lsm6ds33.read_3d_sensor(imu.lsm6ds33.address, imu.lsm6ds33.gyro_registers),
+            'mag': lambda: imu.lis3mdl.read_3d_sensor(imu.lis3mdl.address, imu.lis3mdl.magnetometer_registers)}
+
+
+def data_ready_functions(imu):
+    return {'baro': imu.lps25h.barometer_data_ready,
+            'acc': imu.lsm6ds33.accelerometer_data_ready,
+            'gyro': imu.lsm6ds33.gyro_data_ready,
+            'mag': imu.lis3mdl.magnetometer_data_ready}
+
+
+def measure(imu, n=200, data_ready=False, clock=time.perf_counter):
+    '''Returns per sensor of an IMU the median and 90th percentile time in s of one sample through Sensor.sample
+    (with a status register read if data_ready gated), the cost to plan with (the median plus cost_margin), its register
+    reads per second and the output data rate of the sensor, None if it did not respond. clock measures the time,
+    the bus_time of a FakeSMBus makes it exact'''
+    polls = data_ready_functions(imu)
+    odrs = imu.get_output_data_rates()
+    results = {}
+    for name, function in read_functions(imu).items():
+        sensor = Sensor(name, 0, function)
+        durations = []
+        for i in range(n):
+            start = clock()
+            sensor.sample()
+            if data_ready:
+                try:
+                    polls[name]()
+                except OSError:
+                    pass
+            durations.append(clock()-start)
+        if sensor.n_errors:
+            results[name] = None
+            continue
+        durations.sort()
+        median = statistics.median(durations)
+        results[name] = {'median': median, 'p90': durations[int(0.9*(n-1))], 'cost': median*(1+cost_margin),
+                         'reads_per_second': (register_reads[name]+data_ready)/median if median else math.inf, 'odr': odrs[name]}
+    return results
+
+
+def allocate(costs, weights, max_rates, budget):
+    '''Returns the rate in Hz per sensor: the budget (seconds of bus time per second) is shared in proportion to the
+    weights, so that the sum of rate*cost is the budget, but no rate goes above its max_rate (its share then goes
+    to the others) or below min_rate'''
+    rates = {}
+    remaining = list(costs)
+    while remaining:
+        total = sum(weights[name]*costs[name] for name in remaining)
+        scale = max(budget, 0)/total if total else math.inf  # rate = weight*scale
+        capped = [name for name in remaining if weights[name]*scale >= max_rates[name]]
+        if not capped:
+            rates.update({name: max(weights[name]*scale, min_rate) for name in remaining})
+            break
+        for name in capped:
+            rates[name] = max_rates[name]
+            budget -= max_rates[name]*costs[name]
+            remaining.remove(name)
+    return rates
+
+
+def negotiate(costs, kinds, odrs, fixed_rates, utilization=0.5, phases=None):
+    '''Returns {phase: {name: rate in Hz}} for the sensors on one bus. costs is the time in s of one sample per sensor
+    name, kinds the kind of every sensor (baro, acc, gyro or mag), odrs their output data rates and fixed_rates the
+    rates of those keeping theirs. utilization is the fraction of the time the bus may be busy'''
+    plan = {}
+    for phase, settings in (phases or phase_settings).items():
+        free = [name for name in costs if name not in fixed_rates]
+        max_rates = {name: min(odrs[name], settings['max_rate'] or math.inf) for name in free}
+        budget = utilization - sum(rate*costs[name] for name, rate in fixed_rates.items())
+        rates = allocate({name: costs[name] for name in free}, {name: settings['weights'][kinds[name]] for name in free},
+                         max_rates, budget)
+        plan[phase] = dict(rates, **fixed_rates)
+    return plan
+
+
+def watermarks(rates, kinds, odrs):
+    '''Returns the FIFO watermark per sensor with a FIFO: the conversions that pile up in between two reads at its rate'''
+    return {name: min(fifo_depths[kinds[name]], math.ceil(odrs[name]/rate))
+            for name, rate in rates.items() if kinds[name] in fifo_depths}
+
+
+def utilization_of(rates, costs):
+    return sum(rate*costs[name] for name, rate in rates.items())
+
+#####################################
+# setup
+
+min_rate = 1  # Hz, even if the bus is too slow for the fixed rates, so no sensor stops entirely
+register_reads = {'baro': 3, 'acc': 6, 'gyro': 6, 'mag': 6}  # per sample, one byte each
+cost_margin = 0.2  # on top of the median time of a sample, for the occasional slow one
+fifo_depths = {'acc': 682, 'gyro': 682, 'baro': 32}  # samples: 4096 words shared by acc and gyro in the LSM6DS33, 32 in the LPS25H
+# weights of the bus time per kind of sensor and the highest rate per flight phase (None for the output data rates)
+phase_settings = {
+    'ARMED': {'weights': {'acc': 1, 'gyro': 1, 'mag': 1}, 'max_rate': 50},  # can last half an hour on the pad
+    'LAUNCHED': {'weights': {'acc': 4, 'gyro': 4, 'mag': 1}, 'max_rate': 500},  # autosaving is not part of the bus time
+    'DEPLOYED': {'weights': {'acc': 1, 'gyro': 1, 'mag': 1}, 'max_rate': 100},
+}
+
+#####################################
+# main
+
+if __name__ == '__main__':
+    latency = float(sys.argv[1]) if len(sys.argv) > 1 else 0.0002
+    n_imus = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    bus = altimu10v5.FakeSMBus(latency=latency)
+    costs, kinds, odrs, fixed_rates = {}, {}, {}, {}
+    for number in range(n_imus):
+        imu = altimu10v5.IMU(bus=bus, sa0=number == 0)  # two IMUs fit on one bus, on either address
+        suffix = str(number) if number else ''
+        for name, result in measure(imu, clock=lambda: bus.bus_time).items():
+            print('{:6} {:7.3f} ms median, {:7.3f} ms p90, {:7.0f} register reads/s'.format(
+                name+suffix, result['median']*1000, result['p90']*1000, result['reads_per_second']))
+            costs[name+suffix] = result['cost']
+            kinds[name+suffix] = name
+            odrs[name+suffix] = result['odr']
+        fixed_rates['baro'+suffix] = 10
+    for phase, rates in negotiate(costs, kinds, odrs, fixed_rates).items():
+        print('{:9} {}  (bus {:.0%})  FIFO watermarks {}'.format(
+            phase, ', '.join('{} {:.1f} Hz'.format(name, rate) for name, rate in sorted(rates.items())),
+            utilization_of(rates, costs), watermarks(rates, kinds, odrs)))
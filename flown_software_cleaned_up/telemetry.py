@@ -0,0 +1,154 @@
+'''
+Live telemetry during pad tests: fly.py publishes a small binary packet with the state, the altitude, attitude and
+apogee estimates, the sample counts per sensor and the health of the main loop a few times per second over UDP (or a
+Unix datagram socket). It is off in the flight config: set telemetry_address in config.json for a pad test,
+e.g. to ["255.255.255.255", 5005] to broadcast on the local network.
+The socket never blocks, packets that cannot be sent right away are dropped, so a slow or absent receiver can not
+hold up the flight software.
+Running this file is the receiver, e.g. on a laptop on the same network or on the Pi itself for testing.
+
+usage: python telemetry.py [port|socket path]  (5005 by default)
+'''
+
+#####################################
+# imports
+
+import sys
+import os
+import time
+import socket
+import struct
+import logging
+import threading
+
+#####################################
+# packet definitions
+
+def pack(sequence, snapshot):
+    '''Returns the packet of a snapshot (see fly.py's telemetry_snapshot) of the flight software'''
+    sensors = snapshot['sensors'][:255]
+    packet = header.pack(magic, sequence & 0xffffffff, snapshot['time'],
+                         states.index(snapshot['state']) if snapshot['state'] in states else 255,
+                         bool(snapshot['recording']), min(snapshot['threads_alive'], 0xff), len(sensors),
+                         snapshot['pressure'], snapshot['altitude'], snapshot['vertical_velocity'],
+                         snapshot['tilt'], snapshot['roll_rate'], snapshot['time_to_apogee'], snapshot['apogee'],
+                         snapshot['loop_time'], min(snapshot['loop_overruns'], 0xffffffff))
+    return packet + b''.join(sensor_entry.pack(name.encode()[:6], min(count, 0xffffffff), min(errors, 0xffff))
+                             for name, count, errors in sensors)
+
+
+def unpack(packet):
+    '''Returns the snapshot in a packet, with its sequence number, or None if it is no telemetry packet'''
+    if len(packet) < header.size or packet[:4] != magic:
+        return None
+    fields = header.unpack_from(packet)
+    n_sensors = fields[6]
+    if len(packet) != header.size + n_sensors*sensor_entry.size:
+        return None
+    sensors = [sensor_entry.unpack_from(packet, header.size + i*sensor_entry.size) for i in range(n_sensors)]
+    return {'sequence': fields[1], 'time': fields[2], 'state': states[fields[3]] if fields[3] < len(states) else 'UNKNOWN',
+            'recording': bool(fields[4]), 'threads_alive': fields[5], 'pressure': fields[7], 'altitude': fields[8],
+            'vertical_velocity': fields[9], 'tilt': fields[10], 'roll_rate': fields[11], 'time_to_apogee': fields[12],
+            'apogee': fields[13], 'loop_time': fields[14], 'loop_overruns': fields[15],
+            'sensors': [(name.rstrip(b'\0').decode(), count, errors) for name, count, errors in sensors]}
+
+
+def open_socket(address):
+    '''Returns a datagram socket for an address: a path for a Unix socket or a (host, port) tuple for UDP'''
+    if isinstance(address, str):
+        return socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)  # so the ground station does not need a fixed address
+    return sock
+
+#####################################
+# publisher definitions
+
+class Publisher:
+    '''Sends a packet with a snapshot (from the function snapshot) to address every interval'''
+    def __init__(self, address, interval, snapshot):
+        self.address = address
+        self.interval = interval
+        self.snapshot = snapshot
+        self.sock = open_socket(address)
+        self.sock.setblocking(False)
+        self.sequence = 0
+        self.n_dropped = 0
+        self.n_failed = 0  # snapshots that could not be taken or packed
+
+    def send(self):
+        self.sequence += 1
+        try:
+            packet = pack(self.sequence, self.snapshot())
+        except Exception:  # a bad value in one snapshot must not end the telemetry for the rest of the test
+            self.n_failed += 1
+            if self.n_failed == 1:
+                logging.exception('telemetry snapshot failed, counting the failures from here on')
+            return
+        try:
+            self.sock.sendto(packet, self.address)
+        except OSError:  # buffer full, no receiver on the Unix socket or no network: the packet is dropped
+            self.n_dropped += 1
+
+    def run(self, stop):
+        '''Function meant to be run as (daemon) thread until stop is set'''
+        while not stop.wait(self.interval):
+            self.send()
+
+    def start(self):
+        '''Starts publishing in a daemon thread, returns the event to stop it'''
+        stop = threading.Event()
+        threading.Thread(target=self.run, args=(stop,), daemon=True).start()
+        return stop
+
+#####################################
+# receiver definitions
+
+def receive(address):
+    '''Prints every telemetry packet received on address, with the sample rates since the previous packet and lost packets'''
+    sock = open_socket(address)
+    if isinstance(address, str) and os.path.exists(address):
+        os.remove(address)
+    sock.bind(address)
+    print('listening on', address)
+    previous = None
+    lost = 0
+    while True:
+        snapshot = unpack(sock.recv(65536))
+        if snapshot is None:
+            continue
+        if previous is not None and snapshot['sequence'] > previous['sequence']:
+            lost += snapshot['sequence']-previous['sequence']-1
+        before = dict((name, count) for name, count, errors in previous['sensors']) if previous is not None else {}
+        dt = snapshot['time']-previous['time'] if previous is not None else 0
+        rates = []
+        for name, count, errors in snapshot['sensors']:
+            rate = '{:5.1f} Hz'.format((count-before[name])/dt) if name in before and dt > 0 else '    - Hz'
+            rates.append('{} {} ({}{})'.format(name, count, rate, ', {} errors'.format(errors) if errors else ''))
+        print('{} #{} {:14} alt {:8.2f} m  vv {:7.2f} m/s  p {:9.1f} Pa  tilt {:5.1f} deg  roll {:6.1f} dps  apogee {:6.1f} m in {:5.2f} s  loop {:5.1f} ms, {} overruns  threads {}  lost {}  | {}'.format(
+            time.strftime('%H:%M:%S', time.localtime(snapshot['time'])), snapshot['sequence'], snapshot['state'],
+            snapshot['altitude'], snapshot['vertical_velocity'], snapshot['pressure'], snapshot['tilt'], snapshot['roll_rate'],
+            snapshot['apogee'], snapshot['time_to_apogee'], snapshot['loop_time']*1000,
+            snapshot['loop_overruns'], snapshot['threads_alive'], lost, ', '.join(rates)))
+        previous = snapshot
+
+#####################################
+# setup
+
+magic = b'SRPT'
+# magic, sequence number, time, state, recording, alive threads, number of sensors,
+# pressure, altitude, vertical velocity, tilt, roll rate, time to and altitude of the predicted apogee, duration of the last loop, loops that overran their interval
+header = struct.Struct('<4sIdBBBBffffffffI')
+sensor_entry = struct.Struct('<6sIH')  # name, samples, bus errors
+states = ['SYSTEMS_CHECK', 'ERROR', 'IDLE', 'ARMED', 'LAUNCHED', 'DEPLOYED', 'LANDED']
+
+#####################################
+# main
+
+if __name__ == '__main__':
+    argument = sys.argv[1] if len(sys.argv) > 1 else '5005'
+    address = ('', int(argument)) if argument.isdigit() else argument  # a port or a Unix socket path
+    try:
+        receive(address)
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,11 @@
+'''
+The flight software and the tools are run from their own directories, so both are put on the import path here
+'''
+
+# imports
+import os
+import sys
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(root, 'flown_software_cleaned_up'))
+sys.path.insert(0, os.path.join(root, 'tools'))
@@ -0,0 +1,99 @@
+'''
+Tests of the sensor threads and the saving of their data (acquisition.py)
+'''
+
+# imports
+import csv
+import time
+import threading
+import pytest
+from acquisition import Sensor, write_block, final_save
+
+#####################################
+# helper definitions
+
+class Flaky:
+    '''Sensor read function that raises OSError for the calls in failing (counted from 1)'''
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.n_calls = 0
+
+    def __call__(self):
+        self.n_calls += 1
+        if self.n_calls in self.failing:
+            raise OSError(121, 'Remote I/O error')
+        return [self.n_calls, 0, 0]
+
+
+class StopAfter:
+    '''Stands in for the stop event of fly.py, is set after it has been checked n times'''
+    def __init__(self, n):
+        self.n = n
+
+    def is_set(self):
+        self.n -= 1
+        return self.n < 0
+
+#####################################
+# tests
+
+def test_samples_are_numbered_and_scheduled():
+    samples = []
+    sensor = Sensor('acc', 0.01, Flaky(), on_sample=samples.append)
+    start = sensor.next_call
+    for i in range(5):
+        assert sensor.sample() == pytest.approx(start + (i+1)*0.01)
+    assert [sample[0] for sample in sensor.data] == [1, 2, 3, 4, 5]
+    assert samples == sensor.data
+
+
+def test_failure_and_recovery_restart_the_schedule():
+    sensor = Sensor('baro', 0.01, Flaky(failing=range(1, 13)), max_errors=10, retry_interval=1)
+    sensor.next_call -= 10  # far behind, as after a long bus hang
+    for i in range(9):
+        assert sensor.sample() == pytest.approx(time.time() + 0.01, abs=0.005)
+    assert not sensor.failed
+    assert sensor.sample() == pytest.approx(time.time() + 1, abs=0.005)
+    assert sensor.failed and sensor.n_errors == 10
+    sensor.sample()
+    sensor.sample()
+    # back again: the next read is one interval after this one, not a burst to catch up on the missed ones
+    assert sensor.sample() == pytest.approx(time.time() + 0.01, abs=0.005)
+    assert not sensor.failed and sensor.errors_in_a_row == 0
+    assert sensor.n_errors == 12 and [sample[0] for sample in sensor.data] == [1]
+
+
+def test_data_ready_gating():
+    ready = [False, False, True]
+    sensor = Sensor('mag', 0.1, Flaky(), data_ready=lambda: ready.pop(0))
+    assert sensor.sample() == pytest.approx(time.time() + 0.01, abs=0.005)
+    sensor.sample()
+    assert sensor.sample() == pytest.approx(sensor.data[0][1] + 0.1 - 0.01)
+    assert sensor.n_polls == 2 and len(sensor.data) == 1
+    sensor.set_interval(0.2)
+    assert sensor.poll_interval == pytest.approx(0.02)
+
+
+def test_shared_bus_lock():
+    lock = threading.Lock()
+    held = []
+    sensor = Sensor('gyro', 0, lambda: held.append(lock.locked()) or [0, 0, 0],
+                    on_sample=lambda sample: held.append(lock.locked()), lock=lock)
+    sensor.read(StopAfter(3))
+    assert held == [True, False]*3
+    assert len(sensor.data) == 3
+
+
+def test_saving(tmp_path):
+    sensor = Sensor('acc', 0, Flaky())
+    for i in range(5):
+        sensor.sample()
+    prefix = str(tmp_path/'flight_')
+    sensor.save_end = 3
+    write_block(prefix+'acc.csv', sensor.data[:3], '#### 1234.567890 autosave nr 1', time.time())
+    final_save(sensor, prefix)
+    with open(prefix+'acc.csv') as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == ['#### 1234.567890 autosave nr 1']
+    assert rows[4][0].startswith('# autosave took') and rows[5][0].startswith('# final save at')
+    assert [int(row[0]) for row in rows[1:4]+rows[6:]] == [1, 2, 3, 4, 5]
@@ -0,0 +1,171 @@
+'''
+Tests of the on board estimators (estimators.py) on synthetic samples with known answers
+'''
+
+# imports
+import math
+import threading
+import pytest
+from estimators import AltitudeEstimator, AttitudeEstimator, ApogeePredictor
+
+#####################################
+# helper definitions
+
+def acc_sample(t, x, y, z, scale=0.122/1000):
+    '''Accelerometer sample of raw readings measuring x, y and z in g'''
+    return [0, t, [x/scale, y/scale, z/scale]]
+
+def tilted_gravity(degrees):
+    '''Direction of gravity (up) in the body frame of a rocket tilted by degrees about the x axis'''
+    return 0.0, math.sin(math.radians(degrees)), math.cos(math.radians(degrees))
+
+def coast(v0, k, g0=9.81, dt=0.001):
+    '''Yields time, altitude and acceleration of a coast from 0 m at v0 m/s with quadratic drag k*v^2, until apogee'''
+    t, h, v = 0.0, 0.0, v0
+    while v > 0:
+        a = -g0 - k*v*v
+        yield t, h, a
+        h += v*dt + 0.5*a*dt*dt
+        v += a*dt
+        t += dt
+
+#####################################
+# tests
+
+@pytest.mark.parametrize('degrees', [0, 10, 45, 90, 135, 180])
+def test_alignment_from_gravity(degrees):
+    attitude = AttitudeEstimator()
+    attitude.add_acc(acc_sample(0.0, *tilted_gravity(degrees)))
+    assert attitude.aligned
+    assert attitude.tilt == pytest.approx(degrees, abs=1e-6)
+    assert attitude.vertical_acc == pytest.approx(0, abs=1e-9)
+
+
+def test_no_alignment_under_thrust():
+    attitude = AttitudeEstimator()
+    attitude.add_acc(acc_sample(0.0, 0, 0, 5))
+    assert not attitude.aligned and attitude.gravity is None
+    assert attitude.vertical_acc == pytest.approx(4)
+
+
+def test_gyro_integration_without_correction():
+    attitude = AttitudeEstimator()
+    attitude.add_acc(acc_sample(0.0, 0, 0, 1))
+    attitude.correct = False
+    for i in range(301):  # 10 dps about x for 3 s at 100 Hz
+        attitude.add_gyro([i, i*0.01, [10.0, 0.0, 0.0]])
+    assert attitude.tilt == pytest.approx(30, abs=0.1)
+    assert attitude.roll_rate == 0.0
+    # the tilted axis now measures 3 g of thrust as less than 2 g vertical acceleration
+    attitude.add_acc(acc_sample(3.0, 0, 0, 3))
+    assert attitude.vertical_acc == pytest.approx(3*math.cos(math.radians(30))-1, abs=0.01)
+
+
+def test_roll_does_not_tilt():
+    attitude = AttitudeEstimator()
+    attitude.add_acc(acc_sample(0.0, 0, 0, 1))
+    attitude.correct = False
+    for i in range(301):
+        attitude.add_gyro([i, i*0.01, [0.0, 0.0, 360.0]])
+    assert attitude.tilt == pytest.approx(0, abs=1e-6)
+    assert attitude.roll_rate == 360.0
+
+
+def test_gaps_are_not_integrated():
+    attitude = AttitudeEstimator(max_dt=0.5)
+    attitude.correct = False
+    attitude.add_gyro([0, 0.0, [10.0, 0.0, 0.0]])
+    attitude.add_gyro([1, 1.0, [10.0, 0.0, 0.0]])
+    attitude.add_gyro([2, 1.0, [10.0, 0.0, 0.0]])
+    assert attitude.tilt == pytest.approx(0)
+
+
+def test_correction_towards_gravity():
+    attitude = AttitudeEstimator(kp=1.0)
+    attitude.add_acc(acc_sample(0.0, *tilted_gravity(20)))
+    upright = acc_sample(0.0, 0, 0, 1)
+    for i in range(1001):  # the rocket was straightened on the pad, without gyro rate
+        upright[1] = i*0.01
+        attitude.add_acc(upright)
+        attitude.add_gyro([i, i*0.01, [0.0, 0.0, 0.0]])
+    assert attitude.tilt < 0.1
+    # with the correction switched off the attitude is kept, whatever the accelerometer measures
+    attitude.correct = False
+    tilted = acc_sample(0.0, *tilted_gravity(20))
+    for i in range(1001, 2001):
+        tilted[1] = i*0.01
+        attitude.add_acc(tilted)
+        attitude.add_gyro([i, i*0.01, [0.0, 0.0, 0.0]])
+    assert attitude.tilt < 0.1
+
+
+def test_batches_are_interleaved_in_time():
+    attitude = AttitudeEstimator()
+    attitude.correct = False
+    gyro = [[i, i*0.01, [10.0, 0.0, 0.0]] for i in range(101)]
+    acc = [acc_sample(-0.005, 0, 0, 1), acc_sample(0.5, 0, 0, 3), acc_sample(2.0, 0, 0, 1)]
+    attitude.add_batch(gyro, acc)
+    assert attitude.n_gyro == 101 and attitude.n_acc == 3
+    assert attitude.tilt == pytest.approx(10, abs=0.05)
+    assert attitude.vertical_acc == pytest.approx(math.cos(math.radians(10))-1, abs=1e-3)
+
+
+def test_altitude_estimator():
+    p0 = 101325.0
+    estimator = AltitudeEstimator(p0, 0.1, 288.15, -0.0065, 287.05, 9.81, 1.0, 1.0)
+    p, alt, vv = estimator.update(p0*40.96)
+    assert (p, alt, vv) == (p0, 0, 0)
+    p, alt, vv = estimator.update(89874.6*40.96)  # 1000 m in the standard atmosphere
+    assert alt == pytest.approx(1000, abs=1)
+    assert vv == pytest.approx(alt/0.1)
+    assert estimator.raw_alt == alt
+    assert estimator.alt == [0, alt] and estimator.vv == [0, vv]
+
+
+@pytest.mark.parametrize('v0, k', [(150, 1e-6), (150, 0.0005), (250, 0.001)])
+def test_apogee_prediction_of_a_coast_with_drag(v0, k):
+    g0 = 9.81
+    predictor = ApogeePredictor(g0)
+    predictor.add_acceleration(-0.1, 30.0)  # under thrust, ignored
+    predictor.add_altitude(-0.1, -5.0)
+    assert not predictor.coasting
+    samples = list(coast(v0, k, g0))
+    true_time, true_altitude = samples[-1][0], samples[-1][1]
+    for i, (t, h, a) in enumerate(samples):
+        if i % 20 == 0:  # acc at 50 Hz
+            predictor.add_acceleration(t, a)
+        if i % 100 == 50:  # baro at 10 Hz
+            predictor.add_altitude(t, h)
+        if t > 0.75*true_time:
+            break
+    assert predictor.coasting and predictor.start == 0.0
+    time, altitude = predictor.apogee
+    assert time == pytest.approx(true_time, abs=0.05)
+    assert altitude == pytest.approx(true_altitude, abs=1.0)
+
+
+def test_apogee_prediction_needs_samples_and_stops_at_apogee():
+    predictor = ApogeePredictor(9.81, min_samples=10)
+    for i in range(9):
+        predictor.add_acceleration(i*0.1, -9.81-1)
+    assert predictor.apogee is None
+    predictor.add_acceleration(0.9, -9.81-1)
+    assert predictor.apogee is not None
+    # a fit that is already descending predicts apogee now, where it is
+    predictor.theta = [100.0, -5.0, -9.81]
+    assert predictor.predict(1.0) == (1.0, pytest.approx(100-5-9.81/2))
+
+
+def test_apogee_predictor_from_two_threads():
+    predictor = ApogeePredictor(9.81)
+    predictor.add_acceleration(0.0, -20.0)
+    def feed(add, n):
+        for i in range(1, n+1):
+            add(i*0.001, -20.0)
+    threads = [threading.Thread(target=feed, args=(predictor.add_acceleration, 2000)),
+               threading.Thread(target=feed, args=(predictor.add_altitude, 2000))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert predictor.n_samples == 4001
@@ -0,0 +1,46 @@
+'''
+Tests of the data ready simulation of the FakeSMBus and the data ready gated sampling on top of it
+'''
+
+# imports
+import time
+import threading
+import pytest
+import altimu10v5
+from acquisition import Sensor
+
+#####################################
+# tests
+
+def test_data_ready_flag_follows_the_odr():
+    bus = altimu10v5.FakeSMBus(output_data_rates={'baro': 20})
+    imu = altimu10v5.IMU(bus=bus)
+    imu.lps25h.enable()
+    time.sleep(0.06)
+    assert imu.lps25h.barometer_data_ready()
+    imu.lps25h.get_barometer_raw()
+    assert not imu.lps25h.barometer_data_ready()  # reading the output cleared it
+    time.sleep(0.06)
+    assert imu.lps25h.barometer_data_ready()
+    # the flags of the other sensors are their own
+    assert imu.lsm6ds33.accelerometer_data_ready() and imu.lsm6ds33.gyro_data_ready()
+
+
+def test_gated_sensor_records_every_conversion_once():
+    bus = altimu10v5.FakeSMBus()
+    imu = altimu10v5.IMU(bus=bus)
+    imu.lsm6ds33.enable(calibration=False)
+    odr = bus.output_data_rates['acc']
+    assert odr == 208
+    # polled four times per conversion, so none is missed
+    sensor = Sensor('acc', 1/odr, imu.lsm6ds33.get_accelerometer_raw, data_ready=imu.lsm6ds33.accelerometer_data_ready,
+                    poll_interval=1/odr/4)
+    stop = threading.Event()
+    thread = threading.Thread(target=sensor.read, args=(stop,))
+    thread.start()
+    time.sleep(0.5)
+    stop.set()
+    thread.join()
+    assert len(sensor.data)/0.5 == pytest.approx(odr, rel=0.2)
+    periods = [int(sample[1]*odr) for sample in sensor.data]
+    assert len(set(periods)) == len(periods)  # never twice from the same conversion
@@ -0,0 +1,136 @@
+'''
+Tests of the post-processing helpers (tools/post.py) on synthetic data
+'''
+
+# imports
+import numpy as np
+import pytest
+import post
+
+#####################################
+# helper definitions
+
+def recursive_smooth(data, exp_factor, initial=None):
+    smoothed = [data[0] if initial is None else initial]
+    for value in data[1 if initial is None else 0:]:
+        smoothed.append(exp_factor*value + (1-exp_factor)*smoothed[-1])
+    return smoothed[-len(data):]
+
+#####################################
+# tests
+
+@pytest.mark.parametrize('initial', [None, 100.0])
+def test_exp_smooth_is_the_recursive_formula(initial):
+    data = np.random.default_rng(1).normal(100, 5, 500)
+    assert post.exp_smooth(data, 0.2, initial) == pytest.approx(recursive_smooth(list(data), 0.2, initial))
+
+
+def test_exp_smooth_continues_where_it_stopped():
+    data = np.random.default_rng(2).normal(0, 1, 100)
+    first = post.exp_smooth(data[:60], 0.1)
+    assert np.concatenate((first, post.exp_smooth(data[60:], 0.1, first[-1]))) == pytest.approx(post.exp_smooth(data, 0.1))
+
+
+def test_sweep_alt_vv_matches_the_onboard_estimator():
+    from estimators import AltitudeEstimator
+    constants = {'T0': 288.15, 'a': -0.0065, 'R': 287.05, 'g0': 9.81}
+    p0 = 101325.0
+    times = np.arange(200)*0.1
+    raw = (p0 - 12*times**2)*40.96  # climbing faster and faster
+    baro = np.column_stack((np.arange(200), times, raw))
+    p, ps, h, vv, vvs = post.sweep_alt_vv(baro, [1.0, 0.3], [1.0], p0, **constants)
+    assert ps.shape == h.shape == vv.shape == (2, 200) and vvs.shape == (2, 1, 200)
+    estimator = AltitudeEstimator(p0, 0.1, exp_factor_p=1.0, exp_factor_vv=1.0, **constants)
+    onboard = np.array([estimator.update(value) for value in raw])
+    assert h[0] == pytest.approx(onboard[:, 1])
+    assert vv[0, 1:] == pytest.approx(onboard[1:, 2])
+    assert np.all(np.diff(h[1]) > 0)
+
+
+log = '''2019-05-24 08:47:27,324 root         INFO     SYSTEMS_CHECK
+2019-05-24 08:47:28,125 root         INFO     IDLE
+2019-05-24 08:47:28,926 root         INFO     IDLE
+2019-05-24 08:52:17,319 root         DEBUG    Calibrated barometer to p0=101511.40283203125
+2019-05-24 08:52:17,500 root         INFO     ARMED
+2019-05-24 08:52:17,892 root         DEBUG    current pressure, altitude and vertical velocity: 101510.73359375 0.054367065348901115 0.054367065348901115
+2019-05-24 08:52:17,993 root         DEBUG    current pressure, altitude and vertical velocity: 101512.5548828125 -0.0935 -1.5e-01
+2019-05-24 08:52:18,094 root         DEBUG    current pressure, altitude and vertical velocity: 101500.1 nan inf
+2019-05-24 08:52:18,195 root         DEBUG    current pressure, altitude and vertical velocity: 101490.2 1.2
+2019-05-24 08:52:18,296 root         DEBUG    current pressure, altitude and vertical velocity: 101480.3 2.3 45.
+2019-05-24 08:52:18,300 root         INFO     LAUNCHED
+2019-05-24 08:52:32,300 root         INFO     deploy vote sent
+2019-05-24 08:52:33,300 root         INFO     deploy vote sent
+2019-05-24 08:52:33,400 root         INFO     DEPLOYED
+2019-05-24 08:52:33,4'''
+
+
+def test_index_log():
+    index = post.index_log(log)
+    assert index['p0'] == 101511.40283203125
+    transitions = index['state_transitions']
+    assert [state for t, state in transitions] == ['SYSTEMS_CHECK', 'IDLE', 'ARMED', 'LAUNCHED', 'DEPLOYED',
+                                                   'SRP board min deploy time', 'SRP board max deploy time']
+    times = dict((state, t) for t, state in transitions)
+    start = times['SYSTEMS_CHECK']
+    assert times['IDLE']-start == pytest.approx(0.801)  # the first IDLE
+    assert times['LAUNCHED']-start == pytest.approx(290.976)
+    assert times['SRP board min deploy time']-times['LAUNCHED'] == 14
+    assert index['deploy_vote']-times['LAUNCHED'] == pytest.approx(14.0)  # the first vote
+    onboard = index['onboard']
+    # the line cut off after two values is skipped, nan and inf are parsed
+    assert onboard.shape == (4, 4)
+    assert onboard[:, 0]-start == pytest.approx([290.568, 290.669, 290.770, 290.972])
+    assert onboard[1, 1:] == pytest.approx([101512.5548828125, -0.0935, -0.15])
+    assert np.isnan(onboard[2, 2]) and onboard[2, 3] == np.inf
+    assert onboard[3, 3] == 45
+
+
+def test_index_log_without_log_lines():
+    with pytest.raises(ValueError):
+        post.index_log('')
+    assert post.index_log(log.split('\n')[0])['onboard'].shape == (0, 4)
+
+
+def test_get_launchtime():
+    transitions = post.index_log(log)['state_transitions']
+    assert post.get_launchtime(transitions) == dict((state, t) for t, state in transitions)['LAUNCHED']
+    assert post.get_launchtime([[1.0, 'IDLE'], [2.0, 'ARMED']]) is None
+    # the transitions are looked up by name, not by their position in the list
+    assert post.get_launchtime([[5.0, 'LAUNCHED'], [1.0, 'IDLE']]) == 5.0
+
+
+def test_minmax_decimate_keeps_the_peaks():
+    x = np.linspace(0, 100, 100001)
+    y = np.sin(x)
+    y[12345] = 10
+    y[54321] = -10
+    indices = post.minmax_decimate(x, y, 0, 100, 500)
+    assert len(indices) <= 2*500
+    assert np.all(np.diff(indices) > 0)
+    assert {12345, 54321} <= set(indices)
+    assert y[indices].max() == 10 and y[indices].min() == -10
+
+
+def test_minmax_decimate_to_the_limits():
+    x = np.arange(1000.0)
+    y = np.zeros(1000)
+    assert list(post.minmax_decimate(x, y, 100, 110, 50)) == list(range(99, 112))  # one point beyond on both sides
+    indices = post.minmax_decimate(x, y, 100, 900, 50)
+    assert indices[0] == 99 and indices[-1] <= 901 and len(indices) <= 100
+    assert list(post.minmax_decimate(x[:0], y[:0], 0, 1, 50)) == []
+
+
+def test_decimated_plot_follows_the_x_limits():
+    matplotlib = pytest.importorskip('matplotlib')
+    matplotlib.use('Agg')
+    from matplotlib import pyplot as plt
+    fig, ax = plt.subplots(figsize=(4, 3), dpi=100)
+    x = np.linspace(0, 100, 200001)
+    plot = post.DecimatedPlot(ax, x, np.column_stack((np.sin(x), np.cos(x))))
+    assert len(plot.lines) == 2
+    full = plot.lines[0].get_xdata()
+    assert full[0] == 0 and full[-1] == 100 and len(full) <= 2*ax.bbox.width
+    ax.set_xlim(10, 20)
+    zoomed = plot.lines[0].get_xdata()
+    assert zoomed[0] < 10 < zoomed[1] and zoomed[-2] < 20 < zoomed[-1]
+    plt.close(fig)
@@ -0,0 +1,97 @@
+'''
+Tests of the recovery of flights that did not end cleanly (recover.py)
+'''
+
+# imports
+import io
+import json
+import recover
+
+#####################################
+# helper definitions
+
+rows = b'1,1558681720.1,41580\r\n2,1558681720.2,41581\r\n'
+block = b'#### 81720.000000 autosave nr 1\r\n' + rows + b'# autosave took 0.000100\r\n'
+
+
+def scan_bytes(tmp_path, data, valid_line=None, chunk_size=1<<20):
+    path = tmp_path/'file.csv'
+    path.write_bytes(data)
+    out = io.BytesIO()
+    report = recover.scan(str(path), out, valid_line or recover.DataFile(), chunk_size)
+    return report, out.getvalue()
+
+
+def write_flight(directory, flightname, baro, log=b'2019-05-24 08:47:27,123 root         INFO     ARMED\n'):
+    (directory/(flightname+'_baro.csv')).write_bytes(baro)
+    (directory/(flightname+'.log')).write_bytes(log)
+    (directory/(flightname+'_config.json')).write_text(json.dumps({'g0': 9.81}))
+
+#####################################
+# tests
+
+def test_clean_file_is_kept_entirely(tmp_path):
+    report, out = scan_bytes(tmp_path, block + b'# final save at 1558681721.0\r\n')
+    assert out == block + b'# final save at 1558681721.0\r\n'
+    assert report['lost_bytes'] == 0 and report['first_damage'] is None
+
+
+def test_null_bytes_are_dropped(tmp_path):
+    report, out = scan_bytes(tmp_path, block + b'\0'*100 + b'\n' + rows)
+    assert out == block + rows
+    assert report['null_bytes'] == 100 and report['invalid_lines'] == 1
+    assert report['first_damage'] == len(block)
+
+
+def test_torn_tail_is_dropped(tmp_path):
+    report, out = scan_bytes(tmp_path, block + b'3,1558681720.3,"[1, 2')
+    assert out == block
+    assert report['torn_tail'] == len(b'3,1558681720.3,"[1, 2')
+
+
+def test_complete_last_row_without_line_ending_is_kept(tmp_path):
+    data_file = recover.DataFile()
+    report, out = scan_bytes(tmp_path, block + b'3,1558681720.3,41582', data_file)
+    assert out.endswith(b'3,1558681720.3,41582\n')
+    assert report['torn_tail'] == 0 and report['lost_bytes'] == 0
+    assert data_file.rows == 3 and data_file.rows_after_last_block == 1
+
+
+def test_lines_are_found_across_chunks(tmp_path):
+    data = block*20
+    report, out = scan_bytes(tmp_path, data, chunk_size=7)
+    assert out == data and report['lines'] == 20*4
+
+
+def test_overlong_line_is_dropped_in_pieces(tmp_path):
+    path = tmp_path/'file.csv'
+    path.write_bytes(rows + b'x'*(1<<17) + b'\n' + rows)
+    with open(str(path), 'rb') as f:
+        lines = list(recover.lines(f, chunk_size=1<<12, max_line=1<<16))
+    assert [terminated for line, terminated in lines] == [True, True, False, False, True, True]
+    report = recover.scan(str(path), io.BytesIO(), recover.DataFile())
+    assert report['lines'] == 4 and report['lost_bytes'] == (1<<17)+1
+
+
+def test_data_file_counts_missing_serials_and_blocks():
+    data_file = recover.DataFile()
+    for line in (block + b'5,1558681720.5,41585').split(b'\r\n'):
+        data_file(line)
+    summary = data_file.summary()
+    assert summary['missing_serials'] == 2
+    assert summary['complete_blocks'] == 1 and summary['rows_after_last_complete_block'] == 1
+
+
+def test_only_damaged_files_are_copied(tmp_path):
+    data_dir = tmp_path/'data'
+    data_dir.mkdir()
+    write_flight(data_dir, '24-05-19_08-47-27', block)
+    write_flight(data_dir, '25-05-19_10-00-00', block + b'\0\0\0')
+    recovered = tmp_path/'recovered'
+    reports = {report['flight']: report for report in recover.recover_all(str(data_dir), str(recovered))}
+    assert sorted(path.name for path in recovered.iterdir()) == [
+        '24-05-19_08-47-27_recovery.json', '25-05-19_10-00-00_baro.csv', '25-05-19_10-00-00_config.json',
+        '25-05-19_10-00-00_recovery.json']
+    assert reports['24-05-19_08-47-27']['files']['24-05-19_08-47-27_baro.csv']['copy'] is None
+    assert (recovered/'25-05-19_10-00-00_baro.csv').read_bytes() == block
+    assert recover.recover_all(str(data_dir), str(recovered)) == []  # already recovered
@@ -0,0 +1,80 @@
+'''
+Tests of the pre-flight bus self-test and the rate negotiation (selftest.py) against the FakeSMBus
+'''
+
+# imports
+import pytest
+import altimu10v5
+import selftest
+
+#####################################
+# helper definitions
+
+costs = {'baro': 0.0006, 'acc': 0.0012, 'gyro': 0.0012, 'mag': 0.0012}
+kinds = {name: name for name in costs}
+odrs = {'baro': 12.5, 'acc': 208, 'gyro': 208, 'mag': 10}
+
+#####################################
+# tests
+
+def test_allocate_fills_the_budget_in_proportion_to_the_weights():
+    rates = selftest.allocate({'acc': 0.001, 'gyro': 0.002}, {'acc': 2, 'gyro': 1}, {'acc': 1e3, 'gyro': 1e3}, 0.4)
+    assert selftest.utilization_of(rates, {'acc': 0.001, 'gyro': 0.002}) == pytest.approx(0.4)
+    assert rates['acc'] == pytest.approx(2*rates['gyro'])
+
+
+def test_allocate_gives_the_share_of_a_capped_sensor_to_the_others():
+    rates = selftest.allocate({'acc': 0.001, 'mag': 0.001}, {'acc': 1, 'mag': 1}, {'acc': 1e3, 'mag': 10}, 0.5)
+    assert rates == {'mag': 10, 'acc': pytest.approx(490)}
+
+
+def test_allocate_keeps_min_rate_on_a_bus_that_is_too_slow():
+    rates = selftest.allocate({'acc': 0.1}, {'acc': 1}, {'acc': 100}, -0.2)
+    assert rates == {'acc': selftest.min_rate}
+
+
+def test_negotiate_stays_within_the_utilization_and_the_odrs():
+    plan = selftest.negotiate(costs, kinds, odrs, {'baro': 10}, utilization=0.5)
+    assert set(plan) == set(selftest.phase_settings)
+    for phase, rates in plan.items():
+        assert rates['baro'] == 10
+        assert selftest.utilization_of(rates, costs) <= 0.5 + 1e-9
+        assert all(rates[name] <= odrs[name] for name in rates)
+        max_rate = selftest.phase_settings[phase]['max_rate']
+        assert all(rates[name] <= max_rate for name in ('acc', 'gyro', 'mag'))
+    assert plan['LAUNCHED']['acc'] == pytest.approx(plan['LAUNCHED']['gyro'])
+    assert plan['LAUNCHED']['mag'] == 10  # capped at its ODR, the rest goes to acc and gyro
+    assert selftest.utilization_of(plan['LAUNCHED'], costs) == pytest.approx(0.5)
+
+
+def test_negotiate_caps_at_the_odrs_on_a_fast_bus():
+    plan = selftest.negotiate({name: 1e-6 for name in costs}, kinds, odrs, {'baro': 10})
+    assert plan['LAUNCHED'] == {'baro': 10, 'acc': 208, 'gyro': 208, 'mag': 10}
+
+
+def test_measure_on_the_fake_bus_is_exact():
+    bus = altimu10v5.FakeSMBus(latency=0.0002)
+    imu = altimu10v5.IMU(bus=bus)
+    results = selftest.measure(imu, n=20, clock=lambda: bus.bus_time)
+    for name, result in results.items():
+        assert result['median'] == pytest.approx(selftest.register_reads[name]*0.0002)
+        assert result['cost'] == pytest.approx(result['median']*(1+selftest.cost_margin))
+        assert result['odr'] == imu.get_output_data_rates()[name]
+    again = selftest.measure(altimu10v5.IMU(bus=bus), n=20, clock=lambda: bus.bus_time)
+    assert {name: result['cost'] for name, result in again.items()} == \
+        pytest.approx({name: result['cost'] for name, result in results.items()})
+
+
+def test_measure_reports_absent_sensors():
+    bus = altimu10v5.FakeSMBus(absent=[altimu10v5.LPS25H_ADDR])
+    results = selftest.measure(altimu10v5.IMU(bus=bus), n=5, clock=lambda: bus.bus_time)
+    assert results['baro'] is None and results['acc'] is not None
+
+
+def test_odrs_are_decoded_from_the_enable_register_values():
+    assert altimu10v5.IMU(bus=altimu10v5.FakeSMBus()).get_output_data_rates() == \
+        {'baro': 12.5, 'acc': 208, 'gyro': 208, 'mag': 10}
+
+
+def test_watermarks_are_the_conversions_between_two_reads():
+    assert selftest.watermarks({'acc': 26, 'gyro': 208, 'mag': 5}, kinds, odrs) == {'acc': 8, 'gyro': 1}
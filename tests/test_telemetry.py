@@ -0,0 +1,69 @@
+'''
+Tests of the telemetry packets and the publisher (telemetry.py)
+'''
+
+# imports
+import os
+import socket
+import pytest
+import telemetry
+
+#####################################
+# helper definitions
+
+def snapshot(**changes):
+    values = {'time': 1558681723.25, 'state': 'LAUNCHED', 'recording': True, 'threads_alive': 8,
+              'pressure': 101325.5, 'altitude': 123.25, 'vertical_velocity': -4.5, 'tilt': 12.5, 'roll_rate': 250.0,
+              'time_to_apogee': 2.5, 'apogee': 714.5, 'loop_time': 0.0125, 'loop_overruns': 3,
+              'sensors': [('baro', 1000, 0), ('acc', 2000, 1), ('gyro1', 5000, 2)]}
+    values.update(changes)
+    return values
+
+#####################################
+# tests
+
+def test_pack_unpack_round_trip():
+    sent = snapshot()
+    received = telemetry.unpack(telemetry.pack(42, sent))
+    assert received.pop('sequence') == 42
+    assert received.pop('time') == sent.pop('time')  # a double
+    sensors = sent.pop('sensors')
+    assert received.pop('sensors') == sensors
+    assert received == pytest.approx(sent)
+
+
+def test_out_of_range_fields_are_clamped():
+    received = telemetry.unpack(telemetry.pack(2**32+5, snapshot(threads_alive=300, loop_overruns=2**40,
+                                                                 sensors=[('magnetometer', 2**33, 70000)])))
+    assert received['sequence'] == 5
+    assert received['threads_alive'] == 255
+    assert received['loop_overruns'] == 2**32-1
+    assert received['sensors'] == [('magnet', 2**32-1, 0xffff)]
+
+
+def test_unknown_state_and_foreign_packets():
+    assert telemetry.unpack(telemetry.pack(1, snapshot(state='TESTING')))['state'] == 'UNKNOWN'
+    assert telemetry.unpack(b'hello') is None
+    assert telemetry.unpack(telemetry.pack(1, snapshot())[:-1]) is None
+
+
+def test_publisher_sends_and_survives_bad_snapshots(tmp_path):
+    address = str(tmp_path/'telemetry')
+    receiver = telemetry.open_socket(address)
+    receiver.bind(address)
+    receiver.settimeout(1)
+    snapshots = [snapshot(), snapshot(pressure=None), snapshot(tilt=2.0)]
+    publisher = telemetry.Publisher(address, 0.01, lambda: snapshots.pop(0))
+    for i in range(3):
+        publisher.send()
+    assert publisher.n_failed == 1 and publisher.n_dropped == 0
+    received = [telemetry.unpack(receiver.recv(65536)) for i in range(2)]
+    assert [packet['sequence'] for packet in received] == [1, 3]
+    assert received[1]['tilt'] == 2.0
+    receiver.close()
+
+
+def test_publisher_drops_packets_without_a_receiver(tmp_path):
+    publisher = telemetry.Publisher(str(tmp_path/'nobody'), 0.01, snapshot)
+    publisher.send()
+    assert publisher.n_dropped == 1
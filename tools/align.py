@@ -0,0 +1,86 @@
+'''
+Puts the sensors of a flight, each sampled by its own thread with jittery timestamps, onto one common timebase:
+either a uniform grid or the timestamps of one of the sensors. The result is a single table in physical units.
+
+usage: python align.py flightname [rate in Hz|sensor name] [output.npy|output.csv]
+'''
+
+# imports
+import sys
+import numpy as np
+import post
+
+#####################################
+# function definitions
+
+def resample(times, values, new_times, method='linear'):
+    '''Resamples values (one row per timestamp in times, which has to be sorted) to new_times,
+    either linearly interpolated or with a zero-order hold. Timestamps outside of times get nan'''
+    times = np.asarray(times)
+    values = np.asarray(values, dtype=float).reshape(len(times), -1)
+    new_times = np.asarray(new_times)
+    if len(times) < 2:
+        return np.full((len(new_times), values.shape[1]), np.nan)
+    left = np.clip(np.searchsorted(times, new_times, side='right')-1, 0, len(times)-2)
+    if method == 'hold':
+        hold = np.where(new_times >= times[left+1], left+1, left)
+        resampled = values[hold]
+    elif method == 'linear':
+        dt = times[left+1]-times[left]
+        frac = np.divide(new_times-times[left], dt, out=np.zeros(len(new_times)), where=dt > 0)
+        resampled = values[left]+frac[:, None]*(values[left+1]-values[left])
+    else:
+        raise ValueError('unknown resampling method: '+method)
+    resampled[(new_times < times[0]) | (new_times > times[-1])] = np.nan
+    return resampled
+
+def physical_units(sensors):
+    '''Returns the readings of every sensor converted from raw values to Pa, g, dps and gauss'''
+    return {'baro': np.asarray(sensors['baro'][:, 2:])/40.96,
+            'acc': post.calculate_acc_g(sensors['acc']),
+            'gyro': post.calculate_gyro_dps(sensors['gyro']),
+            'mag': post.calculate_mag_gaus(sensors['mag'])}
+
+def align(sensors, timebase=None, method='linear'):
+    '''Returns the timestamps and a table with one column per sensor axis, all on the same timebase, and the column names.
+    timebase can be a rate in Hz for a uniform grid over the time all sensors were recording, the name of a sensor
+    to use its timestamps, or an array of timestamps. By default the uniform grid has the rate of the fastest sensor'''
+    readings = physical_units(sensors)
+    if timebase is None or isinstance(timebase, (int, float)):
+        start = max(sensors[name][0, 1] for name in sensors)
+        end = min(sensors[name][-1, 1] for name in sensors)
+        rate = timebase or max(1/np.median(np.diff(sensors[name][:, 1])) for name in sensors)
+        times = np.arange(start, end, 1/rate)
+    elif isinstance(timebase, str):
+        times = np.asarray(sensors[timebase][:, 1])
+    else:
+        times = np.asarray(timebase)
+    table = np.column_stack([resample(sensors[name][:, 1], readings[name], times, method) for name in sensors])
+    return times, table, aligned_columns
+
+def export(path, times, table, columns=None):
+    '''Writes an aligned table to .npy (fast, memory-mappable) or .csv, with the timestamps as first column'''
+    data = np.column_stack((times, table))
+    if path.endswith('.npy'):
+        np.save(path, data)
+    else:
+        np.savetxt(path, data, delimiter=',', header=','.join(['time']+(columns or aligned_columns)))
+
+#####################################
+# setup
+
+aligned_columns = ['pressure', 'acc_x', 'acc_y', 'acc_z', 'gyro_x', 'gyro_y', 'gyro_z', 'mag_x', 'mag_y', 'mag_z']
+
+#####################################
+# main
+
+if __name__ == '__main__':
+    flightname = sys.argv[1]
+    timebase = sys.argv[2] if len(sys.argv) > 2 else None
+    if timebase is not None and timebase not in post.sensors:
+        timebase = float(timebase)
+    output = sys.argv[3] if len(sys.argv) > 3 else flightname+'_aligned.npy'
+    sensors = post.load_flight(post.data_dir, flightname)[0]
+    times, table, columns = align(sensors, timebase)
+    export(output, times, table, columns)
+    print('wrote', table.shape[0], 'rows to', output)
@@ -0,0 +1,99 @@
+'''
+Replays a recorded flight through the estimators fly.py runs on board (estimators.py), sample by sample in the order
+they were recorded, and compares the predicted apogee (ApogeePredictor) and the deploy votes with the apogee of the
+offline trajectory (trajectory.py).
+
+usage: python apogee.py [flightname ...]  (24-05-19_08-47-27 by default)
+'''
+
+# imports
+import sys
+import os
+import numpy as np
+import post
+import trajectory
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'flown_software_cleaned_up'))
+from estimators import AltitudeEstimator, AttitudeEstimator, ApogeePredictor
+
+#####################################
+# function definitions
+
+def samples_in_order(sensors, names=('baro', 'acc', 'gyro')):
+    '''Yields (name, [serial, time, value]) of all samples of the named sensors in the order of their timestamps,
+    value as fly.py passes it to on_sample (a number for the barometer, a list of three otherwise)'''
+    times = np.concatenate([sensors[name][:, 1] for name in names])
+    which = np.concatenate([np.full(len(sensors[name]), i) for i, name in enumerate(names)])
+    rows = np.concatenate([np.arange(len(sensors[name])) for name in names])
+    for i in np.argsort(times, kind='stable'):
+        name = names[which[i]]
+        row = sensors[name][rows[i]]
+        yield name, [int(row[0]), float(row[1]), float(row[2]) if name == 'baro' else row[2:].tolist()]
+
+
+def replay(sensors, config, p0, launchtime):
+    '''Feeds the samples to the estimators as fly.py does from launchtime on and returns a dict of arrays
+    with the time, smoothed vertical velocity and predicted apogee (time and altitude) after every barometer sample'''
+    altitude = AltitudeEstimator(p0, config['intervals']['baro'], config['T0'], config['a'], config['R'], config['g0'],
+                                 config['exp_factor_p'], config['exp_factor_vv'])
+    attitude = AttitudeEstimator()
+    predictor = ApogeePredictor(config['g0'])
+    out = {'time': [], 'vv': [], 'apogee_time': [], 'apogee_altitude': []}
+    launched = False
+    for name, sample in samples_in_order(sensors):
+        if not launched and sample[1] >= launchtime:
+            launched = True
+            attitude.correct = False
+        if name == 'gyro':
+            attitude.add_gyro(sample)
+        elif name == 'acc':
+            attitude.add_acc(sample)
+            if launched:
+                predictor.add_acceleration(sample[1], config['g0']*attitude.vertical_acc)
+        else:
+            altitude.update(sample[2])
+            if launched:
+                predictor.add_altitude(sample[1], altitude.raw_alt)
+            out['time'].append(sample[1])
+            out['vv'].append(altitude.vv[1])
+            out['apogee_time'].append(predictor.apogee[0] if predictor.apogee else np.nan)
+            out['apogee_altitude'].append(predictor.apogee[1] if predictor.apogee else np.nan)
+    return {key: np.array(values) for key, values in out.items()}
+
+
+def deploy_votes(replayed, config, launchtime, min_deploy_time=None):
+    '''Returns the time of the deploy vote by vertical velocity and by predicted apogee (nan if none)'''
+    min_deploy_time = config['min_deploy_time'] if min_deploy_time is None else min_deploy_time
+    t = replayed['time']
+    armed = t > launchtime+min_deploy_time
+    by_vv = t[armed & (replayed['vv'] < config['vv_deploy_threshold'])]
+    by_prediction = t[armed & (t >= replayed['apogee_time'])]
+    return by_vv[0] if len(by_vv) else np.nan, by_prediction[0] if len(by_prediction) else np.nan
+
+
+def report(flightname):
+    sensors, config, log_index = post.load_flight(post.data_dir, flightname)
+    launchtime = post.get_launchtime(log_index['state_transitions'])
+    if launchtime is None:
+        print(flightname+': no launch')
+        return
+    replayed = replay(sensors, config, log_index['p0'], launchtime)
+    reference = trajectory.flight_trajectory(sensors, config, log_index)
+    apogee_time, apogee = reference['apogee_time'][0], reference['apogee'][0]
+    print('{}: apogee {:.1f} m at {:.2f} s after launch (trajectory.py)'.format(flightname, apogee, apogee_time-launchtime))
+    for seconds in (3, 4, 5, 6, 7, 8, 9, 10, 11, 12):
+        i = np.searchsorted(replayed['time'], launchtime+seconds)
+        if i < len(replayed['time']):
+            print('  at {:4.1f} s predicted {:6.1f} m at {:5.2f} s  (error {:+6.1f} m, {:+5.2f} s)'.format(
+                seconds, replayed['apogee_altitude'][i], replayed['apogee_time'][i]-launchtime,
+                replayed['apogee_altitude'][i]-apogee, replayed['apogee_time'][i]-apogee_time))
+    for min_deploy_time in (config['min_deploy_time'], 0):
+        by_vv, by_prediction = deploy_votes(replayed, config, launchtime, min_deploy_time)
+        print('  deploy vote with min_deploy_time {} s: by vv at {:.2f} s, by prediction at {:.2f} s after launch'.format(
+            min_deploy_time, by_vv-launchtime, by_prediction-launchtime))
+
+#####################################
+# main
+
+if __name__ == '__main__':
+    for flightname in sys.argv[1:] or ['24-05-19_08-47-27']:
+        report(flightname)
@@ -0,0 +1,161 @@
+'''
+Offline attitude reconstruction of a whole flight with a Madgwick 9-DOF (MARG) filter over the aligned
+gyro, accelerometer and magnetometer streams (see align.py).
+The rocket's longitudinal axis is the sensor z axis, so the roll of the rocket is the rotation about body z.
+The recursive filter loop is compiled with numba when it is installed, everything around it is vectorized NumPy.
+
+usage: python attitude.py flightname [beta]
+'''
+
+# imports
+import sys
+import math
+import numpy as np
+import post
+import align
+try:
+    from numba import njit
+except ImportError:  # the filter loop then runs as plain Python, which takes a few times longer
+    njit = None
+
+#####################################
+# function definitions
+
+def madgwick_loop(q, gyro, acc, mag, dt, beta, correct):
+    '''Runs the Madgwick MARG update for every sample, starting from quaternion q (w, x, y, z).
+    gyro in rad/s, acc and mag normalised, dt per sample, beta per sample and correct whether acc and mag may be used.
+    Returns the quaternion after every sample'''
+    n = len(dt)
+    out = np.empty((n, 4))
+    q0, q1, q2, q3 = q[0], q[1], q[2], q[3]
+    for i in range(n):
+        gx, gy, gz = gyro[i, 0], gyro[i, 1], gyro[i, 2]
+        # rate of change of quaternion from gyroscope
+        qdot0 = 0.5*(-q1*gx - q2*gy - q3*gz)
+        qdot1 = 0.5*(q0*gx + q2*gz - q3*gy)
+        qdot2 = 0.5*(q0*gy - q1*gz + q3*gx)
+        qdot3 = 0.5*(q0*gz + q1*gy - q2*gx)
+        if correct[i]:
+            ax, ay, az = acc[i, 0], acc[i, 1], acc[i, 2]
+            mx, my, mz = mag[i, 0], mag[i, 1], mag[i, 2]
+            # reference direction of the earth's magnetic field, b = (bx, 0, bz), doubled
+            hx = mx*(q0*q0 + q1*q1 - q2*q2 - q3*q3) + 2*my*(q1*q2 - q0*q3) + 2*mz*(q0*q2 + q1*q3)
+            hy = 2*mx*(q0*q3 + q1*q2) + my*(q0*q0 - q1*q1 + q2*q2 - q3*q3) + 2*mz*(q2*q3 - q0*q1)
+            bx2 = 2*math.sqrt(hx*hx + hy*hy)
+            bz2 = 2*(2*mx*(q1*q3 - q0*q2) + 2*my*(q0*q1 + q2*q3) + mz*(q0*q0 - q1*q1 - q2*q2 + q3*q3))
+            bx4 = 2*bx2
+            bz4 = 2*bz2
+            # objective function errors (estimated minus measured direction of gravity and magnetic field)
+            fa0 = 2*(q1*q3 - q0*q2) - ax
+            fa1 = 2*(q0*q1 + q2*q3) - ay
+            fa2 = 1 - 2*(q1*q1 + q2*q2) - az
+            fm0 = bx2*(0.5 - q2*q2 - q3*q3) + bz2*(q1*q3 - q0*q2) - mx
+            fm1 = bx2*(q1*q2 - q0*q3) + bz2*(q0*q1 + q2*q3) - my
+            fm2 = bx2*(q0*q2 + q1*q3) + bz2*(0.5 - q1*q1 - q2*q2) - mz
+            # gradient descent step (transposed jacobian times the errors)
+            s0 = -2*q2*fa0 + 2*q1*fa1 - bz2*q2*fm0 + (-bx2*q3 + bz2*q1)*fm1 + bx2*q2*fm2
+            s1 = 2*q3*fa0 + 2*q0*fa1 - 4*q1*fa2 + bz2*q3*fm0 + (bx2*q2 + bz2*q0)*fm1 + (bx2*q3 - bz4*q1)*fm2
+            s2 = -2*q0*fa0 + 2*q3*fa1 - 4*q2*fa2 + (-bx4*q2 - bz2*q0)*fm0 + (bx2*q1 + bz2*q3)*fm1 + (bx2*q0 - bz4*q2)*fm2
+            s3 = 2*q1*fa0 + 2*q2*fa1 + (-bx4*q3 + bz2*q1)*fm0 + (-bx2*q0 + bz2*q2)*fm1 + bx2*q1*fm2
+            norm = math.sqrt(s0*s0 + s1*s1 + s2*s2 + s3*s3)
+            if norm > 0:
+                qdot0 -= beta[i]*s0/norm
+                qdot1 -= beta[i]*s1/norm
+                qdot2 -= beta[i]*s2/norm
+                qdot3 -= beta[i]*s3/norm
+        q0 += qdot0*dt[i]
+        q1 += qdot1*dt[i]
+        q2 += qdot2*dt[i]
+        q3 += qdot3*dt[i]
+        norm = math.sqrt(q0*q0 + q1*q1 + q2*q2 + q3*q3)
+        q0 /= norm
+        q1 /= norm
+        q2 /= norm
+        q3 /= norm
+        out[i, 0] = q0
+        out[i, 1] = q1
+        out[i, 2] = q2
+        out[i, 3] = q3
+    return out
+
+def normalise(vectors):
+    norm = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return np.divide(vectors, norm, out=np.zeros_like(vectors), where=norm > 0)
+
+def quaternion_to_euler(q):
+    '''Returns roll (about x), pitch (about y) and yaw (about z) in degrees, ZYX convention'''
+    w, x, y, z = q.T
+    roll = np.arctan2(2*(w*x + y*z), 1 - 2*(x*x + y*y))
+    pitch = np.arcsin(np.clip(2*(w*y - z*x), -1, 1))
+    yaw = np.arctan2(2*(w*z + x*y), 1 - 2*(y*y + z*z))
+    return np.degrees(np.column_stack((roll, pitch, yaw)))
+
+def body_rates(q, times):
+    '''Returns the angular rates in the body frame in dps, from the derivative of the quaternions: w = 2 q* dq/dt'''
+    dq = np.gradient(q, times, axis=0)
+    w, x, y, z = q.T
+    dw, dx, dy, dz = dq.T
+    rates = 2*np.column_stack((w*dx - x*dw - y*dz + z*dy,
+                               w*dy + x*dz - y*dw - z*dx,
+                               w*dz - x*dy + y*dx - z*dw))
+    return np.degrees(rates)
+
+def reconstruct_attitude(sensors, launchtime=None, beta=0.05, beta_clipped=0.5, beta_initial=2.5, settle_time=10,
+                         acc_gate=0.15, clip_fraction=0.98):
+    '''Returns a dict with the timestamps (those of the gyro), quaternions, Euler angles [deg], roll rate [dps]
+    and gyro clipping flags of a flight.
+    beta is the filter gain, raised to beta_clipped while the gyro clips (its rate is only a lower bound then)
+    and to beta_initial during the first settle_time seconds to converge from the identity quaternion.
+    Accelerometer and magnetometer only correct the attitude while the measured acceleration is within acc_gate g
+    of 1 g and not clipping, as it is no gravity reference under thrust, drag or tumbling.
+    The magnetometer offsets are calibrated as in post.heading_calibration if launchtime is given'''
+    times, table, columns = align.align(sensors, 'gyro')
+    acc = table[:, 1:4]
+    gyro = table[:, 4:7]
+    mag = table[:, 7:10]
+    if launchtime is not None:
+        offsets = post.heading_calibration(sensors['mag'], launchtime)[0]/6842  # conversion from LSB to gauss
+    else:
+        offsets = (np.nanmax(mag, axis=0)+np.nanmin(mag, axis=0))/2
+    mag = mag-offsets
+    gyro_clipped = np.any(np.abs(gyro) >= clip_fraction*gyro_full_scale, axis=1)
+    acc_clipped = np.any(np.abs(acc) >= clip_fraction*acc_full_scale, axis=1)
+    with np.errstate(invalid='ignore'):
+        correct = (np.abs(np.linalg.norm(acc, axis=1)-1) < acc_gate) & ~acc_clipped & np.all(np.isfinite(mag), axis=1)
+    betas = np.where(gyro_clipped, beta_clipped, beta)
+    betas[times < times[0]+settle_time] = beta_initial
+    dt = np.diff(times, prepend=times[0])
+    loop = madgwick_loop if njit is None else compiled_madgwick_loop()
+    q = loop(np.array([1., 0., 0., 0.]), np.radians(np.nan_to_num(gyro)), normalise(np.nan_to_num(acc)),
+             normalise(np.nan_to_num(mag)), dt, betas, correct)
+    return {'time': times,
+            'quaternion': q,
+            'euler': quaternion_to_euler(q),
+            'roll_rate': body_rates(q, times)[:, 2],
+            'gyro_clipped': gyro_clipped}
+
+def compiled_madgwick_loop():
+    '''Returns madgwick_loop compiled with numba, compiled only once per process'''
+    global _compiled_madgwick_loop
+    if _compiled_madgwick_loop is None:
+        _compiled_madgwick_loop = njit(cache=True)(madgwick_loop)
+    return _compiled_madgwick_loop
+
+#####################################
+# setup
+
+gyro_full_scale = 32767*35/1000  # dps, as the gyro was logged already converted
+acc_full_scale = 32767*0.122/1000  # g
+_compiled_madgwick_loop = None
+
+#####################################
+# main
+
+if __name__ == '__main__':
+    flightname = sys.argv[1]
+    beta = float(sys.argv[2]) if len(sys.argv) > 2 else 0.05
+    sensors, config, log_index = post.load_flight(post.data_dir, flightname)
+    launchtime = post.get_launchtime(log_index['state_transitions'])
+    attitude = reconstruct_attitude(sensors, launchtime, beta)
+    print('reconstructed', len(attitude['time']), 'samples,', attitude['gyro_clipped'].sum(), 'with gyro clipping')
+    np.savez(flightname+'_attitude.npz', **attitude)
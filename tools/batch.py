@@ -0,0 +1,92 @@
+'''
+Headless batch mode for post.py: processes every flight in data_dir in a process pool,
+renders the figures to files and writes a JSON summary per flight.
+
+usage: python batch.py [output_dir] [png|svg]
+'''
+
+# imports
+import sys
+import os
+import json
+import concurrent.futures
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')  # headless, has to be selected before post imports pyplot
+from matplotlib import pyplot as plt
+import post
+
+#####################################
+# function definitions
+
+def summarize(sensors, config, log_index, h, vvs):
+    '''Returns a dict with apogee, ODR per sensor, state times and the deploy vote window check of a flight'''
+    times = np.asarray(sensors['baro'][:, 1])
+    state_times = {state: t for t, state in log_index['state_transitions']}
+    launchtime = post.get_launchtime(log_index['state_transitions'])
+    summary = {'apogee': float(np.max(h)),
+               'apogee_time': float(times[np.argmax(h)]),
+               'odr': {name: float(1/np.mean(np.diff(data[:, 1]))) if len(data) > 1 else None for name, data in sensors.items()},
+               'state_times': state_times,
+               'p0': log_index['p0'],
+               'logged_deploy_vote': log_index['deploy_vote']}
+    if launchtime is not None:
+        # the deploy vote as fly.py would have sent it, based on the reconstructed smoothed vertical velocity
+        voting = (times > launchtime+config['min_deploy_time']) & (vvs < config['vv_deploy_threshold'])
+        reconstructed_deploy_vote = float(times[np.argmax(voting)]) if voting.any() else None
+        deploy_vote = log_index['deploy_vote'] or reconstructed_deploy_vote  # the logged one wins if the log got that far
+        window = state_times['SRP board min deploy time'], state_times['SRP board max deploy time']
+        summary.update({'reconstructed_deploy_vote': reconstructed_deploy_vote,
+                        'deploy_vote_window': window,
+                        'deploy_vote_in_window': deploy_vote is not None and window[0] <= deploy_vote <= window[1]})
+    return summary
+
+def process_flight(flightname, data_dir, output_dir, fmt='png'):
+    '''Renders all post.py figures of one flight to output_dir and writes its summary, returns the summary'''
+    sensors, config, log_index = post.load_flight(data_dir, flightname)
+    state_transitions = log_index['state_transitions']
+    p, ps, h, vv, vvs = post.calculate_alt_vv(sensors['baro'], config, log_index['p0'])
+    times = sensors['baro'][:, 1]
+    baroplots = {'pressure': np.column_stack((p, ps)), 'altitude': h, 'vertical velocity': np.column_stack((vv, vvs))}
+    figures = {'raw': (post.plot_raw(sensors, state_transitions), (2, 2))}
+    figures['barometer'] = (post.plot_barometer(times, baroplots, log_index['onboard'], state_transitions), (3, 1))
+    launchtime = post.get_launchtime(state_transitions)
+    if launchtime is not None:  # the remaining figures are relative to launch
+        figures['calibrated'] = (post.plot_calibrated(sensors, launchtime), (3, 1))
+        figures['altitude'] = (post.plot_altitude(times, h, launchtime, state_transitions), None)
+    for name, (fig, scale) in figures.items():
+        if scale:
+            fig.set_size_inches(scale[0]*fig.get_figwidth(), scale[1]*fig.get_figheight())
+        else:
+            fig.set_size_inches(7, 9)
+        fig.savefig(os.path.join(output_dir, '{}_{}.{}'.format(flightname, name, fmt)))
+        plt.close(fig)
+    summary = summarize(sensors, config, log_index, h, vvs)
+    with open(os.path.join(output_dir, flightname+'_summary.json'), 'w') as summary_file:
+        json.dump(summary, summary_file, indent=4)
+    return summary
+
+def process_all(data_dir, output_dir, fmt='png', max_workers=None):
+    '''Processes every flight in data_dir in parallel, returns a dict of summaries (or errors) per flight'''
+    os.makedirs(output_dir, exist_ok=True)
+    flights = post.list_flights(data_dir)
+    results = {}
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(process_flight, flight, data_dir, output_dir, fmt): flight for flight in flights}
+        for future in concurrent.futures.as_completed(futures):
+            flight = futures[future]
+            try:
+                results[flight] = future.result()
+                print('processed', flight)
+            except Exception as e:  # one damaged flight should not stop the rest of the batch
+                results[flight] = {'error': repr(e)}
+                print('failed', flight, repr(e))
+    return results
+
+#####################################
+# main
+
+if __name__ == '__main__':
+    output_dir = sys.argv[1] if len(sys.argv) > 1 else os.path.join(post.data_dir, 'batch')
+    fmt = sys.argv[2] if len(sys.argv) > 2 else 'png'
+    process_all(post.data_dir, output_dir, fmt)
@@ -0,0 +1,200 @@
+'''
+Benchmarks of the hot paths of the flight software (I2C decoding against a fake bus, the sensor loop, autosaving and
+the on board estimators) and of post.py on the 24-05-19 flight.
+Every run is stored as JSON in bench_dir with the commit and machine it ran on, so runs can be compared over time
+(or between a laptop and the Pi). compare exits with status 1 if any benchmark got slower than the threshold, so it
+can gate a change. A run file (bench_dir/<UTC time>_<commit>.json) holds:
+
+    {"run": {"time": "2019-05-24 08:47:27 UTC", "commit": "abc1234", "machine": ..., "platform": ...,
+             "python": ..., "numpy": ..., "latency": 0},
+     "results": {"<benchmark>": {"best": s, "median": s, "number": calls, "repeat": runs, ...}, ...}}
+
+with the times in seconds per call. Latency benchmarks have percentiles ("50", "90", "99", "100") instead of best and
+median, and are not compared.
+
+usage: python bench.py [latency]                             run all benchmarks, latency is the fake I2C transfer
+                                                             time in s (0 by default)
+       python bench.py compare [old new] [--threshold=1.1]   compare two stored runs, the last two by default
+'''
+
+# imports
+import sys
+import os
+import json
+import time
+import timeit
+import platform
+import subprocess
+import tempfile
+import numpy as np
+import post
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'flown_software_cleaned_up'))
+import altimu10v5
+from altimu10v5.constants import LPS25H_ADDR, LSM6DS33_ADDR
+from acquisition import Sensor, write_block
+from estimators import AltitudeEstimator, AttitudeEstimator, ApogeePredictor
+
+#####################################
+# function definitions
+
+class StopAfter:
+    '''Stands in for the stop event of fly.py, is set after it has been checked n times'''
+    def __init__(self, n):
+        self.n = n
+
+    def is_set(self):
+        self.n -= 1
+        return self.n < 0
+
+def measure(function, repeat=5, per_call=1):
+    '''Returns the best and median time in seconds per call of function (divided by per_call, for functions
+    that loop themselves) over repeat runs of as many calls as take at least 0.2 s, as timeit does'''
+    timer = timeit.Timer(function)
+    number = timer.autorange()[0]
+    times = np.array(timer.repeat(repeat, number))/number/per_call
+    return {'best': float(times.min()), 'median': float(np.median(times)), 'number': number*per_call, 'repeat': repeat}
+
+def measure_latency(function, n=200, percentiles=(50, 90, 99, 100)):
+    '''Returns percentiles of the time in seconds of n single calls of function'''
+    times = []
+    for i in range(n):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter()-start)
+    return dict(zip(map(str, percentiles), np.percentile(times, percentiles).tolist()))
+
+def bench_acquisition(latency=0, n_samples=1000):
+    '''Benchmarks of the code running on the Pi during the flight'''
+    bus = altimu10v5.FakeSMBus(latency=latency)
+    imu = altimu10v5.IMU(bus=bus)
+    results = {}
+    results['i2c_read_1d_sensor'] = measure(lambda: imu.lps25h.read_1d_sensor(LPS25H_ADDR, imu.lps25h.barometer_registers))
+    results['i2c_read_3d_sensor'] = measure(lambda: imu.lsm6ds33.read_3d_sensor(LSM6DS33_ADDR, imu.lsm6ds33.accel_registers))
+    results['i2c_data_ready'] = measure(imu.lis3mdl.magnetometer_data_ready)
+    # per sample overhead of the sensor thread, without sleeping in between samples
+    sample = [1, 2, 3]
+    sensor = Sensor('acc', 0, lambda: sample)
+    def read_sensor():
+        sensor.data = []
+        sensor.read(StopAfter(n_samples))
+    results['sensor_read_per_sample'] = measure(read_sensor, per_call=n_samples)
+    estimator = AltitudeEstimator(101325, 0.1, 291, -0.0065, 278, 9.81, 0.2, 0.1)
+    raw = 101325*40.96
+    results['altitude_update'] = measure(lambda: estimator.update(raw))
+    baro = Sensor('baro', 0, lambda: raw, lambda sample: estimator.update(sample[2]))
+    def read_baro():
+        baro.data = []
+        baro.read(StopAfter(n_samples))
+    results['sensor_read_per_sample_baro'] = measure(read_baro, per_call=n_samples)
+    # one gyro and one accelerometer sample at 1 g (so with the correction towards gravity) per call
+    attitude = AttitudeEstimator()
+    acc_sample = [1, 0.0, [300, -200, 8150]]
+    gyro_sample = [1, 0.0, [1.5, -2.0, 30.0]]
+    def update_attitude():
+        gyro_sample[1] += 0.005
+        attitude.add_acc(acc_sample)
+        attitude.add_gyro(gyro_sample)
+    results['attitude_update'] = measure(update_attitude)
+    # one recursive least squares step and apogee prediction, from a coast at 100 m/s
+    predictor = ApogeePredictor(9.81)
+    predictor.add_acceleration(0.0, -20.0)
+    coast = [0.0]
+    def update_predictor():
+        coast[0] += 0.1
+        predictor.add_altitude(coast[0], 100*coast[0] - 10*coast[0]**2)
+    results['apogee_update'] = measure(update_predictor)
+    # autosave of one second of gyro data (the fastest sensor) per block, as fly.py does every second
+    rows = [[i, time.time(), [i, -i, 2*i]] for i in range(25)]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'gyro.csv')
+        save = lambda: write_block(path, rows, '#### 1234.567890 autosave nr 1', time.time())
+        results['autosave_block'] = measure(save)
+        results['autosave_block']['rows_per_second'] = len(rows)/results['autosave_block']['median']
+        results['autosave_block_latency'] = measure_latency(save)
+    return results
+
+def bench_post(data_dir=post.data_dir, flightname='24-05-19_08-47-27'):
+    '''Benchmarks of post.py on a recorded flight'''
+    sensors, config, log_index = post.load_flight(data_dir, flightname)
+    launchtime = post.get_launchtime(log_index['state_transitions'])
+    results = {}
+    for name in ('baro', 'gyro'):
+        results['read_data_'+name] = measure(lambda: post.read_data(data_dir+flightname+'_'+name+'.csv'), repeat=3)
+        results['read_data_'+name]['rows'] = len(sensors[name])
+    results['calculate_alt_vv'] = measure(lambda: post.calculate_alt_vv(sensors['baro'], config, log_index['p0']))
+    results['calculate_heading'] = measure(lambda: post.calculate_heading(sensors['mag'], launchtime))
+    return results
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(bench_dir, latency=0):
+    '''Runs all benchmarks and stores the results in bench_dir, returns the path of the results'''
+    run_info = {'time': time.strftime('%Y-%m-%d %H:%M:%S UTC', time.gmtime()),
+                'commit': git_commit(),
+                'machine': platform.machine(),
+                'platform': platform.platform(),
+                'python': platform.python_version(),
+                'numpy': np.__version__,
+                'latency': latency}
+    results = bench_acquisition(latency)
+    results.update(bench_post())
+    os.makedirs(bench_dir, exist_ok=True)
+    path = os.path.join(bench_dir, time.strftime('%Y-%m-%d_%H-%M-%S', time.gmtime())+'_{}.json'.format(run_info['commit']))
+    with open(path, 'w') as f:
+        json.dump({'run': run_info, 'results': results}, f, indent=1)
+    return path
+
+def compare(old_path, new_path, threshold=1.1):
+    '''Prints the median times of two runs side by side, marking what got more than threshold times slower.
+    Returns the names of those'''
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    for run_info in (old['run'], new['run']):
+        print('{time} ({commit}) on {platform}, python {python}, I2C latency {latency} s'.format(**run_info))
+    slower = []
+    for name, result in new['results'].items():
+        if 'median' not in result:
+            continue
+        if name not in old['results']:
+            print('{:30} {:>12} {:>10.2f} us'.format(name, 'new', result['median']*1e6))
+            continue
+        ratio = result['median']/old['results'][name]['median']
+        if ratio > threshold:
+            slower.append(name)
+        print('{:30} {:>10.2f} us {:>10.2f} us {:>6.2f}x {}'.format(
+            name, old['results'][name]['median']*1e6, result['median']*1e6, ratio, 'SLOWER' if ratio > threshold else ''))
+    return slower
+
+def stored_runs(bench_dir):
+    return sorted(os.path.join(bench_dir, f) for f in os.listdir(bench_dir) if f.endswith('.json')) if os.path.isdir(bench_dir) else []
+
+#####################################
+# setup
+
+bench_dir = 'bench/'
+
+#####################################
+# main
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['compare']:
+        options = [arg for arg in sys.argv[2:] if arg.startswith('--threshold=')]
+        threshold = float(options[-1].split('=')[1]) if options else 1.1
+        paths = [arg for arg in sys.argv[2:] if arg not in options][:2] or stored_runs(bench_dir)[-2:]
+        if len(paths) < 2:
+            sys.exit('need two runs to compare')
+        slower = compare(*paths, threshold=threshold)
+        if slower:
+            sys.exit('{} slower than {}x: {}'.format(len(slower), threshold, ', '.join(slower)))
+    else:
+        path = run(bench_dir, float(sys.argv[1]) if len(sys.argv) > 1 else 0)
+        with open(path) as f:
+            for name, result in json.load(f)['results'].items():
+                print('{:30} {}'.format(name, {k: round(v, 9) if isinstance(v, float) else v for k, v in result.items()}))
+        print('stored in', path)
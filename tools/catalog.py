@@ -0,0 +1,196 @@
+'''
+Catalog of all flights in data_dir: an SQLite index (in the cache directory of post.py) of the metadata, config values,
+state times, apogee, sensor ODRs and file locations per flight, so flights can be selected by query instead of by name:
+
+    from catalog import Catalog
+    catalog = Catalog()
+    catalog.update()
+    for flight in catalog.load('exp_factor_vv < ? and apogee > ?', 0.2, 500):
+        flight.altitude.max()
+
+update() only indexes flights whose files are new or changed (by size and mtime) and drops flights whose files are gone.
+The queries run on the view catalog, with a column per config value (nested keys joined with _, e.g. intervals_baro)
+and the odr_<sensor> and rows_<sensor> of every sensor. The matching flights are FlightDatasets (see dataset.py),
+so their arrays are only loaded on access, from the columnar cache or the CSVs.
+
+usage: python catalog.py [where clause]  (all flights by default), e.g. python catalog.py "apogee > 500"
+'''
+
+# imports
+import sys
+import os
+import json
+import time
+import sqlite3
+import datetime
+import numpy as np
+import post
+from dataset import FlightDataset
+
+#####################################
+# function definitions
+
+def flatten(config, prefix=''):
+    '''Returns the config values as {key: value}, nested keys joined with _ and lists as JSON'''
+    values = {}
+    for key, value in config.items():
+        if isinstance(value, dict):
+            values.update(flatten(value, prefix+key+'_'))
+        else:
+            values[prefix+key] = json.dumps(value) if isinstance(value, list) else value
+    return values
+
+
+def file_stats(data_dir):
+    '''Returns {flightname: {filename: (size, mtime_ns)}} of all flight files in data_dir'''
+    flights = {}
+    for filename in os.listdir(data_dir):
+        match = post.flight_name.match(filename)
+        if match:
+            st = os.stat(os.path.join(data_dir, filename))
+            flights.setdefault(match[1], {})[filename] = (st.st_size, st.st_mtime_ns)
+    return flights
+
+
+def quote(name):
+    return '"'+name.replace('"', '""')+'"'
+
+
+class Catalog:
+    '''SQLite index of the flights in data_dir'''
+    def __init__(self, data_dir=post.data_dir, path=None):
+        self.data_dir = data_dir
+        self.path = path or os.path.join(data_dir, post.cache_dirname, 'catalog.sqlite')
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.db = sqlite3.connect(self.path)
+        self.db.row_factory = sqlite3.Row
+        if self.db.execute('PRAGMA user_version').fetchone()[0] != schema_version:  # rebuilt from scratch
+            self.db.executescript(''.join('DROP TABLE IF EXISTS {};'.format(table) for table in tables)
+                                  + 'DROP TABLE IF EXISTS settings; DROP VIEW IF EXISTS catalog;')
+            self.db.executescript(schema)
+            self.db.execute('PRAGMA user_version = {}'.format(schema_version))
+            self.create_view()
+
+    def __repr__(self):
+        return 'Catalog({!r}, {!r})'.format(self.data_dir, self.path)
+
+    def close(self):
+        self.db.close()
+
+    def update(self):
+        '''Indexes the new and changed flights and drops the removed ones, returns the names of the (re)indexed flights'''
+        found = file_stats(self.data_dir)
+        indexed = {}
+        for row in self.db.execute('SELECT flight, filename, size, mtime_ns FROM files'):
+            indexed.setdefault(row['flight'], {})[row['filename']] = (row['size'], row['mtime_ns'])
+        removed = sorted(set(indexed)-set(found))
+        # the times in the logs are local, so after a change of timezone every flight is indexed again
+        timezone = json.dumps([time.timezone, time.altzone, list(time.tzname)])
+        row = self.db.execute('SELECT value FROM settings WHERE key = \'timezone\'').fetchone()
+        if row is None or row['value'] != timezone:
+            indexed = {}
+        changed = sorted(flight for flight, files in found.items() if files != indexed.get(flight))
+        with self.db:  # one transaction, so a query never sees a half indexed flight
+            for flight in removed+changed:
+                for table in tables:
+                    self.db.execute('DELETE FROM {} WHERE {} = ?'.format(table, 'name' if table == 'flights' else 'flight'), (flight,))
+            for flight in changed:
+                self.index(flight, found[flight])
+            if changed or removed:
+                self.create_view()
+            self.db.execute('INSERT OR REPLACE INTO settings VALUES (\'timezone\', ?)', (timezone,))
+        return changed
+
+    def index(self, flightname, files):
+        '''Inserts the rows of one flight, a flight that can not be read is kept with its error
+        (and indexed again once its files change)'''
+        flight = FlightDataset(flightname, self.data_dir)
+        row = {'name': flightname, 'date': datetime.datetime.strptime(flightname, '%d-%m-%y_%H-%M-%S').isoformat(' ')}
+        self.db.executemany('INSERT INTO files VALUES (?, ?, ?, ?, ?)',
+                            [(flightname, filename, os.path.join(self.data_dir, filename), size, mtime_ns)
+                             for filename, (size, mtime_ns) in sorted(files.items())])
+        try:
+            self.db.executemany('INSERT INTO config VALUES (?, ?, ?)',
+                                [(flightname, key, value) for key, value in flatten(flight.config).items()])
+            self.db.executemany('INSERT INTO states VALUES (?, ?, ?)',
+                                [(flightname, state, t) for t, state in flight.state_transitions])
+            for name in post.sensors:
+                if flightname+'_'+name+'.csv' not in files:
+                    continue
+                data = flight[name]
+                times = np.asarray(data[:, 1])
+                self.db.execute('INSERT INTO sensors VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                (flightname, name, len(data), float(1/np.mean(np.diff(times))) if len(data) > 1 else None,
+                                 float(times[0]) if len(data) else None, float(times[-1]) if len(data) else None,
+                                 os.path.join(self.data_dir, post.cache_dirname, flightname, name+'.npy')))
+            apogee = int(np.argmax(flight.altitude))
+            row.update({'launchtime': flight.launchtime, 'p0': flight.p0, 'deploy_vote': flight.log_index['deploy_vote'],
+                        'apogee': float(flight.altitude[apogee]), 'apogee_time': float(flight['baro'][apogee, 1])})
+        except (OSError, ValueError, KeyError, IndexError) as error:  # a missing, empty or damaged file
+            row['error'] = repr(error)
+        self.db.execute('INSERT INTO flights ({}) VALUES ({})'.format(', '.join(row), ', '.join('?'*len(row))), list(row.values()))
+
+    def create_view(self):
+        '''(Re)creates the view catalog: the flights with a column per config value and per sensor'''
+        flight_columns = [row['name'] for row in self.db.execute('PRAGMA table_info(flights)')]
+        keys = [row['key'] for row in self.db.execute('SELECT DISTINCT key FROM config ORDER BY key')
+                if row['key'] not in flight_columns]
+        columns = ['f.*']
+        columns += ['(SELECT value FROM config WHERE flight = f.name AND key = \'{}\') AS {}'.format(
+                    key.replace('\'', '\'\''), quote(key)) for key in keys]
+        for name in post.sensors:
+            columns += ['(SELECT {0} FROM sensors WHERE flight = f.name AND sensor = \'{1}\') AS {0}_{1}'.format(column, name)
+                        for column in ('odr', 'rows')]
+        self.db.executescript('DROP VIEW IF EXISTS catalog; CREATE VIEW catalog AS SELECT {} FROM flights AS f;'.format(
+            ', '.join(columns)))
+
+    def query(self, where='1', *parameters):
+        '''Returns the rows (sqlite3.Row) of the catalog view that match an SQL where clause, by date'''
+        return self.db.execute('SELECT * FROM catalog WHERE {} ORDER BY date'.format(where), parameters).fetchall()
+
+    def find(self, where='1', *parameters):
+        '''Returns the names of the flights that match an SQL where clause, by date'''
+        return [row['name'] for row in self.query(where, *parameters)]
+
+    def load(self, where='1', *parameters):
+        '''Returns the FlightDatasets of the flights that match an SQL where clause, by date'''
+        return [FlightDataset(name, self.data_dir) for name in self.find(where, *parameters)]
+
+    def files(self, flightname):
+        '''Returns {filename: path} of the files of a flight'''
+        return {row['filename']: row['path'] for row in self.db.execute(
+            'SELECT filename, path FROM files WHERE flight = ? ORDER BY filename', (flightname,))}
+
+#####################################
+# setup
+
+schema_version = 2
+schema = '''
+CREATE TABLE flights (name TEXT PRIMARY KEY, date TEXT, launchtime REAL, apogee REAL, apogee_time REAL, p0 REAL,
+                      deploy_vote REAL, error TEXT);
+CREATE TABLE files (flight TEXT, filename TEXT, path TEXT, size INTEGER, mtime_ns INTEGER, PRIMARY KEY (flight, filename));
+CREATE TABLE config (flight TEXT, key TEXT, value, PRIMARY KEY (flight, key));
+CREATE TABLE states (flight TEXT, state TEXT, time REAL);
+CREATE TABLE sensors (flight TEXT, sensor TEXT, rows INTEGER, odr REAL, first_time REAL, last_time REAL, cache TEXT,
+                      PRIMARY KEY (flight, sensor));
+CREATE TABLE settings (key TEXT PRIMARY KEY, value TEXT);
+CREATE INDEX states_flight ON states (flight);
+'''
+tables = ['flights', 'files', 'config', 'states', 'sensors']
+
+#####################################
+# main
+
+if __name__ == '__main__':
+    catalog = Catalog()
+    updated = catalog.update()
+    if updated:
+        print('indexed', ', '.join(updated))
+    for row in catalog.query(sys.argv[1] if len(sys.argv) > 1 else '1'):
+        if row['error']:
+            print('{}  {}'.format(row['name'], row['error']))
+            continue
+        print('{}  apogee {:6.1f} m  launch {}  ODR {}'.format(
+            row['name'], row['apogee'], 'yes' if row['launchtime'] else 'no ',
+            ', '.join('{} {:.1f} Hz'.format(name, row['odr_'+name]) for name in post.sensors if row['odr_'+name])))
+    catalog.close()
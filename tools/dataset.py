@@ -0,0 +1,85 @@
+'''
+Importable, lazily loaded access to one flight for notebooks and batch jobs, without globals or matplotlib:
+
+    from dataset import FlightDataset
+    flight = FlightDataset('24-05-19_08-47-27')
+    flight.altitude.max()
+
+Every sensor, the config and the log index are only loaded (from the columnar cache of post.py) on first access,
+and the derived quantities are calculated once and memoized.
+'''
+
+# imports
+import functools
+import numpy as np
+import post
+
+
+class FlightDataset:
+    '''Lazily loaded flight, sensors are accessed by name: flight['baro']'''
+    def __init__(self, flightname, data_dir=post.data_dir):
+        self.flightname = flightname
+        self.data_dir = data_dir
+        self.sensors = {}
+
+    def __repr__(self):
+        return 'FlightDataset({!r}, {!r})'.format(self.flightname, self.data_dir)
+
+    def __getitem__(self, name):
+        '''Returns the data array of a sensor (serial, timestamp, reading(s)), see post.read_data_array'''
+        if name not in self.sensors:
+            if name not in post.sensors:
+                raise KeyError(name)
+            self.sensors[name] = post.load_sensor(self.data_dir, self.flightname, name)
+        return self.sensors[name]
+
+    def __iter__(self):
+        return iter(post.sensors)
+
+    @functools.cached_property
+    def config(self):
+        return post.load_config(self.data_dir, self.flightname)
+
+    @functools.cached_property
+    def log_index(self):
+        return post.load_log_index(self.data_dir, self.flightname)
+
+    @property
+    def p0(self):
+        return self.log_index['p0']
+
+    @property
+    def state_transitions(self):
+        return self.log_index['state_transitions']
+
+    @property
+    def onboard(self):
+        '''Onboard estimates from the .log: timestamp, pressure, altitude and vertical velocity'''
+        return self.log_index['onboard']
+
+    @property
+    def launchtime(self):
+        return post.get_launchtime(self.state_transitions)
+
+    @functools.cached_property
+    def alt_vv(self):
+        '''pressure, smoothed pressure, altitude, vertical velocity and smoothed vertical velocity, see post.calculate_alt_vv'''
+        return post.calculate_alt_vv(self['baro'], self.config, self.p0)
+
+    @property
+    def altitude(self):
+        return self.alt_vv[2]
+
+    @property
+    def vertical_velocity(self):
+        return self.alt_vv[4]
+
+    @functools.cached_property
+    def heading(self):
+        '''heading, angular rate and heading zero during the ascent, see post.calculate_heading'''
+        return post.calculate_heading(self['mag'], self.launchtime)
+
+    @functools.cached_property
+    def odr(self):
+        '''Average output data rate per sensor'''
+        return {name: 1/np.mean(np.diff(self[name][:, 1])) for name in self}
@@ -0,0 +1,232 @@
+'''
+Live post-processing of a flight that fly.py is still recording, e.g. during ground tests.
+Follows the sensor .csv files and the .log, parses only what was appended since the last poll,
+updates the altitude, vertical velocity and heading estimates incrementally and refreshes a dashboard at a bounded rate.
+
+usage: python live.py [flightname] [max refresh rate in Hz]
+'''
+
+# imports
+import sys
+import os
+import json
+import csv
+import time
+import numpy as np
+import post
+
+#####################################
+# class definitions
+
+class Tail:
+    '''Follows a file that is being appended to and returns only the complete lines added since the last call'''
+    def __init__(self, path):
+        self.path = path
+        self.offset = 0
+        self.partial = b''
+
+    def read_lines(self):
+        try:
+            with open(self.path, 'rb') as f:  # reopened on every poll, just like fly.py reopens it for every autosave
+                f.seek(self.offset)
+                chunk = f.read()
+        except FileNotFoundError:  # not written yet
+            return []
+        self.offset += len(chunk)
+        *lines, self.partial = (self.partial+chunk).split(b'\n')  # a torn last line waits for the next poll
+        return [line.decode(errors='replace') for line in lines if line]
+
+
+class Buffer:
+    '''Growable 2D array with amortized constant time appends, view returns the filled part without copying.
+    Without n_columns the width is taken from the first rows appended, like post.read_data does'''
+    def __init__(self, n_columns=None, capacity=1024):
+        self.capacity = capacity
+        self.array = np.zeros((capacity if n_columns else 0, n_columns or 0))
+        self.length = 0
+
+    def append(self, rows):
+        rows = np.asarray(rows)
+        if not self.array.shape[1]:
+            if not rows.size:
+                return
+            self.array = np.zeros((self.capacity, rows.shape[-1] if rows.ndim > 1 else rows.size))
+        rows = rows.reshape(-1, self.array.shape[1])
+        if self.length+len(rows) > len(self.array):
+            grown = np.zeros((max(2*len(self.array), self.length+len(rows)), self.array.shape[1]))
+            grown[:self.length] = self.array[:self.length]
+            self.array = grown
+        self.array[self.length:self.length+len(rows)] = rows
+        self.length += len(rows)
+
+    @property
+    def view(self):
+        return self.array[:self.length]
+
+
+class LiveFlight:
+    '''Incrementally parsed flight, see poll'''
+    def __init__(self, data_dir, flightname, sine_wave_time=7):
+        self.prefix = os.path.join(data_dir, flightname)
+        self.sine_wave_time = sine_wave_time
+        self.tails = {name: Tail(self.prefix+'_'+name+'.csv') for name in post.sensors}
+        self.log_tail = Tail(self.prefix+'.log')
+        self.data = {name: Buffer() for name in post.sensors}  # as wide as the first rows parsed
+        self.processed = {name: 0 for name in post.sensors}  # number of samples already used for the estimates
+        self.config = None
+        self.p0 = None
+        self.state_transitions = []
+        self.onboard = Buffer(4)
+        self.alt_vv = Buffer(3)  # timestamp, altitude and smoothed vertical velocity
+        self.heading = Buffer(3)  # timestamp, heading and angular rate
+        self.last_baro = None  # timestamp, smoothed pressure, altitude and smoothed vertical velocity of the last sample
+        self.heading_calibration = None
+
+    @property
+    def launchtime(self):
+        return post.get_launchtime(self.state_transitions)
+
+    def poll(self):
+        '''Reads whatever was appended to the files since the last poll and updates the estimates.
+        Returns the number of new samples'''
+        if self.config is None:
+            try:
+                with open(self.prefix+'_config.json') as config_file:
+                    self.config = json.load(config_file)
+            except (FileNotFoundError, ValueError):  # not (completely) copied yet
+                return 0
+        self.poll_log()
+        n_new = 0
+        for name, tail in self.tails.items():
+            lines = tail.read_lines()
+            if lines:
+                rows = post.parse_data(row for row in csv.reader(lines) if row)
+                if rows:
+                    self.data[name].append(post.to_array(rows))
+                    n_new += len(rows)
+        self.update_alt_vv()
+        self.update_heading()
+        return n_new
+
+    def poll_log(self):
+        lines = self.log_tail.read_lines()
+        if not lines:
+            return
+        try:
+            log_index = post.index_log('\n'.join(lines))
+        except ValueError:  # no complete log lines yet
+            return
+        self.p0 = self.p0 or log_index['p0']
+        self.onboard.append(log_index['onboard'])
+        found = {state for t, state in self.state_transitions}
+        for t, state in log_index['state_transitions']:
+            if state not in found:  # only the first occurrence of every state is a transition
+                self.state_transitions.append([t, state])
+                found.add(state)
+
+    def update_alt_vv(self):
+        '''Continues the smoothers of post.sweep_alt_vv from the last processed baro sample'''
+        if self.p0 is None:  # fly.py logs p0 before recording starts, wait for it
+            return
+        baro = self.data['baro'].view[self.processed['baro']:]
+        if not len(baro):
+            return
+        config = self.config
+        times = baro[:, 1]
+        pressure_smoothed = post.exp_smooth(baro[:, 2]/40.96, config['exp_factor_p'],
+                                            None if self.last_baro is None else self.last_baro[1])
+        altitude = post.pressure_to_altitude(pressure_smoothed, self.p0, config['T0'], config['a'], config['R'], config['g0'])
+        last = self.last_baro if self.last_baro is not None else [times[0], None, altitude[0], None]
+        dt = np.diff(times, prepend=last[0])
+        dt[dt <= 0] = np.nan  # the very first sample and duplicated timestamps have no vertical velocity
+        vertical_velocity = np.nan_to_num(np.diff(altitude, prepend=last[2])/dt)
+        vertical_velocity_smoothed = post.exp_smooth(vertical_velocity, config['exp_factor_vv'], last[3])
+        self.alt_vv.append(np.column_stack((times, altitude, vertical_velocity_smoothed)))
+        self.last_baro = [times[-1], pressure_smoothed[-1], altitude[-1], vertical_velocity_smoothed[-1]]
+        self.processed['baro'] += len(baro)
+
+    def update_heading(self):
+        '''Heading as in post.calculate_heading, available once sine_wave_time seconds after launch have been recorded.
+        The angular rate is a backward difference, as the next sample is not there yet'''
+        launchtime = self.launchtime
+        mag = self.data['mag'].view
+        if launchtime is None or not len(mag):
+            return
+        if self.heading_calibration is None:
+            if mag[-1, 1] < launchtime+self.sine_wave_time:
+                return
+            self.heading_calibration = post.heading_calibration(mag, launchtime, self.sine_wave_time)
+            self.processed['mag'] = np.searchsorted(mag[:, 1], launchtime, side='right')
+        offsets, heading_zero = self.heading_calibration
+        new = mag[self.processed['mag']:]
+        if not len(new):
+            return
+        zeroed = new[:, 2:]-offsets
+        headings = np.arctan2(zeroed[:, 0], zeroed[:, 1])-heading_zero
+        if self.heading.length:
+            last_time, last_heading = self.heading.view[-1, 0], self.heading.view[-1, 1]*np.pi/180
+        else:
+            last_time, last_heading = new[0, 1], headings[0]
+        headings = np.unwrap(np.concatenate(([last_heading], headings)))[1:]
+        dt = np.diff(new[:, 1], prepend=last_time)
+        dt[dt <= 0] = np.nan
+        angular_rate = np.nan_to_num(np.diff(headings, prepend=last_heading)/dt)
+        self.heading.append(np.column_stack((new[:, 1], headings*180/np.pi, angular_rate*180/np.pi)))
+        self.processed['mag'] += len(new)
+
+
+class Dashboard:
+    '''Altitude, vertical velocity and magnetometer-derived angular rate of a LiveFlight, redrawn on demand'''
+    def __init__(self, flight):
+        from matplotlib import pyplot as plt
+        self.plt = plt
+        self.flight = flight
+        self.fig, self.axs = plt.subplots(3, 1, sharex=True)
+        self.fig.suptitle('Live: '+os.path.basename(flight.prefix), fontsize=20)
+        for ax, label in zip(self.axs, ('Altitude [m]', 'Vertical velocity [m/s]', 'Angular rate [dps]')):
+            ax.set_ylabel(label)
+        self.axs[-1].set_xlabel('Time [s]')
+        self.lines = [ax.plot([], [])[0] for ax in self.axs]
+        self.onboard_lines = [ax.plot([], [], '--')[0] for ax in self.axs[:2]]
+        self.n_states = 0
+
+    def update(self):
+        flight = self.flight
+        for line, data, column in [(self.lines[0], flight.alt_vv, 1), (self.lines[1], flight.alt_vv, 2),
+                                   (self.lines[2], flight.heading, 2), (self.onboard_lines[0], flight.onboard, 2),
+                                   (self.onboard_lines[1], flight.onboard, 3)]:
+            view = data.view
+            if len(view):
+                indices = post.minmax_decimate(view[:, 0], view[:, column], view[0, 0], view[-1, 0],
+                                               max(int(line.axes.bbox.width), 1))
+                line.set_data(view[indices, 0], view[indices, column])
+        for ax in self.axs:
+            ax.relim()
+            ax.autoscale_view()
+        new_states = flight.state_transitions[self.n_states:]
+        for ax in self.axs:
+            post.plot_states(new_states, ax)
+        self.n_states += len(new_states)
+        self.fig.canvas.draw_idle()
+
+#####################################
+# main
+
+def run(data_dir, flightname, max_rate=2):
+    '''Polls the files of the flight and refreshes the dashboard at most max_rate times per second, until it is closed'''
+    flight = LiveFlight(data_dir, flightname)
+    dashboard = Dashboard(flight)
+    plt = dashboard.plt
+    plt.ion()
+    plt.show()
+    while plt.fignum_exists(dashboard.fig.number):
+        start = time.time()
+        if flight.poll():
+            dashboard.update()
+        plt.pause(max(0.01, 1/max_rate-(time.time()-start)))
+    return flight
+
+if __name__ == '__main__':
+    flightname = sys.argv[1] if len(sys.argv) > 1 else post.list_flights(post.data_dir)[-1]
+    max_rate = float(sys.argv[2]) if len(sys.argv) > 2 else 2
+    run(post.data_dir, flightname, max_rate)
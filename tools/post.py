@@ -7,9 +7,8 @@ import json
 import math
 import numpy as np
 import datetime
-import statistics
 import re
-from matplotlib import pyplot as plt
+from scipy.signal import lfilter
 
 states = ['ERROR', 'SYSTEMS_CHECK', 'IDLE', 'ARMED', 'LAUNCHED', 'DEPLOYED', 'LANDED']
 fullscreen = 1
@@ -20,7 +19,10 @@ fullscreen = 1
 ### functions for file handling/getting the data in
 def read_data(local_path):
     with open(local_path, 'r') as f:
-        str_data = list(csv.reader(f))
+        return parse_data(csv.reader(f))
+
+def parse_data(str_data):
+    '''Parses csv rows as written by fly.py, skipping the autosave comment rows'''
     data = []
     for dd in str_data:
         dat = []
@@ -33,6 +35,13 @@ def read_data(local_path):
             data.append(dat)
     return data
 
+def read_data_array(local_path):
+    '''Same as read_data, but flattened into a 2D array with the columns serial, timestamp and reading(s)'''
+    return to_array(read_data(local_path))
+
+def to_array(data):
+    return np.array([d[:2]+(d[2] if type(d[2])==type([]) else [d[2]]) for d in data])
+
 def read_config(config_path):
     with open(config_path) as config_file:
         globals().update(json.load(config_file))
@@ -40,132 +49,386 @@ def read_config(config_path):
 def read_log(log_path):
     with open(log_path) as log_file:
         log = log_file.read()
-    globals().update({'p0':float([line for line in log.split('\n') if line.find('p0=')!=-1][0].split('p0=')[-1])})
+    globals().update({'p0': index_log(log)['p0']})
     return log
 
+### functions for caching parsed flights
+def source_stats(paths):
+    '''Returns size and modification time of each source file, which together key the cache'''
+    stats = {}
+    for path in paths:
+        st = os.stat(path)
+        stats[os.path.basename(path)] = [st.st_size, st.st_mtime_ns]
+    return stats
+
+def save_array(path, array):
+    '''Saves an array via a temporary file, so that an interrupted save never leaves a torn .npy behind'''
+    with open(path+'.tmp', 'wb') as f:
+        np.save(f, array)
+    os.replace(path+'.tmp', path)
+
+def cached(data_dir, flightname, name, source, build, depends=None):
+    '''Returns the array and meta data that build(source) parses from a source file of a flight.
+    They are cached as name.npy (memory-mapped when reopened) and name.json in data_dir/.cache/flightname/,
+    and rebuilt automatically whenever the size or mtime of the source file changes, or anything else the parsing
+    depends on (a JSON-able value)'''
+    stats = source_stats([source])
+    if depends is not None:
+        stats['depends'] = depends
+    cache_dir = os.path.join(data_dir, cache_dirname, flightname)
+    array_path = os.path.join(cache_dir, name+'.npy')
+    meta_path = os.path.join(cache_dir, name+'.json')
+    try:
+        with open(meta_path) as meta_file:
+            meta = json.load(meta_file)
+        if meta['sources'] == stats:
+            return np.load(array_path, mmap_mode='r'), meta['meta']
+    except (OSError, ValueError, KeyError):
+        pass  # no cache yet, or it is incomplete, so (re)build it below
+    array, meta = build(source)
+    os.makedirs(cache_dir, exist_ok=True)
+    save_array(array_path, array)
+    with open(meta_path+'.tmp', 'w') as meta_file:  # meta is written last, so it only exists for a complete entry
+        json.dump({'sources': stats, 'meta': meta}, meta_file)
+    os.replace(meta_path+'.tmp', meta_path)
+    return np.load(array_path, mmap_mode='r'), meta
+
+def load_sensor(data_dir, flightname, name):
+    '''Returns the (cached) data array of one sensor of a flight, see read_data_array'''
+    return cached(data_dir, flightname, name, os.path.join(data_dir, flightname+'_'+name+'.csv'),
+                  lambda path: (read_data_array(path), {}))[0]
+
+def load_config(data_dir, flightname):
+    with open(os.path.join(data_dir, flightname+'_config.json')) as config_file:
+        return json.load(config_file)
+
+def load_log_index(data_dir, flightname):
+    '''Returns the (cached) log index of a flight, see index_log'''
+    def build(path):
+        with open(path) as log_file:
+            log_index = index_log(log_file.read())
+        return log_index.pop('onboard'), log_index
+    # the log is in local time, so its epoch times depend on the timezone
+    onboard, log_index = cached(data_dir, flightname, 'log', os.path.join(data_dir, flightname+'.log'), build,
+                                depends={'timezone': [time.timezone, time.altzone, list(time.tzname)]})
+    return dict(log_index, onboard=onboard)
+
+def load_flight(data_dir, flightname):
+    '''Returns the sensor arrays, config and log index (see index_log) of a flight.
+    The parsed files are cached in columnar .npy files in data_dir/.cache/flightname/,
+    which are memory-mapped when reopened as long as the size and mtime of their source file still match.'''
+    arrays = {name: load_sensor(data_dir, flightname, name) for name in sensors}
+    return arrays, load_config(data_dir, flightname), load_log_index(data_dir, flightname)
+
 ### functions for analysing data/postprocessing it
 def calculate_odr(data, deduplicate=False):
     '''Prints the average output data rate for a given dataset,
-    where timestamp is data[i][1] and the readout is data[i][2].
+    where timestamp is data[:, 1] and the readout is data[:, 2:].
     Make sure to use on the data set of one sensor at a time only,
-    as otherwise it will find the frequency of the smallest common multiple of both frequencies'''
-    deduplicated = [d for i,d in enumerate(data[1:]) if not deduplicate or (d[2] != data[i][2])]
-    delta = [d[1]-deduplicated[i][1] for i,d in enumerate(deduplicated[1:])]
-    avg_delta = sum(delta)/len(delta)
+    as otherwise it will find the frequency of the smallest common multiple of both frequencies.
+    See timing.py for the full timing quality report'''
+    times = np.asarray(data[:, 1])
+    if deduplicate:
+        times = times[~duplicate_mask(data)]
+    delta = np.diff(times)
+    avg_delta = delta.mean()
     avg_odr = 1/avg_delta
     print('current output data rate:', avg_odr, 'Hz')
-    stdev = statistics.stdev(delta)
+    stdev = delta.std(ddof=1)
     stdev_odr = abs(avg_odr-1/(stdev+avg_delta))
     print('standard deviation odr:', stdev_odr, 'Hz')
     return avg_odr, stdev_odr
 
-def calculate_alt_vv(baro_data):
-    pressure_raw = [b[2]/40.96 for b in baro_data]
-    pressure_smoothed = [pressure_raw[0]]
-    for i, p in enumerate(pressure_raw[1:]):
-        pressure_smoothed.append(exp_factor_p*p+(1-exp_factor_p)*pressure_smoothed[i])
-    altitude = [T0/a*((p/p0)**(-(R*a)/g0)-1) for p in pressure_smoothed]
-    vertical_velocity = [0]+[(alt-altitude[i])/intervals['baro'] for i, alt in enumerate(altitude[1:])]  # conversion from h to vv
-    vertical_velocity_smoothed = [vertical_velocity[0]]
-    for i, vv in enumerate(vertical_velocity[1:]):
-        vertical_velocity_smoothed.append(exp_factor_vv*vv + (1-exp_factor_vv)*vertical_velocity_smoothed[i])
-    return roundall(pressure_raw), roundall(pressure_smoothed), roundall(altitude), roundall(vertical_velocity), roundall(vertical_velocity_smoothed)
+def duplicate_mask(data):
+    '''Returns a mask of the samples whose readings (all axes) are identical to the previous sample, i.e. stale reads'''
+    readings = np.asarray(data[:, 2:])
+    return np.concatenate(([False], np.all(readings[1:] == readings[:-1], axis=1)))
+
+def exp_smooth(data, exp_factor, initial=None):
+    '''Exponential smoothing along the last axis, starting from the first value or continuing from initial.
+    Same as s[i] = exp_factor*x[i] + (1-exp_factor)*s[i-1], but as a first order IIR filter'''
+    data = np.asarray(data, dtype=float)
+    zi = (1-exp_factor)*(data[..., :1] if initial is None else np.reshape(initial, data.shape[:-1]+(1,)))
+    return lfilter([exp_factor], [1, exp_factor-1], data, zi=zi)[0]
+
+def pressure_to_altitude(pressure, p0, T0, a, R, g0):
+    return T0/a*((np.asarray(pressure)/p0)**(-(R*a)/g0)-1)
+
+def sweep_alt_vv(baro_data, exp_factors_p, exp_factors_vv, p0, T0, a, R, g0):
+    '''Calculates pressure, altitude and vertical velocity for every combination of the given exp factors in one call.
+    The vertical velocity uses the actual timestamp deltas instead of the configured baro interval.
+    Returns pressure_raw with shape (N,), pressure_smoothed, altitude and vertical_velocity with shape
+    (len(exp_factors_p), N) and vertical_velocity_smoothed with shape (len(exp_factors_p), len(exp_factors_vv), N)'''
+    times = np.asarray(baro_data[:, 1])
+    pressure_raw = baro_data[:, 2]/40.96
+    pressure_smoothed = np.array([exp_smooth(pressure_raw, f) for f in exp_factors_p])
+    altitude = pressure_to_altitude(pressure_smoothed, p0, T0, a, R, g0)
+    dt = np.diff(times)
+    dt[dt <= 0] = np.nan  # duplicated timestamps would otherwise divide by zero
+    vertical_velocity = np.zeros_like(altitude)
+    vertical_velocity[:, 1:] = np.nan_to_num(np.diff(altitude)/dt)  # conversion from h to vv
+    vertical_velocity_smoothed = np.array([[exp_smooth(vv, f) for f in exp_factors_vv] for vv in vertical_velocity])
+    return pressure_raw, pressure_smoothed, altitude, vertical_velocity, vertical_velocity_smoothed
+
+def calculate_alt_vv(baro_data, config=None, p0=None):
+    '''Calculates pressure, altitude and vertical velocity with the exp factors and constants of the given config,
+    defaulting to the config and p0 loaded into the global namespace'''
+    config = config or globals()
+    p0 = p0 or globals()['p0']
+    p, ps, h, vv, vvs = sweep_alt_vv(baro_data, [config['exp_factor_p']], [config['exp_factor_vv']],
+                                     p0, config['T0'], config['a'], config['R'], config['g0'])
+    return p, ps[0], h[0], vv[0], vvs[0, 0]
 
 def calculate_acc_g(acc_data):
-    acc_raw = [[aa*0.122/1000 for aa in a[2]] for a in acc_data]  # conversion from LSB to g's
+    acc_raw = acc_data[:, 2:]*0.122/1000  # conversion from LSB to g's
     return acc_raw
 
 def calculate_gyro_dps(gyro_data):
     # looks like control register was set to 1000dps, so using the conversion factor of 35 mdps/LSB
     # ^ wrong!!! I was using the imu.lsm6ds33.get_gyro_angular_velocity function,
     # meaning that the values I logged are already in dps
-    gyro_raw = [[gg*1 for gg in g[2]] for g in gyro_data]  # conversion from LSB to dps
+    gyro_raw = gyro_data[:, 2:]*1  # conversion from LSB to dps
     return gyro_raw
 
 def calculate_mag_gaus(mag_data):
-    mag_raw = [[mm/6842 for mm in m[2]] for m in mag_data]  # conversion from LSB to gauss
+    mag_raw = mag_data[:, 2:]/6842  # conversion from LSB to gauss
     return mag_raw
 
-def calculate_heading(mag_list):
-    """Calculates the heading for the ascent only, as only then the data is interesting/processable"""
-    # setup and array creation
-    launchtime = get_state_transitions(log)[3][0]
-    sine_wave_time = 7  # number of seconds after launch that are usable for heading zeroing
-    mag = np.array([m[2] for m in mag_list])
-    times = np.array([m[1] for m in mag_list])
-    before_launch = np.array([m for m,t in zip(mag,times) if t<launchtime])
-    timeframe_for_calibration = np.array([m for m,t in zip(mag,times) if launchtime<t<launchtime+sine_wave_time])
-    timeframe_of_interest = np.array([m for m,t in zip(mag,times) if launchtime<t])  # ugly, but it works
-    times_toi = np.array([t for t in times if launchtime<t])
-    # calculation of offsets and zero values
-    offsets = np.array([(max(axis)+min(axis))/2 for axis in timeframe_for_calibration.transpose()])
-    before_launch_zeroed = before_launch-offsets
-    timeframe_of_interest_zeroed = timeframe_of_interest-offsets
-    heading_zero = np.mean([np.arctan2(b[0],b[1]) for b in before_launch_zeroed])
-    # calculation of relative heading and angular rates
-    headings = np.array([np.arctan2(v[0],v[1])-heading_zero for v in timeframe_of_interest_zeroed])
-    # correct for modulo 360 by atan2 by adding/subtracting (based on the sign of the jump) 2pi whenever there's a jump bigger than pi in the values
-    for i in range(len(headings)):
-        diff = headings[i-1]-headings[i]
-        if abs(diff)>np.pi:
-            headings[i:] += np.pi*2*diff/abs(diff)
-    angular_rate = np.array([0]+[(h-headings[i])/(t-times_toi[j]) for (i,h), (j,t) in zip(enumerate(headings[1:]), enumerate(times_toi[1:]))])
+def heading_calibration(mag_data, launchtime, sine_wave_time=7):
+    """Returns the magnetometer offsets (hard iron) and the heading zero in radians, see calculate_heading"""
+    mag = np.asarray(mag_data[:, 2:])
+    times = np.asarray(mag_data[:, 1])
+    calibration = mag[(launchtime < times) & (times < launchtime+sine_wave_time)]
+    offsets = (calibration.max(axis=0)+calibration.min(axis=0))/2
+    before_launch_zeroed = mag[times < launchtime]-offsets
+    heading_zero = np.mean(np.arctan2(before_launch_zeroed[:, 0], before_launch_zeroed[:, 1]))
+    return offsets, heading_zero
+
+def calculate_heading(mag_data, launchtime, sine_wave_time=7):
+    """Calculates the heading for the ascent only, as only then the data is interesting/processable.
+    sine_wave_time is the number of seconds after launch that are usable for heading zeroing"""
+    offsets, heading_zero = heading_calibration(mag_data, launchtime, sine_wave_time)
+    mag = np.asarray(mag_data[:, 2:])
+    times = np.asarray(mag_data[:, 1])
+    timeframe_of_interest = launchtime < times
+    times_toi = times[timeframe_of_interest]
+    timeframe_of_interest_zeroed = mag[timeframe_of_interest]-offsets
+    # calculation of relative heading and angular rates, np.unwrap corrects for the modulo 360 of atan2
+    headings = np.unwrap(np.arctan2(timeframe_of_interest_zeroed[:, 0], timeframe_of_interest_zeroed[:, 1])-heading_zero)
+    angular_rate = np.gradient(headings, times_toi)
     return headings*180/np.pi, angular_rate*180/np.pi, heading_zero*180/np.pi
 
+def index_log(log):
+    '''Scans the .log once and returns a dict with the state transitions, p0, the time the deploy vote was sent
+    and the onboard debug estimates as an array with the columns timestamp, pressure, altitude and vertical velocity'''
+    found_states = {}
+    first = None
+    p0 = None
+    deploy_vote = None
+    onboard_times = []
+    onboard_values = []
+    for match in log_line.finditer(log):
+        timestamp, message = match.groups()
+        first = first or timestamp
+        if message.startswith(onboard_prefix):
+            values = onboard_line.match(message, len(onboard_prefix))
+            if values:  # a line cut off by a power loss is skipped
+                onboard_times.append(timestamp)
+                onboard_values.append([float(value) for value in values.groups()])
+        elif message in states:
+            found_states.setdefault(message, timestamp)
+        elif message.startswith('deploy vote sent'):
+            deploy_vote = deploy_vote or timestamp
+        elif p0 is None and 'p0=' in message:
+            p0 = float(message.split('p0=')[-1])
+    # the log is in local time, so only the first timestamp is converted with datetime and the rest relative to it
+    if first is None:
+        raise ValueError('no log lines found')
+    first_epoch = datetime.datetime.strptime(first, '%Y-%m-%d %H:%M:%S,%f').timestamp()
+    first_ms = np.datetime64(first.replace(',', '.'), 'ms')
+    def to_epoch(timestamps):
+        return first_epoch + (np.array([t.replace(',', '.') for t in timestamps], dtype='datetime64[ms]')-first_ms)/np.timedelta64(1, 's')
+    state_transitions = [[to_epoch([found_states[state]])[0], state] for state in states if state in found_states]
+    if 'LAUNCHED' in found_states:
+        launchtime = to_epoch([found_states['LAUNCHED']])[0]
+        state_transitions += [[launchtime+14, 'SRP board min deploy time'], [launchtime+16.5, 'SRP board max deploy time']]
+    onboard = np.zeros((len(onboard_times), 4))
+    if onboard_times:
+        onboard[:, 0] = to_epoch(onboard_times)
+        onboard[:, 1:] = onboard_values
+    return {'state_transitions': [[float(t), state] for t, state in state_transitions],
+            'p0': p0,
+            'deploy_vote': None if deploy_vote is None else float(to_epoch([deploy_vote])[0]),
+            'onboard': onboard}
+
 def get_state_transitions(log):
-    statelines = []
-    found_states = []
-    loglines = log.splitlines()
-    for state in states:
-        for line in loglines:
-            for word in line.split(' '):
-                if word == state:
-                    statelines.append(line)
-                    found_states.append(state)
-                    break
-            if state in found_states:
-                break
-    state_transitions = [[datetime.datetime.strptime(' '.join(line.split(' ')[:2]), '%Y-%m-%d %H:%M:%S,%f').timestamp(), line.split(' ')[-1]] for line in statelines]
-    state_transitions += [[state_transitions[3][0]+14, 'SRP board min deploy time'], [state_transitions[3][0]+16.5, 'SRP board max deploy time']]
-    return state_transitions
+    return index_log(log)['state_transitions']
+
+def get_launchtime(state_transitions):
+    '''Returns the time of the LAUNCHED transition, None if there was no launch'''
+    return dict((state, t) for t, state in state_transitions).get('LAUNCHED')
 
 def roundall(ls, digits=3):
     return [round(l, digits) for l in ls]
 
-def plot(timestamps, data, plotter=plt):
-    x = timestamps
-    y = data
-    if type(y[0])==type([]):
-        for axi in range(len(y[0])):
-            vals = [entry[axi] for entry in y]
-            plotter.plot(x, vals)
-    else:
-        plotter.plot(x, y)
-
-def plot_states(state_transitions, plotter=plt):
+def minmax_decimate(x, y, x0, x1, n_buckets):
+    '''Returns the indices of the min and max of y per bucket within the visible range x0..x1 (x has to be sorted),
+    so that at most 2 points per bucket (pixel) are drawn without hiding any peaks'''
+    i0 = max(np.searchsorted(x, x0)-1, 0)  # one point beyond the limits on both sides keeps the line running to the edge
+    i1 = min(np.searchsorted(x, x1, side='right')+1, len(x))
+    n = i1-i0
+    if n <= 2*n_buckets:
+        return np.arange(i0, i1)
+    size = -(-n//n_buckets)  # ceil division, so the last bucket is padded instead of the data truncated
+    buckets = np.pad(y[i0:i1], (0, size*n_buckets-n), mode='edge').reshape(n_buckets, size)
+    offsets = np.arange(n_buckets)*size
+    indices = np.concatenate((offsets+np.argmin(buckets, axis=1), offsets+np.argmax(buckets, axis=1)))
+    return i0+np.unique(np.minimum(indices, n-1))
+
+class DecimatedPlot:
+    '''Keeps the full resolution data of the lines on an axis and redraws them min/max decimated per pixel
+    whenever the x limits or the figure size change, so pan and zoom stay responsive on million-point flights'''
+    def __init__(self, ax, x, y, *args, **kwargs):
+        self.ax = ax
+        self.x = np.asarray(x)
+        self.y = np.asarray(y).reshape(len(self.x), -1)
+        self.lines = [ax.plot(self.x[:0], self.y[:0, i], *args, **kwargs)[0] for i in range(self.y.shape[1])]
+        self.update()
+        ax.relim()
+        ax.autoscale_view()
+        # lambdas instead of bound methods, as matplotlib only keeps weak references to the latter
+        ax.callbacks.connect('xlim_changed', lambda ax: self.update())
+        ax.figure.canvas.mpl_connect('resize_event', lambda event: self.update())
+
+    def update(self):
+        '''Decimates to the x limits of the axis, or to the full range while they are still autoscaled'''
+        if not len(self.x):
+            return
+        x0, x1 = (self.x[0], self.x[-1]) if self.ax.get_autoscalex_on() else self.ax.get_xlim()
+        n_buckets = max(int(self.ax.bbox.width), 1)
+        for i, line in enumerate(self.lines):
+            indices = minmax_decimate(self.x, self.y[:, i], x0, x1, n_buckets)
+            line.set_data(self.x[indices], self.y[indices, i])
+
+def pyplot():
+    '''Imports matplotlib only once something is plotted, so the data handling works without it'''
+    from matplotlib import pyplot as plt
+    return plt
+
+def plot(timestamps, data, plotter=None, *args, **kwargs):
+    '''Plots data (one line per column) against the timestamps, decimated to the resolution of the axis'''
+    plotter = plotter or pyplot()
+    ax = plotter.gca() if hasattr(plotter, 'gca') else plotter
+    return DecimatedPlot(ax, timestamps, data, *args, **kwargs)
+
+def plot_states(state_transitions, plotter=None):
+    plotter = plotter or pyplot().gca()
     for i, state in enumerate(state_transitions):
         plotter.axvline(state[0], color='r')
         limits = plotter.get_ylim()
         center = sum(limits)/2 + (i%2-0.5)*abs(limits[0]-limits[1])/4
         plotter.text(state[0], center, state[1], rotation=90)
 
+def plot_raw(sensors, state_transitions):
+    n_plots = len(sensors)
+    n_rows = int(math.sqrt(n_plots))
+    n_cols = math.ceil(n_plots/n_rows)
+    fig, axs = pyplot().subplots(n_rows, n_cols)
+    fig.suptitle('Raw sensor readings', fontsize=20)
+    for i, name in enumerate(sensors):
+        ax = axs[i//n_cols, i%n_cols]
+        ax.set_title(name)
+        plot(sensors[name][:, 1], sensors[name][:, 2:], plotter=ax)
+        plot_states(state_transitions, ax)
+    return fig
+
+def plot_barometer(times, baroplots, onboard, state_transitions):
+    onboard_columns = {'pressure': 1, 'altitude': 2, 'vertical velocity': 3}
+    n_plots = len(baroplots)
+    n_rows = int(math.sqrt(n_plots))
+    n_cols = math.ceil(n_plots / n_rows)
+    fig, axs = pyplot().subplots(n_rows, n_cols)
+    fig.suptitle('Barometer based measurements', fontsize=20)
+    for i, name in enumerate(baroplots):
+        if n_rows==1:
+            ax = axs[i]
+        else:
+            ax = axs[i // n_cols, i % n_cols]
+        ax.set_title(name)
+        plot(times, baroplots[name], plotter=ax)
+        plot(onboard[:, 0], onboard[:, onboard_columns[name]], ax, '--')  # onboard estimates from the .log for comparison
+        plot_states(state_transitions, ax)
+    return fig
+
+def plot_calibrated(sensors, launchtime):
+    fig, axs = pyplot().subplots(2, 2)
+    fig.suptitle('Usable calibrated sensor readings', fontsize=20)
+    plot(sensors['acc'][:, 1], calculate_acc_g(sensors['acc']), axs[0,0])
+    axs[0,0].set_title('Accelerometer')
+    axs[0,0].set_ylabel('Acceleration [g]')
+    axs[0,0].set_xlabel('Time [s]')
+    axs[0,0].set_xlim(launchtime - 2, launchtime + 35)
+    plot(sensors['gyro'][:, 1], calculate_gyro_dps(sensors['gyro']), axs[0,1])
+    axs[0,1].set_title('Gyro')
+    axs[0,1].set_ylabel('Angular rate [dps]')
+    axs[0,1].set_xlabel('Time [s]')
+    axs[0,1].set_xlim(launchtime - 2, launchtime + 35)
+    plot(sensors['mag'][:, 1], calculate_mag_gaus(sensors['mag']), axs[1,0])
+    axs[1,0].set_title('Magnetometer')
+    axs[1,0].set_ylabel('Magnetic field strength [gauss]')
+    axs[1,0].set_xlabel('Time [s]')
+    axs[1,0].set_xlim(launchtime - 2, launchtime + 35)
+    angular_rate = calculate_heading(sensors['mag'], launchtime)[1]
+    plot(sensors['mag'][sensors['mag'][:, 1]>launchtime, 1][:len(angular_rate)], angular_rate, axs[1,1])
+    axs[1,1].set_title('Magnetometer-derived')
+    axs[1,1].set_ylabel('Angular rate [dps]')
+    axs[1,1].set_xlabel('Time [s]')
+    axs[1,1].set_xlim(launchtime - 2, launchtime + 35)
+    axs[1,1].set_ylim(-800, 1100)
+    return fig
+
+def plot_altitude(times, altitude, launchtime, state_transitions):
+    apogee = max(altitude)
+    fig, ax = pyplot().subplots(1, 1)
+    ax.set_title('Barometer')
+    ax.set_ylabel('Altitude [m]')
+    ax.set_xlabel('Time [s]')
+    ax.set_ylim(-20, 1.08*apogee)
+    ax.set_xlim(launchtime - 2, launchtime + 35)
+    plot(times, altitude, plotter=ax)
+    ax.axhline(apogee, color='r')
+    ax.text(launchtime + 3, 1.02*apogee, 'Apogee: {:.0f}m'.format(apogee), weight='bold', size='large')
+    plot_states(state_transitions, ax)
+    return fig
+
+def list_flights(data_dir):
+    '''Returns the sorted names (timestamps) of all flights with files in data_dir'''
+    return sorted({match[1] for match in map(flight_name.match, os.listdir(data_dir)) if match})
+
 #####################################
 # setup
 
 sensors = {'baro':[], 'acc':[], 'gyro':[], 'mag':[]}
 data_dir = '../flown_software_cleaned_up/data/'
-plt.ioff()
+cache_dirname = '.cache'
+log_line = re.compile(r'^(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d,\d{3}) \S+ +\w+ +(.*?)\s*$', re.M)
+onboard_prefix = 'current pressure, altitude and vertical velocity: '
+number = r'([-+]?(?:(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?|nan|inf))'
+onboard_line = re.compile(' '.join([number]*3)+'$')  # the values after onboard_prefix, see index_log
+flight_name = re.compile(r'(\d+-\d+-\d+_\d+-\d+-\d+).+')
 
 #####################################
 # main
 
 if __name__ == '__main__':
+    plt = pyplot()
+    plt.ioff()
     while True:
         try:
             datafilename = sys.argv[1]
         except IndexError:
             # get all log timestamps only once (maybe later filter for only those with data files)
-            choices = sorted({re.match(r'(\d+-\d+-\d+_\d+-\d+-\d+).+', date)[1] for date in os.listdir(data_dir)})
+            choices = list_flights(data_dir)
             print(choices)
             datafilename = input('Which files? ')
             if not datafilename:
@@ -174,21 +437,14 @@ if __name__ == '__main__':
             break
         for n in sensors:
             datafilename = datafilename.strip('_'+n)+'_'
-        read_config(data_dir+datafilename+'config.json')
-        log = read_log(data_dir+datafilename[:-1]+'.log')
+        sensors, config, log_index = load_flight(data_dir, datafilename[:-1])
+        globals().update(config)
+        p0 = log_index['p0']
+        state_transitions = log_index['state_transitions']
+        onboard = log_index['onboard']
         ## plot raw sensor readings
-        launchtime = get_state_transitions(log)[3][0]
-        n_plots = len(sensors)
-        n_rows = int(math.sqrt(n_plots))
-        n_cols = math.ceil(n_plots/n_rows)
-        fig, axs = plt.subplots(n_rows, n_cols)
-        fig.suptitle('Raw sensor readings', fontsize=20)
-        for i, name in enumerate(sensors):
-            sensors[name] = read_data(data_dir+datafilename+name+'.csv')
-            ax = axs[i//n_cols, i%n_cols]
-            ax.set_title(name)
-            plot([d[1] for d in sensors[name]], [d[2] for d in sensors[name]], plotter=ax)
-            plot_states(get_state_transitions(log), ax)
+        launchtime = get_launchtime(state_transitions)
+        fig = plot_raw(sensors, state_transitions)
         if fullscreen:
             figManager = plt.get_current_fig_manager()
             figManager.window.showMaximized()
@@ -197,52 +453,20 @@ if __name__ == '__main__':
         plt.show()
         ## plot pressure calculations
         p, ps, h, vv, vvs = calculate_alt_vv(sensors['baro'])
-        times = [d[1] for d in sensors['baro']]
-        baroplots = {'pressure': [[*d] for d in zip(p, ps)], 'altitude': h, 'vertical velocity': [[*d] for d in zip(vv, vvs)]}
-        n_plots = len(baroplots)
-        n_rows = int(math.sqrt(n_plots))
-        n_cols = math.ceil(n_plots / n_rows)
-        fig, axs = plt.subplots(n_rows, n_cols)
-        fig.suptitle('Barometer based measurements', fontsize=20)
-        for i, name in enumerate(baroplots):
-            if n_rows==1:
-                ax = axs[i]
-            else:
-                ax = axs[i // n_cols, i % n_cols]
-            ax.set_title(name)
-            plot(times, baroplots[name], plotter=ax)
-            plot_states(get_state_transitions(log), ax)
+        times = sensors['baro'][:, 1]
+        baroplots = {'pressure': np.column_stack((p, ps)), 'altitude': h, 'vertical velocity': np.column_stack((vv, vvs))}
+        fig = plot_barometer(times, baroplots, onboard, state_transitions)
         if fullscreen:
             figManager = plt.get_current_fig_manager()
             figManager.window.showMaximized()
         else:
             fig.set_size_inches(3 * fig.get_figwidth(), fig.get_figheight())
         plt.show()
+        if launchtime is None:  # the remaining figures are relative to launch
+            print('no launch in', datafilename[:-1])
+            continue
         ## plot accelerations, angular rates and magnetic fields
-        fig, axs = plt.subplots(2, 2)
-        fig.suptitle('Usable calibrated sensor readings', fontsize=20)
-        axs[0,0].plot([i[1] for i in sensors['acc']], calculate_acc_g(sensors['acc']))
-        axs[0,0].set_title('Accelerometer')
-        axs[0,0].set_ylabel('Acceleration [g]')
-        axs[0,0].set_xlabel('Time [s]')
-        axs[0,0].set_xlim(launchtime - 2, launchtime + 35)
-        axs[0,1].plot([i[1] for i in sensors['gyro']], calculate_gyro_dps(sensors['gyro']))
-        axs[0,1].set_title('Gyro')
-        axs[0,1].set_ylabel('Angular rate [dps]')
-        axs[0,1].set_xlabel('Time [s]')
-        axs[0,1].set_xlim(launchtime - 2, launchtime + 35)
-        axs[1,0].plot([i[1] for i in sensors['mag']], calculate_mag_gaus(sensors['mag']))
-        axs[1,0].set_title('Magnetometer')
-        axs[1,0].set_ylabel('Magnetic field strength [gauss]')
-        axs[1,0].set_xlabel('Time [s]')
-        axs[1,0].set_xlim(launchtime - 2, launchtime + 35)
-        angular_rate = calculate_heading(sensors['mag'])[1]
-        axs[1,1].plot([i[1] for i in sensors['mag'] if i[1]>launchtime][:len(angular_rate)], angular_rate)
-        axs[1,1].set_title('Magnetometer-derived')
-        axs[1,1].set_ylabel('Angular rate [dps]')
-        axs[1,1].set_xlabel('Time [s]')
-        axs[1,1].set_xlim(launchtime - 2, launchtime + 35)
-        axs[1,1].set_ylim(-800, 1100)
+        fig = plot_calibrated(sensors, launchtime)
         if fullscreen:
             figManager = plt.get_current_fig_manager()
             figManager.window.showMaximized()
@@ -250,15 +474,6 @@ if __name__ == '__main__':
             fig.set_size_inches(3 * fig.get_figwidth(), fig.get_figheight())
         plt.show()
         ## plot altitude graph with annotations
-        fig, ax = plt.subplots(1, 1)
-        ax.set_title('Barometer')
-        ax.set_ylabel('Altitude [m]')
-        ax.set_xlabel('Time [s]')
-        ax.set_ylim(-20, 770)
-        ax.set_xlim(launchtime - 2, launchtime + 35)
-        plot(times, baroplots['altitude'], plotter=ax)
-        ax.axhline(714, color='r')
-        ax.text(launchtime + 3, 730, 'Apogee: 714m', weight='bold', size='large')
-        plot_states(get_state_transitions(log), ax)
+        fig = plot_altitude(times, baroplots['altitude'], launchtime, state_transitions)
         fig.set_size_inches(7, 9)
-        plt.show()
\ No newline at end of file
+        plt.show()
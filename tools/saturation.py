@@ -0,0 +1,182 @@
+'''
+Saturation of the accelerometer and gyro: finds the runs of samples at the full scale limits of their configured ranges
+(+-4 g and 1000 dps, see full_scales) on every axis, and reconstructs the clipped segments from the other sensors:
+the acceleration along the rocket's axis during boost from the second derivative of the barometric altitude (the RTS
+smoother of trajectory.py, with the clipped accelerations left out), the roll rate during the ascent from the
+magnetometer heading (post.calculate_heading) and anything else with a cubic through the samples around the run.
+A reconstructed sample is never closer to zero than its clipped reading, as the true value was at least that.
+Detection is vectorized over all axes and the reconstruction is linear in the number of samples, so long captures at
+high rates are no problem.
+
+The reconstructed arrays are saved per flight as desaturated.npz in its directory in the cache of post.py.
+
+usage: python saturation.py [flightname ...]  (all flights in data_dir by default)
+'''
+
+# imports
+import sys
+import os
+import numpy as np
+import post
+import trajectory
+
+#####################################
+# function definitions
+
+def find_runs(mask):
+    '''Returns the axis, start and stop (exclusive) index of every run of True in the columns of a 2D mask, by axis'''
+    padded = np.zeros((mask.shape[1], mask.shape[0]+2), dtype=np.int8)
+    padded[:, 1:-1] = mask.T
+    edges = np.diff(padded, axis=1)
+    axis, start = np.nonzero(edges == 1)
+    stop = np.nonzero(edges == -1)[1]  # in the same (axis, index) order, so they pair up with the starts
+    return axis, start, stop
+
+
+def detect(sensors, clip_fraction=0.98):
+    '''Returns the saturated runs of every sensor with a full scale, as a dict of arrays per sensor:
+    axis, start and stop (sample indices, stop exclusive), sign and the times of the first and last clipped sample'''
+    runs = {}
+    for name, level in full_scales.items():
+        data = np.asarray(sensors[name])
+        readings = data[:, 2:]
+        axis, start, stop = find_runs(np.abs(readings) >= clip_fraction*level)
+        runs[name] = {'axis': axis, 'start': start, 'stop': stop, 'sign': np.sign(readings[start, axis]),
+                      't_start': data[start, 1], 't_stop': data[stop-1, 1]}
+    return runs
+
+
+def run_indices(start, stop):
+    '''Returns the sample indices of all runs one after the other and the number of the run each belongs to'''
+    lengths = stop-start
+    run = np.repeat(np.arange(len(start)), lengths)
+    return np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths)-lengths, lengths) + start[run], run
+
+
+def hermite_fill(times, values, start, stop):
+    '''Returns the cubics over the runs values[start:stop] (all at once, see run_indices) that match the value and slope
+    of the samples around each run, nan for the runs at the start or end of the data'''
+    inner = (start >= 2) & (stop <= len(values)-2)
+    before = np.where(inner, start-1, 1)  # the others get a placeholder, they are nan in the end
+    after = np.where(inner, stop, len(values)-2)
+    t0, t1 = times[before], times[after]
+    slope0 = (values[before]-values[before-1])/(t0-times[before-1])
+    slope1 = (values[after+1]-values[after])/(times[after+1]-t1)
+    index, run = run_indices(start, stop)
+    dt = (t1-t0)[run]
+    s = (times[index]-t0[run])/dt
+    h00, h10, h01, h11 = 2*s**3-3*s**2+1, s**3-2*s**2+s, -2*s**3+3*s**2, s**3-s**2
+    estimate = h00*values[before][run] + h10*dt*slope0[run] + h01*values[after][run] + h11*dt*slope1[run]
+    estimate[~inner[run]] = np.nan
+    return estimate
+
+
+def apogee_time(sensors, config, p0, launchtime):
+    '''Returns the time of the highest barometric altitude (unsmoothed) after launch'''
+    times = np.asarray(sensors['baro'][:, 1])
+    altitude = post.pressure_to_altitude(sensors['baro'][:, 2]/40.96, p0, config['T0'], config['a'], config['R'], config['g0'])
+    after_launch = times > launchtime
+    return times[after_launch][np.argmax(altitude[after_launch])]
+
+
+def baro_acceleration(sensors, config, p0, launchtime, apogee, clip_fraction=0.98):
+    '''Returns the baro timestamps and the acceleration along the rocket's axis in g (gravity included, as the
+    accelerometer measures it) from launch to apogee, from the smoothed second derivative of the barometric altitude.
+    The body axis is taken as vertical, which it nearly is during boost'''
+    times, altitude, acceleration = trajectory.measurements(sensors, config, p0, clip_fraction)
+    first, last = np.flatnonzero((times > launchtime-2) & (times <= apogee))[[0, -1]]
+    smoothed = trajectory.smooth_trajectory(times[first:last+1], altitude[first:last+1], acceleration[first:last+1])
+    return times[first:last+1], smoothed['acceleration'][0]/config['g0']+1
+
+
+def magnetometer_roll_rate(sensors, launchtime):
+    '''Returns the mag timestamps after launch and the roll rate in dps from the magnetometer heading,
+    with the sign of the gyro z axis. Only meaningful during the ascent, while the rocket's axis is about vertical'''
+    heading, rate, heading_zero = post.calculate_heading(sensors['mag'], launchtime)
+    times = np.asarray(sensors['mag'][:, 1])
+    times = times[times > launchtime]
+    gyro = np.asarray(sensors['gyro'])
+    unclipped = np.abs(gyro[:, 4]) < 0.9*full_scales['gyro']
+    sign = np.sign(np.dot(rate, np.interp(times, gyro[unclipped, 1], gyro[unclipped, 4]))) or 1
+    return times, sign*rate
+
+
+def reconstruct(sensors, config, p0, launchtime=None, runs=None, clip_fraction=0.98):
+    '''Returns copies of the saturating sensors' arrays with their clipped segments reconstructed, and per sensor
+    the method used for every run ('baro', 'mag', 'spline' or None if it could not be reconstructed).
+    The other sensors are only used for runs of the z axis during the ascent (from launchtime to apogee)'''
+    runs = runs or detect(sensors, clip_fraction)
+    apogee = apogee_time(sensors, config, p0, launchtime) if launchtime is not None else None
+    corrected = {}
+    methods = {}
+    for name, r in runs.items():
+        data = np.array(sensors[name], dtype=float)
+        times = data[:, 1]
+        methods[name] = np.full(len(r['start']), None, dtype=object)
+        for axis in range(data.shape[1]-2):
+            which = np.flatnonzero(r['axis'] == axis)
+            if not len(which):
+                continue
+            values = data[:, 2+axis]
+            start, stop, sign = r['start'][which], r['stop'][which], r['sign'][which]
+            index, run = run_indices(start, stop)
+            estimate = np.full(len(index), np.nan)
+            method = np.full(len(which), None, dtype=object)
+            if launchtime is not None and axis == 2 and name in ('acc', 'gyro'):
+                first = launchtime-1 if name == 'acc' else launchtime
+                ascent = (times[start] > first) & (times[stop-1] < apogee)
+                if ascent.any():
+                    if name == 'acc':
+                        source_times, source = baro_acceleration(sensors, config, p0, launchtime, apogee, clip_fraction)
+                        source = source/acc_scale
+                        ascent &= (source_times[0] <= times[start]) & (times[stop-1] <= source_times[-1])
+                    else:
+                        source_times, source = magnetometer_roll_rate(sensors, launchtime)
+                    from_source = ascent[run]
+                    estimate[from_source] = np.interp(times[index[from_source]], source_times, source)
+                    method[ascent] = 'baro' if name == 'acc' else 'mag'
+            rest = method == None
+            estimate = np.where(rest[run], hermite_fill(times, values, start, stop), estimate)
+            method[rest & ~np.isnan(estimate[np.cumsum(stop-start)-1])] = 'spline'
+            clipped = values[index]
+            values[index] = np.where(np.isnan(estimate), clipped, sign[run]*np.maximum(sign[run]*estimate, sign[run]*clipped))
+            methods[name][which] = method
+        corrected[name] = data
+    return corrected, methods
+
+
+def report(flightname, data_dir=post.data_dir):
+    sensors, config, log_index = post.load_flight(data_dir, flightname)
+    launchtime = post.get_launchtime(log_index['state_transitions'])
+    reference = launchtime if launchtime is not None else sensors['baro'][0, 1]
+    runs = detect(sensors)
+    corrected, methods = reconstruct(sensors, config, log_index['p0'], launchtime, runs)
+    print('{}: {} saturated runs (times from {})'.format(flightname, sum(len(r['start']) for r in runs.values()),
+                                                     'launch' if launchtime is not None else 'the start'))
+    for name, r in runs.items():
+        for i, (axis, start, stop) in enumerate(zip(r['axis'], r['start'], r['stop'])):
+            peak = corrected[name][start:stop, 2+axis]
+            peak = peak[np.argmax(np.abs(peak))]
+            print('  {:4} {} {:+8.2f} s {:6.3f} s {:4} samples at {:+9.1f} {}  reconstructed by {:6} peak {:+9.1f} {}'.format(
+                name, 'xyz'[axis], r['t_start'][i]-reference, r['t_stop'][i]-r['t_start'][i], stop-start,
+                r['sign'][i]*full_scales[name]*units[name][1], units[name][0], str(methods[name][i]),
+                peak*units[name][1], units[name][0]))
+    path = os.path.join(data_dir, post.cache_dirname, flightname, 'desaturated.npz')
+    np.savez(path, **corrected)
+    print('  saved to', path)
+
+#####################################
+# setup
+
+acc_scale = 0.122/1000  # g per LSB at +-4 g
+# the limits of the readings as logged: the accelerometer in LSB, the gyro already converted to dps (35 mdps/LSB at
+# 1000 dps, so it clips at 1147 dps, shifted by its calibration offset)
+full_scales = {'acc': 32767, 'gyro': 32767*35/1000}
+units = {'acc': ('g', acc_scale), 'gyro': ('dps', 1)}  # for the report
+
+#####################################
+# main
+
+if __name__ == '__main__':
+    for flight in sys.argv[1:] or post.list_flights(post.data_dir):
+        report(flight)
@@ -0,0 +1,140 @@
+'''
+Timing quality of the recorded sensor data: output data rate distribution, gaps, stalls,
+duplicated (stale) reads, rate drift and the correlation of stalls with the autosaves of fly.py.
+
+usage: python timing.py [flightname ...]  (all flights in data_dir by default)
+'''
+
+# imports
+import sys
+import re
+import numpy as np
+import post
+
+#####################################
+# function definitions
+
+def read_autosaves(local_path, reference_time):
+    '''Returns an array with the start time and duration of every autosave block in a .csv written by fly.py.
+    The block headers only contain the last 4 digits of the epoch, reference_time (e.g. the first sample) restores the rest'''
+    with open(local_path) as f:
+        text = f.read()
+    starts = []
+    took = []
+    for start, duration in autosave_row.findall(text):
+        if start:
+            starts.append(float(start))
+            took.append(np.nan)  # stays nan if the block was cut off
+        elif starts:
+            took[-1] = float(duration)
+    if not starts:
+        return np.zeros((0, 2))
+    starts = np.array(starts)
+    base = reference_time - reference_time % 10000
+    starts += base
+    starts += 10000*np.round((reference_time-starts)/10000)  # pick the wrap closest to the reference
+    return np.column_stack((starts, np.array(took)))
+
+def duplicate_runs(data):
+    '''Returns the start time and the number of repeated samples of every run of identical consecutive readings'''
+    duplicate = post.duplicate_mask(data).astype(int)
+    edges = np.diff(np.concatenate(([0], duplicate, [0])))
+    starts = np.flatnonzero(edges == 1)
+    lengths = np.flatnonzero(edges == -1)-starts
+    return np.column_stack((np.asarray(data[starts-1, 1]), lengths))
+
+def overlaps(intervals, windows):
+    '''Returns which of the intervals (start, end) overlap any of the (start, duration) windows'''
+    if not len(windows) or not len(intervals):
+        return np.zeros(len(intervals), dtype=bool)
+    order = np.argsort(windows[:, 0])
+    starts = windows[order, 0]
+    ends = starts+np.nan_to_num(windows[order, 1])
+    latest = np.searchsorted(starts, intervals[:, 1])-1  # last window starting before the interval ends
+    return (latest >= 0) & (ends[np.maximum(latest, 0)] >= intervals[:, 0])
+
+def covered_time(windows):
+    '''Returns the total time covered by the union of the (start, duration) windows'''
+    if not len(windows):
+        return 0.0
+    order = np.argsort(windows[:, 0])
+    starts = windows[order, 0]
+    ends = starts+np.nan_to_num(windows[order, 1])
+    covered_until = np.concatenate(([-np.inf], np.maximum.accumulate(ends)[:-1]))
+    return float(np.sum(np.maximum(0, ends-np.maximum(starts, covered_until))))
+
+def timing_report(data, autosaves=np.zeros((0, 2)), stall_factor=1.5, window=10, percentiles=(1, 50, 90, 99, 99.9)):
+    '''Returns a dict with the timing quality of the data set of one sensor.
+    Gaps longer than stall_factor times the median interval are stalls, window is the length in seconds of the windows
+    the rate drift is calculated over and autosaves (see read_autosaves) are the windows the stalls are correlated with'''
+    times = np.asarray(data[:, 1])
+    if len(times) < 3:
+        return {'n_samples': len(times)}
+    gaps = np.diff(times)
+    nominal = np.median(gaps)
+    stalled = np.flatnonzero(gaps > stall_factor*nominal)
+    stalls = np.column_stack((times[stalled], gaps[stalled]))
+    during_autosave = overlaps(np.column_stack((times[stalled], times[stalled+1])), autosaves)
+    duration = times[-1]-times[0]
+    autosave_fraction = covered_time(autosaves)/duration
+    # rate drift: samples per window over the recording, and a linear fit through it
+    edges = np.arange(times[0], times[-1], window)
+    if len(edges) > 2:
+        counts = np.histogram(times, edges)[0]/window
+        drift = np.polyfit(edges[:-1]-times[0], counts, 1)[0]*60
+    else:
+        counts = np.array([len(times)/duration])
+        drift = 0.0
+    duplicates = duplicate_runs(data)
+    fresh = times[~post.duplicate_mask(data)]
+    return {'n_samples': len(times),
+            'odr_mean': 1/gaps.mean(),
+            'odr_median': 1/nominal,
+            'odr_std': gaps.std(ddof=1)/gaps.mean()**2,  # first order propagation of the interval spread
+            'gap_percentiles': dict(zip(percentiles, np.percentile(gaps, percentiles).tolist())),
+            'gap_max': gaps.max(),
+            'odr_windows': [counts.min(), counts.max()],
+            'odr_drift_per_minute': drift,
+            'n_stalls': len(stalls),
+            'stalls': stalls.tolist(),
+            'stalls_during_autosave': during_autosave.mean() if len(stalls) else None,
+            'autosave_time_fraction': autosave_fraction,  # stalls_during_autosave by chance alone
+            'autosave_took_percentiles': dict(zip(percentiles, np.nanpercentile(autosaves[:, 1], percentiles).tolist())) if len(autosaves) else None,
+            'n_duplicate_runs': len(duplicates),
+            'n_duplicate_samples': int(duplicates[:, 1].sum()),
+            'duplicate_runs': duplicates.tolist(),
+            'odr_deduplicated': (len(fresh)-1)/(fresh[-1]-fresh[0]) if len(fresh) > 1 else None}
+
+def flight_timing(data_dir, flightname, **kwargs):
+    '''Returns the timing report of every sensor of a flight, with the autosaves of all sensors,
+    as they compete for the same SD card and interpreter'''
+    sensors = post.load_flight(data_dir, flightname)[0]
+    autosaves = np.concatenate([read_autosaves(data_dir+flightname+'_'+name+'.csv', data[0, 1])
+                                for name, data in sensors.items() if len(data)])
+    return {name: timing_report(data, autosaves, **kwargs) for name, data in sensors.items()}
+
+def print_report(name, report):
+    if 'odr_mean' not in report:
+        print(name, 'too few samples:', report['n_samples'])
+        return
+    print('{}: {} samples, odr mean {:.3f} Hz, median {:.3f} Hz, deduplicated {:.3f} Hz, drift {:+.4f} Hz/min'.format(
+        name, report['n_samples'], report['odr_mean'], report['odr_median'], report['odr_deduplicated'] or 0, report['odr_drift_per_minute']))
+    print('    gap percentiles [s]:', {p: round(g, 4) for p, g in report['gap_percentiles'].items()}, 'max:', round(report['gap_max'], 4))
+    print('    {} stalls, {} during autosave (by chance {:.1%}), {} duplicate runs ({} samples)'.format(
+        report['n_stalls'], 'n/a' if report['stalls_during_autosave'] is None else '{:.1%}'.format(report['stalls_during_autosave']),
+        report['autosave_time_fraction'], report['n_duplicate_runs'], report['n_duplicate_samples']))
+
+#####################################
+# setup
+
+autosave_row = re.compile(r'^(?:#### (\d+\.\d+) autosave nr \d+|# autosave took (\d+\.\d+))', re.M)
+
+#####################################
+# main
+
+if __name__ == '__main__':
+    flights = sys.argv[1:] or post.list_flights(post.data_dir)
+    for flight in flights:
+        print(flight)
+        for name, report in flight_timing(post.data_dir, flight).items():
+            print_report(name, report)
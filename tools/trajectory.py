@@ -0,0 +1,110 @@
+'''
+Offline trajectory estimation: a forward Kalman filter and a Rauch-Tung-Striebel backward pass over the whole flight,
+fusing the barometric altitude with the gravity-compensated acceleration along the rocket's (z) body axis.
+All matrix operations are batched over a leading parameter axis, so a sweep over noise settings costs one pass.
+
+usage: python trajectory.py [flightname ...]  (all flights in data_dir by default)
+'''
+
+# imports
+import sys
+import numpy as np
+import post
+import align
+
+#####################################
+# function definitions
+
+def transition(dt):
+    '''Returns the state transition matrix and the white jerk process noise shape (times q) for a time step dt'''
+    F = np.array([[1, dt, dt**2/2], [0, 1, dt], [0, 0, 1]])
+    Q = np.array([[dt**5/20, dt**4/8, dt**3/6], [dt**4/8, dt**3/3, dt**2/2], [dt**3/6, dt**2/2, dt]])
+    return F, Q
+
+def smooth_trajectory(times, altitude, acceleration, q=50., r_baro=1., r_acc=0.25, initial_variance=100.):
+    '''Returns the RTS smoothed altitude, vertical velocity and acceleration with their standard deviations.
+    times are the filter steps, altitude and acceleration the measurements per step (nan where there is none).
+    q (jerk noise spectral density), r_baro and r_acc (measurement variances) can be scalars or arrays of B
+    parameter sets, the results then have shape (B, N)'''
+    q, r_baro, r_acc = np.broadcast_arrays(*(np.atleast_1d(np.asarray(v, dtype=float)) for v in (q, r_baro, r_acc)))
+    n_sets = len(q)
+    n = len(times)
+    x = np.zeros((n_sets, 3))
+    x[:, 0] = altitude[np.flatnonzero(np.isfinite(altitude))[0]]
+    P = np.tile(np.eye(3)*initial_variance, (n_sets, 1, 1))
+    x_pred = np.empty((n, n_sets, 3))
+    P_pred = np.empty((n, n_sets, 3, 3))
+    x_filt = np.empty((n, n_sets, 3))
+    P_filt = np.empty((n, n_sets, 3, 3))
+    dts = np.diff(times, prepend=times[0])
+    for k in range(n):
+        # predict
+        F, Q = transition(dts[k])
+        x = x @ F.T
+        P = F @ P @ F.T + q[:, None, None]*Q
+        x_pred[k] = x
+        P_pred[k] = P
+        # sequential scalar updates, altitude (state 0) and acceleration (state 2)
+        for state, z, r in ((0, altitude[k], r_baro), (2, acceleration[k], r_acc)):
+            if np.isfinite(z):
+                S = P[:, state, state]+r
+                K = P[:, :, state]/S[:, None]
+                x = x + K*(z-x[:, state])[:, None]
+                P = P - K[:, :, None]*P[:, state, None, :]
+        x_filt[k] = x
+        P_filt[k] = P
+    # Rauch-Tung-Striebel backward pass
+    x_smooth = x_filt.copy()
+    P_smooth = P_filt.copy()
+    for k in range(n-2, -1, -1):
+        F = transition(dts[k+1])[0]
+        # C = P_filt F^T P_pred^-1, solved as P_pred C^T = F P_filt (both symmetric)
+        C = np.linalg.solve(P_pred[k+1], F @ P_filt[k]).transpose(0, 2, 1)
+        x_smooth[k] = x_filt[k] + np.einsum('bij,bj->bi', C, x_smooth[k+1]-x_pred[k+1])
+        P_smooth[k] = P_filt[k] + C @ (P_smooth[k+1]-P_pred[k+1]) @ C.transpose(0, 2, 1)
+    std = np.sqrt(np.maximum(np.diagonal(P_smooth, axis1=2, axis2=3), 0))
+    return {'altitude': x_smooth[:, :, 0].T, 'velocity': x_smooth[:, :, 1].T, 'acceleration': x_smooth[:, :, 2].T,
+            'altitude_std': std[:, :, 0].T, 'velocity_std': std[:, :, 1].T, 'acceleration_std': std[:, :, 2].T}
+
+def measurements(sensors, config, p0, clip_fraction=0.98):
+    '''Returns the baro timestamps, the barometric altitude (unsmoothed) and the gravity-compensated acceleration along
+    the body z axis resampled to them. The acceleration is only used during the ascent (up to the raw barometric apogee),
+    as the body axis is not vertical anymore once the rocket tumbles, and not while the accelerometer clips'''
+    times = np.asarray(sensors['baro'][:, 1])
+    altitude = post.pressure_to_altitude(sensors['baro'][:, 2]/40.96, p0, config['T0'], config['a'], config['R'], config['g0'])
+    acc_z = align.resample(sensors['acc'][:, 1], post.calculate_acc_g(sensors['acc'])[:, 2], times)[:, 0]
+    acceleration = (acc_z-1)*config['g0']
+    apogee = times[np.argmax(post.calculate_alt_vv(sensors['baro'], config, p0)[2])]
+    with np.errstate(invalid='ignore'):
+        acceleration[(np.abs(acc_z) >= clip_fraction*4) | (times > apogee)] = np.nan
+    return times, altitude, acceleration
+
+def flight_trajectory(sensors, config, log_index, **parameters):
+    '''Returns the smoothed trajectory of a flight (see smooth_trajectory) with the detected apogee and landing times.
+    Landing is when, after apogee, the altitude and vertical velocity are within the landing ranges of the config'''
+    times, altitude, acceleration = measurements(sensors, config, log_index['p0'])
+    trajectory = smooth_trajectory(times, altitude, acceleration, **parameters)
+    apogee = np.argmax(trajectory['altitude'], axis=1)
+    trajectory['time'] = times
+    trajectory['apogee'] = trajectory['altitude'][np.arange(len(apogee)), apogee]
+    trajectory['apogee_time'] = times[apogee]
+    landing_times = []
+    for i, k in enumerate(apogee):
+        landed = (np.abs(trajectory['altitude'][i, k:]) < config['landing_altitude_range']) \
+               & (np.abs(trajectory['velocity'][i, k:]) < config['landing_vertical_velocity_range'])
+        landing_times.append(times[k+np.argmax(landed)] if landed.any() else np.nan)  # nan when the recording stopped first
+    trajectory['landing_time'] = np.array(landing_times)
+    return trajectory
+
+#####################################
+# main
+
+if __name__ == '__main__':
+    flights = sys.argv[1:] or post.list_flights(post.data_dir)
+    for flight in flights:
+        sensors, config, log_index = post.load_flight(post.data_dir, flight)
+        trajectory = flight_trajectory(sensors, config, log_index)
+        k = np.argmax(trajectory['altitude'][0])
+        print('{}: apogee {:.1f} +- {:.1f} m at {:.2f}, landing at {}'.format(
+            flight, trajectory['apogee'][0], trajectory['altitude_std'][0, k], trajectory['apogee_time'][0],
+            trajectory['landing_time'][0]))